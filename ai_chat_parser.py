@@ -5,12 +5,18 @@ import os
 import sys
 import yaml
 import json
-import re
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-import openai
-import requests
 import platform
+from tree_merger import TreeMerger, convert_path_to_nodes, merge_report_summary
+from ai_response_parser import PATH_SCHEMA, extract_json_from_response
+from stage_pipeline import Stage, StageError, StagePipeline, check_cancelled
+from ai_client import AIClient
+from ai_metrics import metrics
+from prompt_templates import compile_prompt, load_prompts
+from chat_preprocessor import preprocess_for_prompt
+from path_matcher import match_existing_path
+from prompt_context import PromptBuilder, compact_json, extract_neighbourhood, merge_chunk_results, validation_context
 
 # 检测操作系统，在 Windows 下使用安全的字符
 def get_safe_chars():
@@ -39,8 +45,10 @@ class AIChatParser:
                  prompts_file: str = "config/prompts.yaml"):
         """初始化AI聊天记录解析器"""
         self.ai_config = self._load_config(ai_config_file)
-        self.prompts = self._load_config(prompts_file)
-        self.client = self._init_ai_client()
+        self.prompts = self._load_prompts(prompts_file)
+        self.ai = AIClient(self.ai_config)
+        self.ai.init_client()
+        metrics.configure(self.ai_config)
         
     def _load_config(self, config_file: str) -> Dict:
         """加载配置文件"""
@@ -51,204 +59,68 @@ class AIChatParser:
             print(f"{safe_chars['error']} 加载配置文件失败: {e}")
             sys.exit(1)
     
-    def _init_ai_client(self):
-        """初始化AI客户端"""
-        api_type = self.ai_config['ai']['current_api']
-        api_config = self.ai_config['ai']['api'][api_type]
-        
-        if api_type == "dashscope":
-            api_key = os.getenv('DASHSCOPE_API_KEY')
-            if not api_key:
-                raise ValueError("请设置DASHSCOPE_API_KEY环境变量")
-            
-            return openai.OpenAI(
-                api_key=api_key,
-                base_url=api_config['base_url']
-            )
-        elif api_type == "openai":
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError("请设置OPENAI_API_KEY环境变量")
-            
-            return openai.OpenAI(
-                api_key=api_key,
-                base_url=api_config['base_url']
-            )
-        elif api_type == "azure":
-            api_key = os.getenv('AZURE_OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError("请设置AZURE_OPENAI_API_KEY环境变量")
-            
-            return openai.AzureOpenAI(
-                api_key=api_key,
-                azure_endpoint=api_config['base_url'],
-                api_version=api_config['api_version']
-            )
-        elif api_type == "local":
-            return openai.OpenAI(
-                api_key="not-needed",
-                base_url=api_config['base_url']
-            )
-        elif api_type == "custom_http":
-            # 自定义HTTP请求不需要初始化客户端
-            return None
-        else:
-            raise ValueError(f"不支持的API类型: {api_type}")
-    
-    def _call_ai_api(self, messages: List[Dict], model: str = None) -> str:
-        """调用AI API"""
+    def _load_prompts(self, prompts_file: str) -> Dict:
+        """加载提示词配置（进程内按文件缓存）"""
         try:
-            api_type = self.ai_config['ai']['current_api']
-            
-            if api_type == "custom_http":
-                return self._call_custom_http_api(messages)
-            else:
-                if model is None:
-                    model = self.ai_config['ai']['api'][api_type]['model']
-                
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=self.ai_config['ai']['api'][api_type]['temperature'],
-                    max_tokens=self.ai_config['ai']['api'][api_type]['max_tokens']
-                )
-                
-                return response.choices[0].message.content
+            return load_prompts(prompts_file)
         except Exception as e:
-            print(f"{safe_chars['error']} AI API调用失败: {e}")
-            return None
+            print(f"{safe_chars['error']} 加载配置文件失败: {e}")
+            sys.exit(1)
     
-    def _messages_to_prompt(self, messages: List[Dict]) -> str:
-        """将消息列表转换为单个提示文本"""
-        prompt_parts = []
-        
-        for message in messages:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            
-            if role == 'system':
-                prompt_parts.append(f"系统指令: {content}")
-            elif role == 'user':
-                prompt_parts.append(f"用户: {content}")
-            elif role == 'assistant':
-                prompt_parts.append(f"助手: {content}")
-        
-        return '\n\n'.join(prompt_parts)
+    def _call_ai_api(self, messages: List[Dict], model: str = None, schema: Dict = None) -> str:
+        """调用AI API（见 AIClient.acall），所有后端都失败时返回 None"""
+        return self.ai.call(messages, model=model, schema=schema)
     
-    def _call_custom_http_api(self, messages: List[Dict]) -> str:
-        """调用自定义HTTP API"""
-        try:
-            api_config = self.ai_config['ai']['api']['custom_http']
-            
-            # 获取API密钥
-            api_key_env = self.ai_config['ai']['api_keys']['custom_http']
-            api_key = os.getenv(api_key_env.replace('${', '').replace('}', ''))
-            if not api_key:
-                raise ValueError(f"请设置{api_key_env}环境变量")
-            
-            # 准备请求头
-            headers = {}
-            for key, value in api_config['headers'].items():
-                if value.startswith('${') and value.endswith('}'):
-                    # 替换环境变量
-                    env_var = value[2:-1]
-                    headers[key] = os.getenv(env_var, value)
-                else:
-                    headers[key] = value
-            
-            # 将消息列表转换为单个提示文本
-            prompt_text = self._messages_to_prompt(messages)
-            
-            # 构建请求体 - 使用您指定的格式
-            body = {
-                "inputs": prompt_text,
-                "parameters": {
-                    "detail": True,
-                    "temperature": 0.1
-                }
-            }
-            
-            # 发送请求 - 使用您指定的方式
-            response = requests.post(
-                api_config['url'],
-                headers=headers,
-                data=json.dumps(body),
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                error_msg = f"HTTP {response.status_code}: {response.text}"
-                print(f"{safe_chars['error']} 自定义HTTP API调用失败: {error_msg}")
-                return None
-            
-            # 直接返回响应文本
-            return response.text
-            
-        except Exception as e:
-            print(f"{safe_chars['error']} 自定义HTTP API调用失败: {e}")
-            return None
+    def _call_ai_many(self, message_groups: List[List[Dict]], model: str = None) -> List[Optional[str]]:
+        """并发调用多组消息，结果与输入顺序一致"""
+        return self.ai.call_many(message_groups, model=model)
     
-    def _extract_json_from_response(self, response: str) -> Dict:
-        """从AI响应中提取JSON内容"""
-        try:
-            # 方法1: 尝试直接解析整个响应
-            return json.loads(response)
-        except json.JSONDecodeError:
-            pass
+    def _extract_json_from_response(self, response: str, schema: Dict = PATH_SCHEMA) -> Dict:
+        """从AI响应中提取符合路径结构的JSON内容"""
+        return extract_json_from_response(response, schema)
+    
+    def _call_ai_chunks(self, message_groups: List[List[Dict]], fallback, model: str = None) -> Optional[Dict]:
+        """并发调用各块并合并JSON结果；响应不是JSON时用 fallback(response) 作为该块结果，全部失败时返回 None"""
+        results = []
+        for response in self._call_ai_many(message_groups, model=model):
+            if not response:
+                continue
+            result = extract_json_from_response(response)
+            results.append(result if isinstance(result, dict) else fallback(response))
+        return merge_chunk_results(results) if results else None
+    
+    def parse_chat_to_path(self, chat_history: str, existing_tree: Dict = None) -> Dict:
+        """解析聊天记录，返回问题定位路径（未转换为节点）
         
-        try:
-            # 方法2: 查找JSON代码块
-            json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', response, re.DOTALL)
-            if json_block_match:
-                return json.loads(json_block_match.group(1))
-        except json.JSONDecodeError:
-            pass
+        传入 existing_tree 时先与已有路径对齐（见 PathMatcher），完全一致时直接返回该路径，不调用AI。
+        """
+        if existing_tree:
+            match = match_existing_path(self.ai_config, existing_tree, chat_history)
+            if match:
+                return match['path']
         
-        try:
-            # 方法3: 查找任何JSON对象
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-        except json.JSONDecodeError:
-            pass
+        template = compile_prompt(self.prompts['chat_analysis'])
+        messages = template.messages(chat_history=preprocess_for_prompt(self.ai_config, template, chat_history))
         
-        try:
-            # 方法4: 手动构建JSON结构
-            # 查找nodes部分
-            nodes_match = re.search(r'"nodes":\s*\{[^}]+\}', response, re.DOTALL)
-            if nodes_match:
-                # 构建基本的JSON结构
-                json_str = "{" + nodes_match.group() + "}"
-                return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-        
-        # 如果所有方法都失败，返回None
-        return None
+        response = self._call_ai_api(messages, schema=PATH_SCHEMA)
+        if not response:
+            return None
+        
+        # 解析AI返回的路径数据
+        path_data = self._extract_json_from_response(response)
+        if not path_data:
+            print("[ERROR] 无法解析AI响应")
+            return None
+        
+        return path_data
     
     def parse_chat_history(self, chat_history: str, existing_tree: Dict = None) -> Dict:
         """解析聊天记录并生成决策树节点"""
         print("[DEBUG] 开始解析聊天记录...")
         
-        system_prompt = self.prompts['chat_analysis']['system']
-        user_prompt = self.prompts['chat_analysis']['user'].format(
-            chat_history=chat_history
-        )
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        response = self._call_ai_api(messages)
-        if not response:
-            return None
-        
         try:
-            # 解析AI返回的路径数据
-            path_data = self._extract_json_from_response(response)
+            path_data = self.parse_chat_to_path(chat_history)
             if not path_data:
-                print("[ERROR] 无法解析AI响应")
                 return None
             
             # 将路径转换为决策树结构
@@ -267,25 +139,14 @@ class AIChatParser:
         """验证新生成的决策树节点"""
         print("[OK] 验证决策树节点...")
         
-        system_prompt = self.prompts['tree_validation']['system']
-        user_prompt = self.prompts['tree_validation']['user'].format(
-            existing_tree=json.dumps(existing_tree, ensure_ascii=False, indent=2),
-            new_nodes=json.dumps(new_nodes, ensure_ascii=False, indent=2)
+        # 只发送与新节点相关的现有节点，新节点超出上下文时分块验证
+        message_groups = PromptBuilder.from_config(self.ai_config).build(
+            self.prompts['tree_validation'], 'new_nodes', new_nodes,
+            existing_tree=validation_context(existing_tree, new_nodes)
         )
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        response = self._call_ai_api(messages)
-        if not response:
-            return {"valid": False, "errors": ["AI API调用失败"]}
-        
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {"valid": True, "message": response}
+        result = self._call_ai_chunks(message_groups, lambda response: {"valid": True, "message": response})
+        return result if result is not None else {"valid": False, "errors": ["AI API调用失败"]}
     
     def merge_nodes(self, existing_nodes: Dict, new_nodes: Dict) -> Dict:
         """将AI生成的路径挂到现有根节点"""
@@ -307,159 +168,167 @@ class AIChatParser:
             print("[ERROR] 现有决策树数据不完整")
             return None
         
-        # 在现有根节点添加AI路径的入口选项
-        if existing_root in existing_nodes_dict:
-            # 获取入口节点的数据
-            entry_node_data = new_nodes_dict.get(entry_node, {})
-            entry_question = entry_node_data.get('question', '新问题')
-            
-            # 创建新的选项
-            new_option = {
-                "text": entry_question,
-                "next_node": entry_node
-            }
-            
-            # 添加到现有根节点的选项中
-            if 'options' not in existing_nodes_dict[existing_root]:
-                existing_nodes_dict[existing_root]['options'] = []
-            
-            # 检查是否已存在相同选项
-            existing_options = [opt['text'] for opt in existing_nodes_dict[existing_root]['options']]
-            if new_option['text'] not in existing_options:
-                existing_nodes_dict[existing_root]['options'].append(new_option)
-                print(f"[OK] 已添加新选项: {new_option['text']} -> {entry_node}")
-            else:
-                print(f"选项已存在: {new_option['text']}")
+        # 基于文本索引合并，相同的问题/选项/解决方案挂接到已有节点
+        merger = TreeMerger.from_config(existing_nodes, self.ai_config)
+        report = merger.merge(new_nodes)
         
-        # 合并所有新节点到现有树
-        existing_nodes_dict.update(new_nodes_dict)
+        print(f"[OK] {merge_report_summary(report)}")
+        for conflict in report['conflicts']:
+            print(f"{safe_chars['warning']} 选项冲突: {conflict['node']} / {conflict['option']}")
         
         return {
             "merged_tree": {
                 "root_node": existing_root,
                 "nodes": existing_nodes_dict
             },
-            "message": f"AI路径已挂接到根节点，入口节点: {entry_node}"
+            "merge_report": report,
+            "message": f"AI路径已挂接到根节点，入口节点: {report['entry_node']}"
         }
     
     def classify_problem(self, problem_description: str, existing_categories: List[str]) -> Dict:
         """对问题进行分类"""
         print("对问题进行分类...")
         
-        system_prompt = self.prompts['problem_classification']['system']
-        user_prompt = self.prompts['problem_classification']['user'].format(
+        messages = compile_prompt(self.prompts['problem_classification']).messages(
             problem_description=problem_description,
             existing_categories=json.dumps(existing_categories, ensure_ascii=False)
         )
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
         response = self._call_ai_api(messages)
         if not response:
             return None
         
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {"category": "unknown", "reason": response}
+        result = extract_json_from_response(response)
+        return result if result is not None else {"category": "unknown", "reason": response}
     
     def optimize_solution(self, original_solution: str, problem_context: str) -> str:
         """优化解决方案"""
         print("优化解决方案...")
         
-        system_prompt = self.prompts['solution_optimization']['system']
-        user_prompt = self.prompts['solution_optimization']['user'].format(
+        messages = compile_prompt(self.prompts['solution_optimization']).messages(
             original_solution=original_solution,
             problem_context=problem_context
         )
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
         response = self._call_ai_api(messages)
         return response if response else original_solution
     
-    def check_errors(self, tree_structure: Dict) -> Dict:
-        """检查决策树错误"""
+    def check_errors(self, tree_structure: Dict, model: str = None, focus_nodes: List[str] = None) -> Dict:
+        """检查决策树错误
+        
+        传入 focus_nodes（新增/修改的节点ID）时只检查这些节点及其挂接点、兄弟节点，
+        超出模型上下文时分块检查。
+        """
         print("[DEBUG] 检查决策树错误...")
         
-        system_prompt = self.prompts['error_handling']['system']
-        user_prompt = self.prompts['error_handling']['user'].format(
-            tree_structure=json.dumps(tree_structure, ensure_ascii=False, indent=2)
+        if focus_nodes is not None:
+            tree_structure = extract_neighbourhood(tree_structure, focus_nodes)
+        message_groups = PromptBuilder.from_config(self.ai_config).build(
+            self.prompts['error_handling'], 'tree_structure', tree_structure
         )
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        response = self._call_ai_api(messages)
-        if not response:
-            return {"errors": [], "warnings": ["无法检查错误"]}
-        
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {"errors": [], "warnings": [response]}
+        result = self._call_ai_chunks(message_groups, lambda response: {"errors": [], "warnings": [response]},
+                                      model=model)
+        return result if result is not None else {"errors": [], "warnings": ["无法检查错误"]}
     
-    def generate_confirmation_message(self, changes: Dict) -> str:
+    def generate_confirmation_message(self, changes: Dict, model: str = None) -> str:
         """生成用户确认信息"""
         print("📝 生成确认信息...")
         
-        system_prompt = self.prompts['user_confirmation']['system']
-        user_prompt = self.prompts['user_confirmation']['user'].format(
-            changes=json.dumps(changes, ensure_ascii=False, indent=2)
-        )
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages = compile_prompt(self.prompts['user_confirmation']).messages(changes=compact_json(changes))
         
-        response = self._call_ai_api(messages)
+        response = self._call_ai_api(messages, model=model)
         return response if response else "请确认以下变更..."
     
-    def process_chat_and_generate_tree(self, chat_history: str, existing_tree: Dict = None) -> Dict:
-        """处理聊天记录并生成决策树节点"""
-        print("开始处理聊天记录...")
-        
+    def _stage_config(self, name: str) -> Dict:
+        """流水线阶段配置（timeout、model）"""
+        return self.ai_config.get('pipeline', {}).get('stages', {}).get(name, {}) or {}
+    
+    def _stage_model(self, name: str) -> Optional[str]:
+        """阶段使用的模型；cheap 在调用时按所选后端解析为其 cheap_model（见 _resolve_model）"""
+        return self._stage_config(name).get('model')
+    
+    def _parse_and_merge(self, chat_history: str, existing_tree: Dict = None) -> Dict:
+        """解析、验证并合并节点，失败时抛出 StageError"""
         # 1. 解析聊天记录（不传递现有决策树）
         parsed_nodes = self.parse_chat_history(chat_history)
         if not parsed_nodes:
-            return {"success": False, "error": "解析聊天记录失败"}
+            raise StageError("解析聊天记录失败")
         
         # 2. 验证节点（不传递现有决策树，只验证新节点的内部结构）
         validation_result = self.validate_new_nodes_only(parsed_nodes)
         if not validation_result.get("valid", True):
-            return {"success": False, "error": f"节点验证失败: {validation_result.get('errors', [])}"}
+            raise StageError(f"节点验证失败: {validation_result.get('errors', [])}")
         
-        # 3. 合并节点（如果有现有树）
+        # 3. 合并节点（如果有现有树）；合并会修改 existing_tree，阶段超时后不再合并
+        changed_nodes = list(parsed_nodes.get('nodes', {}))
         if existing_tree:
+            check_cancelled()
             merge_result = self.merge_nodes(existing_tree, parsed_nodes)
             if merge_result:
                 parsed_nodes = merge_result.get("merged_tree", parsed_nodes)
+                report = merge_result["merge_report"]
+                changed_nodes = report['added_nodes'] + report['updated_nodes']
+        
+        return {"new_nodes": parsed_nodes, "validation": validation_result, "changed_nodes": changed_nodes}
+    
+    def process_chat_and_generate_tree(self, chat_history: str, existing_tree: Dict = None) -> Dict:
+        """处理聊天记录并生成决策树节点
+        
+        错误检查和确认信息都只依赖解析结果，两者在解析完成后并发执行；
+        两者的提示词只包含变更节点附近的子树，不随整棵决策树增长。
+        """
+        print("开始处理聊天记录...")
         
-        # 4. 检查错误
-        error_result = self.check_errors(parsed_nodes)
+        # 与已有路径完全一致时决策树无需修改，跳过解析、错误检查和确认信息的AI调用
+        match = match_existing_path(self.ai_config, existing_tree, chat_history)
+        if match:
+            return {
+                "success": True,
+                "new_nodes": existing_tree,
+                "validation": {"valid": True, "message": "与已有路径一致"},
+                "errors": {"errors": [], "warnings": []},
+                "confirmation_message": f"聊天记录与已有路径一致（{' → '.join(match['nodes'])}），决策树无需修改",
+                "fast_path": match['path']['fast_path'],
+                "stage_timings": {},
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        def stage(name, func, deps=(), **kwargs):
+            return Stage(name, func, deps, timeout=self._stage_config(name).get('timeout'), **kwargs)
+        
+        pipeline = StagePipeline([
+            stage('parse', lambda _: self._parse_and_merge(chat_history, existing_tree)),
+            # 4. 检查错误
+            stage('check_errors',
+                  lambda r: self.check_errors(r['parse']['new_nodes'], model=self._stage_model('check_errors'),
+                                              focus_nodes=r['parse']['changed_nodes']),
+                  deps=('parse',), required=False,
+                  fallback={"errors": [], "warnings": ["无法检查错误"]}),
+            # 5. 生成确认信息
+            stage('confirmation',
+                  lambda r: self.generate_confirmation_message({
+                      "new_nodes": extract_neighbourhood(r['parse']['new_nodes'], r['parse']['changed_nodes']),
+                      "validation": r['parse']['validation']
+                  }, model=self._stage_model('confirmation')),
+                  deps=('parse',), required=False, fallback="请确认以下变更..."),
+        ], max_workers=self.ai_config.get('pipeline', {}).get('max_workers', 4))
         
-        # 5. 生成确认信息
-        confirmation_message = self.generate_confirmation_message({
-            "new_nodes": parsed_nodes,
-            "validation": validation_result,
-            "errors": error_result
-        })
+        try:
+            results = pipeline.run()
+        except StageError as e:
+            return {"success": False, "error": str(e)}
+        
+        for name, reason in pipeline.failures.items():
+            print(f"{safe_chars['warning']} 阶段 {name} 未完成，使用默认结果: {reason}")
         
         return {
             "success": True,
-            "new_nodes": parsed_nodes,
-            "validation": validation_result,
-            "errors": error_result,
-            "confirmation_message": confirmation_message,
+            "new_nodes": results['parse']['new_nodes'],
+            "validation": results['parse']['validation'],
+            "errors": results['check_errors'],
+            "confirmation_message": results['confirmation'],
+            "stage_timings": pipeline.timings,
             "timestamp": datetime.now().isoformat()
         }
     
@@ -512,74 +381,11 @@ class AIChatParser:
         else:
             return {"valid": True, "message": "节点结构验证通过"}
 
-    def convert_path_to_tree(self, path_data: Dict) -> Dict:
-        """将问题定位路径转换为决策树结构"""
+    def convert_path_to_tree(self, path_data: Dict, namespace: str = None) -> Dict:
+        """将问题定位路径转换为决策树结构，namespace 可选，用于按批次隔离节点ID"""
         print("🔄 将路径转换为决策树...")
         
-        if not path_data or 'steps' not in path_data:
-            return None
-        
-        problem = path_data.get('problem', '问题定位')
-        steps = path_data.get('steps', [])
-        solution = path_data.get('solution', '')
-        
-        # 生成节点ID
-        entry_node_id = f"{problem.replace(' ', '_').lower()}_issue"
-        
-        # 构建决策树
-        nodes = {}
-        
-        # 入口节点
-        if steps:
-            first_step = steps[0]
-            nodes[entry_node_id] = {
-                "question": first_step.get('question', problem),
-                "options": [
-                    {
-                        "text": first_step.get('answer', ''),
-                        "next_node": f"step_{first_step.get('step', 1)}"
-                    }
-                ]
-            }
-        
-        # 中间步骤节点
-        for i, step in enumerate(steps):
-            step_id = f"step_{step.get('step', i+1)}"
-            
-            if i < len(steps) - 1:
-                # 中间步骤
-                next_step = steps[i + 1]
-                nodes[step_id] = {
-                    "question": next_step.get('question', ''),
-                    "options": [
-                        {
-                            "text": next_step.get('answer', ''),
-                            "next_node": f"step_{next_step.get('step', i+2)}"
-                        }
-                    ]
-                }
-            else:
-                # 最后一步，连接到解决方案
-                nodes[step_id] = {
-                    "question": step.get('question', ''),
-                    "options": [
-                        {
-                            "text": step.get('answer', ''),
-                            "next_node": "solution"
-                        }
-                    ]
-                }
-        
-        # 解决方案节点
-        if solution:
-            nodes["solution"] = {
-                "solution": solution
-            }
-        
-        return {
-            "entry_node": entry_node_id,
-            "nodes": nodes
-        }
+        return convert_path_to_nodes(path_data, namespace)
 
 def main():
     """测试函数"""
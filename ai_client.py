@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+
+from ai_metrics import custom_http_usage, metrics, record_chat_completion
+from ai_response_parser import build_grammar, build_response_format
+from ai_router import RateLimitedError, get_router
+from stage_pipeline import StageCancelled, current_cancel_event
+
+# 同时进行的请求数上限（call_many），可由 ai.max_concurrency 配置
+DEFAULT_MAX_CONCURRENCY = 8
+
+# 自定义HTTP请求超时（秒）
+CUSTOM_HTTP_TIMEOUT = 30
+
+# 在流水线阶段中同步调用时检查阶段取消标志的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
+
+
+# ----------------------------------------------------------------------
+# 后台事件循环：所有请求都在同一个线程的事件循环上执行，
+# 同步调用方（Flask 请求线程、流水线阶段线程）提交协程后等待结果
+# ----------------------------------------------------------------------
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="ai-client-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run_sync(coro):
+    """在后台事件循环上执行协程并等待结果
+
+    调用方的 contextvars（如调用统计的任务范围）随协程一起传递。
+    在 StagePipeline 阶段中调用时，阶段超时或流水线中止后取消在途请求并抛出 StageCancelled。
+    不能在后台事件循环线程内调用，异步代码应直接 await。
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("不能在AI客户端事件循环中同步调用，请直接 await")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    cancel_event = current_cancel_event()
+    if cancel_event is None:
+        return future.result()
+    while not cancel_event.is_set():
+        done, _ = concurrent.futures.wait([future], timeout=CANCEL_POLL_INTERVAL)
+        if done:
+            return future.result()
+    future.cancel()
+    raise StageCancelled("阶段已取消，AI请求未完成")
+
+
+# 进程内共享的客户端，连接池在各调用器实例之间复用
+_clients: Dict[str, Any] = {}
+_http = None
+_clients_lock = threading.Lock()
+
+
+def _create_client(api_type: str, api_config: Dict):
+    """创建后端的异步客户端，缺少API密钥时抛出 ValueError"""
+    if api_type in ("dashscope", "openai"):
+        env_var = "DASHSCOPE_API_KEY" if api_type == "dashscope" else "OPENAI_API_KEY"
+        api_key = os.getenv(env_var)
+        if not api_key:
+            raise ValueError(f"请设置{env_var}环境变量")
+        return openai.AsyncOpenAI(api_key=api_key, base_url=api_config['base_url'])
+    elif api_type == "azure":
+        api_key = os.getenv('AZURE_OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("请设置AZURE_OPENAI_API_KEY环境变量")
+        return openai.AsyncAzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=api_config['base_url'],
+            api_version=api_config['api_version']
+        )
+    elif api_type == "local":
+        return openai.AsyncOpenAI(api_key="not-needed", base_url=api_config['base_url'])
+    raise ValueError(f"不支持的API类型: {api_type}")
+
+
+def _shared_client(api_type: str, api_config: Dict):
+    key = json.dumps([api_type, api_config.get('base_url'), api_config.get('api_version')])
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = _create_client(api_type, api_config)
+        return _clients[key]
+
+
+def _shared_http() -> httpx.AsyncClient:
+    global _http
+    with _clients_lock:
+        if _http is None:
+            _http = httpx.AsyncClient(timeout=CUSTOM_HTTP_TIMEOUT)
+        return _http
+
+
+def _resolve(future: asyncio.Future, result=None, error: Exception = None):
+    # 调用方已放弃等待（取消）的请求直接丢弃结果
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class CustomHttpBatcher:
+    """custom_http 请求的自适应微批处理
+
+    服务端空闲时请求立即发出；已有请求在途时，新请求在 max_wait 秒的窗口内
+    按相同的请求头和 parameters 收集，凑满 max_batch_size 或窗口结束后以
+    inputs 为列表的一次请求发出（TGI 等服务支持），再按顺序拆分响应。
+    服务端首次拒绝批量请求或返回的列表长度不符时，改为逐条发送且不再合并；
+    确认支持后个别批次的响应长度不符时，该批次逐条重发。
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.supported = None      # 服务端是否支持批量请求，None 表示尚未确认
+        self.in_flight = 0         # 在途的HTTP请求数
+        self.batches_sent = 0
+        self._open = {}            # 合并键 -> 正在收集的批次 [(inputs, future)]
+
+    async def post(self, http: httpx.AsyncClient, url: str, headers: Dict, body: Dict) -> httpx.Response:
+        if self.supported is False or (self.in_flight == 0 and not self._open):
+            return await self._post(http, url, headers, body)
+
+        loop = asyncio.get_running_loop()
+        key = json.dumps([id(http), url, headers, body['parameters']], sort_keys=True, default=str)
+        future = loop.create_future()
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = []
+            loop.call_later(self.max_wait, self._flush, key, batch, http, url, headers, body['parameters'])
+        batch.append((body['inputs'], future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key, batch, http, url, headers, body['parameters'])
+        return await future
+
+    def _flush(self, key, batch, http, url, headers, parameters):
+        # 窗口结束时该批次可能已因凑满而发出
+        if self._open.get(key) is not batch:
+            return
+        del self._open[key]
+        asyncio.ensure_future(self._send(batch, http, url, headers, parameters))
+
+    async def _post(self, http, url, headers, body) -> httpx.Response:
+        self.in_flight += 1
+        try:
+            return await http.post(url, headers=headers, json=body)
+        finally:
+            self.in_flight -= 1
+
+    async def _send_each(self, batch, http, url, headers, parameters):
+        async def send(inputs, future):
+            try:
+                _resolve(future, await self._post(http, url, headers, {"inputs": inputs, "parameters": parameters}))
+            except Exception as e:
+                _resolve(future, error=e)
+        await asyncio.gather(*(send(inputs, future) for inputs, future in batch))
+
+    async def _send(self, batch, http, url, headers, parameters):
+        if len(batch) == 1 or self.supported is False:
+            await self._send_each(batch, http, url, headers, parameters)
+            return
+
+        try:
+            response = await self._post(http, url, headers, {"inputs": [inputs for inputs, _ in batch],
+                                                             "parameters": parameters})
+        except Exception as e:
+            for _, future in batch:
+                _resolve(future, error=e)
+            return
+
+        items = None
+        if response.status_code == 200:
+            try:
+                items = response.json()
+            except ValueError:
+                pass
+        if isinstance(items, list) and len(items) == len(batch):
+            self.supported = True
+            self.batches_sent += 1
+            for item, (_, future) in zip(items, batch):
+                _resolve(future, httpx.Response(200, text=json.dumps(item, ensure_ascii=False)))
+        elif self.supported is None and (response.status_code == 200 or 400 <= response.status_code < 500
+                                         and response.status_code != 429):
+            # 带 grammar 时被拒绝可能是不支持 grammar，逐条重发后由调用方去掉 grammar 重试
+            if 'grammar' not in parameters:
+                print(f"[WARNING] 自定义HTTP API不支持批量请求（HTTP {response.status_code}），改为逐条发送")
+                self.supported = False
+            await self._send_each(batch, http, url, headers, parameters)
+        elif response.status_code == 200:
+            # 已确认支持批量请求，但本次响应不是长度相符的列表，无法按顺序拆分
+            print(f"[WARNING] 自定义HTTP API的批量响应与请求数（{len(batch)}）不符，本批改为逐条发送")
+            await self._send_each(batch, http, url, headers, parameters)
+        else:
+            # 服务端错误或限流：每个请求都得到同一个错误响应
+            for _, future in batch:
+                _resolve(future, response)
+
+
+# 进程内按服务地址共享的批处理器，不同调用器实例的并发请求也能合并
+_batchers: Dict[str, CustomHttpBatcher] = {}
+
+
+def _shared_batcher(api_config: Dict) -> Optional[CustomHttpBatcher]:
+    batching = api_config.get('batching') or {}
+    if not batching.get('enabled'):
+        return None
+    with _clients_lock:
+        if api_config['url'] not in _batchers:
+            _batchers[api_config['url']] = CustomHttpBatcher(
+                max_batch_size=batching.get('max_batch_size', 8),
+                max_wait=batching.get('max_wait_ms', 10) / 1000
+            )
+        return _batchers[api_config['url']]
+
+
+def messages_to_prompt(messages: List[Dict]) -> str:
+    """将消息列表转换为单个提示文本"""
+    prompt_parts = []
+
+    for message in messages:
+        role = message.get('role', 'user')
+        content = message.get('content', '')
+
+        if role == 'system':
+            prompt_parts.append(f"系统指令: {content}")
+        elif role == 'user':
+            prompt_parts.append(f"用户: {content}")
+        elif role == 'assistant':
+            prompt_parts.append(f"助手: {content}")
+
+    return '\n\n'.join(prompt_parts)
+
+
+class AIClient:
+    """AI调用的公共实现（异步），DirectAICaller 和 AIChatParser 共用
+
+    - acall / agather：协程接口，批量和服务端代码可以在一个线程上同时发出大量请求
+    - call / call_many：同步包装，在后台事件循环上执行并等待结果
+    - 按 ai.routing 在后端之间路由和切换，每次调用计入 ai_metrics
+    """
+
+    def __init__(self, ai_config: Dict):
+        self.ai_config = ai_config or {}
+        # 本实例使用的客户端（默认取进程内共享的客户端，测试时可替换）
+        self.clients = {}
+        self.http = None
+        self.batcher = None
+        # 拒绝过结构化输出参数的后端，后续调用不再携带该参数
+        self.structured_output_unsupported = set()
+
+    @property
+    def current_api(self) -> Optional[str]:
+        return self.ai_config.get('ai', {}).get('current_api')
+
+    def _api_config(self, api_type: str) -> Dict:
+        return self.ai_config['ai']['api'][api_type]
+
+    def init_client(self, api_type: str = None):
+        """获取后端客户端（默认为 current_api），custom_http 不需要客户端，返回 None"""
+        api_type = api_type or self.current_api
+        if api_type == "custom_http":
+            return None
+        if api_type not in self.clients:
+            self.clients[api_type] = _shared_client(api_type, self._api_config(api_type))
+        return self.clients[api_type]
+
+    def resolve_model(self, api_type: str, model: str = None) -> str:
+        """解析后端使用的模型：cheap 取 cheap_model；指定的模型名只对 current_api 有效"""
+        api_config = self._api_config(api_type)
+        default = api_config.get('model') or api_config.get('deployment_name')
+        if model == 'cheap':
+            return api_config.get('cheap_model') or default
+        if model is None or api_type != self.current_api:
+            return default
+        return model
+
+    def structured_output_mode(self, api_type: str, schema: Dict = None) -> str:
+        """返回本次调用使用的结构化输出模式"""
+        if schema is None or api_type in self.structured_output_unsupported:
+            return "none"
+        return self._api_config(api_type).get('structured_output', 'none')
+
+    # ------------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------------
+
+    async def acall(self, messages: List[Dict], model: str = None, schema: Dict = None) -> Optional[str]:
+        """调用AI，返回回复文本；所有后端都失败时返回 None
+
+        按 ai.routing 配置在多个后端之间选择并在失败时切换（未启用时只用 current_api）。
+        model 为 "cheap" 时使用所选后端的 cheap_model；传入 schema 时，按配置的
+        structured_output 模式请求后端直接返回JSON。
+        """
+        router = get_router(self.ai_config)
+        response = await router.acall(lambda api_type: self._acall_backend(api_type, messages, model, schema))
+        if response is None:
+            print("[ERROR] AI API调用失败: 所有后端均不可用")
+        return response
+
+    async def agather(self, message_groups: List[List[Dict]], model: str = None,
+                      schema: Dict = None) -> List[Optional[str]]:
+        """并发调用多组消息，结果与输入顺序一致；同时进行的请求数受 ai.max_concurrency 限制"""
+        limit = asyncio.Semaphore(self.ai_config.get('ai', {}).get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+
+        async def call(messages):
+            async with limit:
+                return await self.acall(messages, model, schema)
+
+        return list(await asyncio.gather(*(call(messages) for messages in message_groups)))
+
+    async def _acall_backend(self, api_type: str, messages: List[Dict], model: str = None,
+                             schema: Dict = None) -> Optional[str]:
+        """在指定后端上调用一次，失败时抛出异常（custom_http 失败时返回 None）"""
+        mode = self.structured_output_mode(api_type, schema)
+        if api_type == "custom_http":
+            return await self._acall_custom_http(messages, grammar=build_grammar(mode, schema))
+
+        started = time.monotonic()
+        retries = 0
+        model = self.resolve_model(api_type, model)
+        api_config = self._api_config(api_type)
+        try:
+            client = self.init_client(api_type)
+            request = {
+                "model": model,
+                "messages": messages,
+                "temperature": api_config.get('temperature', 0.1),
+                "max_tokens": api_config.get('max_tokens', 2000)
+            }
+
+            response_format = build_response_format(mode, schema)
+            if response_format:
+                try:
+                    response = await client.chat.completions.create(response_format=response_format, **request)
+                    record_chat_completion(api_type, model, messages, response, started)
+                    return response.choices[0].message.content
+                except openai.BadRequestError as e:
+                    print(f"[WARNING] 后端不支持结构化输出，改用普通输出: {e}")
+                    self.structured_output_unsupported.add(api_type)
+                    retries += 1
+
+            response = await client.chat.completions.create(**request)
+            record_chat_completion(api_type, model, messages, response, started, retries)
+            return response.choices[0].message.content
+        except Exception:
+            metrics.record(api_type, model, latency=time.monotonic() - started, retries=retries, success=False)
+            raise
+
+    def _custom_http_headers(self, api_config: Dict) -> Dict:
+        """自定义HTTP请求头，${VAR} 形式的值替换为环境变量"""
+        api_key_env = self.ai_config['ai']['api_keys']['custom_http']
+        if not os.getenv(api_key_env.replace('${', '').replace('}', '')):
+            raise ValueError(f"请设置{api_key_env}环境变量")
+
+        headers = {}
+        for key, value in api_config['headers'].items():
+            if value.startswith('${') and value.endswith('}'):
+                headers[key] = os.getenv(value[2:-1], value)
+            else:
+                headers[key] = value
+        return headers
+
+    async def _acall_custom_http(self, messages: List[Dict], grammar: Dict = None, retries: int = 0) -> Optional[str]:
+        """调用自定义HTTP API（TGI 格式）
+
+        传入 grammar 时随请求约束输出为JSON；服务端拒绝该参数时去掉后重试一次。
+        """
+        started = time.monotonic()
+        prompt_text = ''
+        model = None
+        try:
+            api_config = self._api_config('custom_http')
+            model = api_config.get('model')
+            headers = self._custom_http_headers(api_config)
+
+            prompt_text = messages_to_prompt(messages)
+            body = {
+                "inputs": prompt_text,
+                "parameters": {
+                    "detail": True,
+                    "temperature": 0.1
+                }
+            }
+            if grammar:
+                body["parameters"]["grammar"] = grammar
+
+            http = self.http or _shared_http()
+            batcher = self.batcher or _shared_batcher(api_config)
+            if batcher:
+                response = await batcher.post(http, api_config['url'], headers, body)
+            else:
+                response = await http.post(api_config['url'], headers=headers, json=body)
+
+            if grammar and 400 <= response.status_code < 500:
+                print("[WARNING] 自定义HTTP API不支持grammar参数，改用普通输出")
+                self.structured_output_unsupported.add('custom_http')
+                return await self._acall_custom_http(messages, retries=retries + 1)
+
+            if response.status_code != 200:
+                error_msg = f"HTTP {response.status_code}: {response.text}"
+                print(f"[ERROR] 自定义HTTP API调用失败: {error_msg}")
+                metrics.record('custom_http', model, latency=time.monotonic() - started,
+                               retries=retries, success=False)
+                if response.status_code == 429:
+                    # 限流交给路由器处理：熔断该后端并切换
+                    retry_after = response.headers.get('Retry-After')
+                    raise RateLimitedError(error_msg, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                return None
+
+            prompt_tokens, completion_tokens, estimated = custom_http_usage(response.text, prompt_text)
+            metrics.record('custom_http', model, prompt_tokens, completion_tokens,
+                           latency=time.monotonic() - started, retries=retries, estimated=estimated)
+            return response.text
+
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] 自定义HTTP API调用失败: {e}")
+            metrics.record('custom_http', model, latency=time.monotonic() - started,
+                           retries=retries, success=False)
+            return None
+
+    async def acheck_backend(self, api_type: str) -> bool:
+        """健康检查：OpenAI 兼容后端列出模型，custom_http 请求服务地址（非 5xx 即视为在线）"""
+        if api_type == "custom_http":
+            response = await (self.http or _shared_http()).get(self._api_config('custom_http')['url'], timeout=5)
+            return response.status_code < 500
+        await self.init_client(api_type).models.list()
+        return True
+
+    # ------------------------------------------------------------------
+    # 同步包装
+    # ------------------------------------------------------------------
+
+    def call(self, messages: List[Dict], model: str = None, schema: Dict = None) -> Optional[str]:
+        return run_sync(self.acall(messages, model, schema))
+
+    def call_many(self, message_groups: List[List[Dict]], model: str = None,
+                  schema: Dict = None) -> List[Optional[str]]:
+        return run_sync(self.agather(message_groups, model, schema))
+
+    def check_backend(self, api_type: str) -> bool:
+        return run_sync(self.acheck_backend(api_type))
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from prompt_context import estimate_tokens
+
+# 当前上下文中正在统计的任务（嵌套时同一次调用计入每个任务）
+_active_jobs = contextvars.ContextVar('ai_metrics_jobs', default=())
+
+# 保留最近的任务统计数
+MAX_JOBS = 50
+
+
+def _empty_stats() -> Dict:
+    return {
+        "calls": 0,
+        "failures": 0,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "completion_tokens": 0,
+        "estimated_calls": 0,
+        "latency_total": 0.0,
+        "latency_max": 0.0,
+        "cost": 0.0,
+    }
+
+
+def _add(stats: Dict, call: Dict):
+    stats["calls"] += 1
+    stats["failures"] += 0 if call["success"] else 1
+    stats["retries"] += call["retries"]
+    stats["prompt_tokens"] += call["prompt_tokens"]
+    stats["cached_tokens"] += call["cached_tokens"]
+    stats["completion_tokens"] += call["completion_tokens"]
+    stats["estimated_calls"] += 1 if call["estimated"] else 0
+    stats["latency_total"] += call["latency"]
+    stats["latency_max"] = max(stats["latency_max"], call["latency"])
+    stats["cost"] += call["cost"]
+
+
+def _report(stats: Dict) -> Dict:
+    """统计结果：补充总 token 数、提示词缓存命中率和平均耗时，数值取整便于展示"""
+    calls = stats["calls"]
+    return {
+        **stats,
+        "total_tokens": stats["prompt_tokens"] + stats["completion_tokens"],
+        "cache_hit_rate": round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0,
+        "latency_total": round(stats["latency_total"], 3),
+        "latency_max": round(stats["latency_max"], 3),
+        "latency_avg": round(stats["latency_total"] / calls, 3) if calls else 0.0,
+        "cost": round(stats["cost"], 6),
+    }
+
+
+class _Bucket:
+    """一组调用的统计：合计和按 后端/模型 分组"""
+
+    def __init__(self):
+        self.total = _empty_stats()
+        self.backends = {}
+
+    def add(self, call: Dict):
+        _add(self.total, call)
+        key = f"{call['backend']}/{call['model']}"
+        _add(self.backends.setdefault(key, _empty_stats()), call)
+
+    def report(self) -> Dict:
+        return {
+            "total": _report(self.total),
+            "backends": {key: _report(stats) for key, stats in sorted(self.backends.items())},
+        }
+
+
+class AIMetrics:
+    """AI调用的 token、耗时、重试和费用统计（线程安全）
+
+    每次调用按 后端/模型 汇总；在 job() 范围内的调用同时计入该任务，
+    任务范围随 contextvars 传播，StagePipeline 中并发执行的阶段也会计入。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pricing = {}
+        self.currency = "CNY"
+        self.reset()
+
+    def configure(self, ai_config: Dict):
+        """从 ai_config.yaml 的 metrics 配置读取价格"""
+        metrics_config = (ai_config or {}).get('metrics', {}) or {}
+        with self._lock:
+            self.pricing = metrics_config.get('pricing', {}) or {}
+            self.currency = metrics_config.get('currency', self.currency)
+
+    def reset(self):
+        with self._lock:
+            self._bucket = _Bucket()
+            self._jobs = []
+            self._fast_path = {}
+            self.started_at = datetime.now().isoformat()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        """按每千 token 价格估算费用，未配置价格的模型计为 0
+
+        cached_tokens 为 prompt_tokens 中命中提示词缓存的部分，按 cached_prompt 价格计
+        （未配置时按 prompt 价格）。
+        """
+        price = self.pricing.get(model) or {}
+        prompt_price = price.get('prompt', 0)
+        return ((prompt_tokens - cached_tokens) * prompt_price
+                + cached_tokens * price.get('cached_prompt', prompt_price)
+                + completion_tokens * price.get('completion', 0)) / 1000
+
+    def record(self, backend: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0, retries: int = 0, success: bool = True, estimated: bool = False,
+               cached_tokens: int = 0):
+        """记录一次调用；estimated 表示 token 数为估算值（后端未返回用量），
+        cached_tokens 为命中服务商提示词缓存的输入 token 数"""
+        model = model or "default"
+        call = {
+            "backend": backend,
+            "model": model,
+            "prompt_tokens": int(prompt_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "latency": latency,
+            "retries": retries,
+            "success": success,
+            "estimated": estimated,
+            "cost": self.cost(model, prompt_tokens or 0, completion_tokens or 0, cached_tokens or 0),
+        }
+        with self._lock:
+            self._bucket.add(call)
+            for job in _active_jobs.get():
+                job["bucket"].add(call)
+
+    def record_fast_path(self, path: str):
+        """记录一次与已有路径一致、跳过AI调用的聊天记录（按路径计数）"""
+        with self._lock:
+            self._fast_path[path] = self._fast_path.get(path, 0) + 1
+
+    @contextmanager
+    def job(self, name: str):
+        """统计范围内的调用，退出时得到该任务的统计（通过 yield 的字典读取）"""
+        job = {"name": name, "started_at": datetime.now().isoformat(), "bucket": _Bucket()}
+        result = {"name": name}
+        started = time.monotonic()
+        token = _active_jobs.set(_active_jobs.get() + (job,))
+        try:
+            yield result
+        finally:
+            _active_jobs.reset(token)
+            with self._lock:
+                result.update({
+                    "started_at": job["started_at"],
+                    "duration": round(time.monotonic() - started, 3),
+                    **job["bucket"].report(),
+                })
+                self._jobs.append(result)
+                del self._jobs[:-MAX_JOBS]
+
+    def summary(self) -> Dict:
+        """进程启动（或 reset）以来的全部统计"""
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "currency": self.currency,
+                **self._bucket.report(),
+                "fast_path": {"hits": sum(self._fast_path.values()), "paths": dict(self._fast_path)},
+                "jobs": list(self._jobs),
+            }
+
+
+# 进程内共享的统计实例
+metrics = AIMetrics()
+
+
+def openai_usage(response) -> Optional[Tuple[int, int, int]]:
+    """OpenAI 兼容响应中的 (prompt_tokens, completion_tokens, cached_tokens)，未返回用量时为 None
+
+    cached_tokens 取自 usage.prompt_tokens_details.cached_tokens（OpenAI、DashScope 等
+    在命中提示词前缀缓存时返回），没有时为 0。
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is None or getattr(usage, 'prompt_tokens', None) is None:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) if details is not None else None
+    return usage.prompt_tokens, usage.completion_tokens or 0, cached or 0
+
+
+def custom_http_usage(response_text: str, prompt_text: str) -> Tuple[int, int, bool]:
+    """自定义HTTP响应的 (prompt_tokens, completion_tokens, 是否估算)
+
+    TGI 在 parameters.detail 为 true 时返回 details.generated_tokens 和 details.prefill，
+    取不到时按文本估算。
+    """
+    details = None
+    try:
+        data = json.loads(response_text)
+        if isinstance(data, list) and data:
+            data = data[0]
+        if isinstance(data, dict):
+            details = data.get('details')
+    except (ValueError, TypeError):
+        pass
+
+    if isinstance(details, dict) and details.get('generated_tokens') is not None:
+        prefill = details.get('prefill')
+        if isinstance(prefill, list) and prefill:
+            return len(prefill), details['generated_tokens'], False
+        return estimate_tokens(prompt_text), details['generated_tokens'], True
+    return estimate_tokens(prompt_text), estimate_tokens(response_text), True
+
+
+def record_chat_completion(backend: str, model: str, messages, response, started: float, retries: int = 0):
+    """记录一次 OpenAI 兼容接口调用，后端未返回用量时按消息文本估算"""
+    usage = openai_usage(response)
+    if usage is not None:
+        prompt_tokens, completion_tokens, cached_tokens = usage
+    else:
+        prompt_tokens = sum(estimate_tokens(message.get('content') or '') for message in messages)
+        completion_tokens = estimate_tokens(response.choices[0].message.content or '')
+        cached_tokens = 0
+    metrics.record(backend, model, prompt_tokens, completion_tokens,
+                   latency=time.monotonic() - started, retries=retries, estimated=usage is None,
+                   cached_tokens=cached_tokens)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 聊天记录解析结果（问题定位路径）的结构约定
+PATH_SCHEMA = {
+    "type": "object",
+    "required": ["steps"],
+    "properties": {
+        "problem": {"type": "string"},
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["question", "answer"],
+                "properties": {
+                    "step": {"type": "integer"},
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"}
+                }
+            }
+        },
+        "solution": {"type": "string"}
+    }
+}
+
+_TYPE_CHECKS = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+}
+
+# 结构化输出模式：json_schema/json_object 通过 OpenAI 兼容接口的 response_format 传递，
+# grammar 用于 custom_http（TGI 风格的 parameters.grammar）
+STRUCTURED_OUTPUT_MODES = ("json_schema", "json_object", "grammar", "none")
+
+# 嵌套在字符串字段里的JSON最多展开的层数（例如 custom_http 返回的 generated_text）
+_MAX_NESTED_DEPTH = 3
+
+# JSON对象的开头：{ 之后只能是空白再接键名或 }，不符合的（如正文中的 {注}）不必交给解码器
+_OBJECT_START = re.compile(r'\{[ \t\n\r]*["}]')
+
+# 分段解析的初始窗口，以及截断处附近多少个字符内的错误可能只是截断造成的（如 "-Infinity" 被截断）
+_DECODE_WINDOW = 256
+_TRUNCATION_MARGIN = 16
+
+
+def validate_json_schema(data: Any, schema: Dict, path: str = "$") -> List[str]:
+    """按简化的JSON Schema（type/required/properties/items）校验数据，返回错误列表"""
+    errors = []
+
+    expected_type = schema.get("type")
+    if expected_type and not _TYPE_CHECKS[expected_type](data):
+        errors.append(f"{path} 应为 {expected_type}")
+        return errors
+
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path} 缺少字段 {key}")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(validate_json_schema(data[key], sub_schema, f"{path}.{key}"))
+
+    if isinstance(data, list) and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate_json_schema(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
+
+
+def build_response_format(mode: str, schema: Dict, name: str = "response") -> Optional[Dict]:
+    """根据结构化输出模式生成 OpenAI 兼容的 response_format 参数"""
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": name, "schema": schema}
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def build_grammar(mode: str, schema: Dict) -> Optional[Dict]:
+    """根据结构化输出模式生成 custom_http 请求的 grammar 参数"""
+    if mode == "grammar":
+        return {"type": "json", "value": schema}
+    return None
+
+
+# 已闭合的 {...}：(起始位置, 结束位置, 其中直接包含的对象)
+_Span = Tuple[int, int, list]
+
+
+def _object_spans(text: str, pos: int = 0) -> List[_Span]:
+    """从 pos 开始线性扫描文本，返回最外层已闭合的 {...} 及其嵌套结构
+
+    单次遍历，用栈记录未闭合的括号和字符串/转义状态，字符串中的括号不计入深度，
+    因此对任意嵌套层数都有效，且不会像正则那样回溯。正文中有孤立的 { 导致
+    扫描到结尾仍未闭合时，它内部已闭合的最外层对象按出现顺序排在后面。
+    """
+    stack = []       # 未闭合的 {：(位置, 其中已闭合的对象)
+    roots = []
+    in_string = False
+    escaped = False
+
+    for i in range(pos, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            # 最外层对象之外的引号（普通文本）不进入字符串状态
+            if stack:
+                in_string = True
+        elif char == '{':
+            stack.append((i, []))
+        elif char == '}' and stack:
+            start, children = stack.pop()
+            (stack[-1][1] if stack else roots).append((start, i + 1, children))
+
+    for _, children in stack:
+        roots.extend(children)
+    return roots
+
+
+def iter_json_object_spans(text: str, pos: int = 0) -> Iterator[Tuple[int, int]]:
+    """从 pos 开始依次返回最外层 {...} 的起止位置（见 _object_spans）"""
+    for start, end, _ in _object_spans(text, pos):
+        yield start, end
+
+
+def _decode_object(text: str, start: int, end: int) -> Tuple[Any, Optional[int]]:
+    """解析 text[start:end]，返回 (对象, None)；不是合法JSON时返回 (None, 出错位置)
+
+    先解析开头一段，窗口逐次加倍：出错位置离截断处足够远时就能确定整段不合法，
+    因此失败的解析只读到出错处，不必复制整段（嵌套的非法对象逐层解析时保持线性）。
+    截断处附近出错或字符串未结束时，可能只是被截断，扩大窗口重试。
+    """
+    size = _DECODE_WINDOW
+    while True:
+        stop = min(start + size, end)
+        try:
+            return json.loads(text[start:stop]), None
+        except json.JSONDecodeError as e:
+            if stop == end or (e.pos < stop - start - _TRUNCATION_MARGIN
+                               and not e.msg.startswith("Unterminated string")):
+                return None, start + e.pos
+        size *= 2
+
+
+def _matches(data: Any, schema: Optional[Dict]) -> bool:
+    if schema is None:
+        return isinstance(data, dict)
+    return not validate_json_schema(data, schema)
+
+
+def _nested_strings(data: Any) -> Iterator[str]:
+    """遍历已解析JSON中的字符串值（用于展开包在响应字段里的JSON）"""
+    if isinstance(data, str):
+        if '{' in data:
+            yield data
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from _nested_strings(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _nested_strings(value)
+
+
+def extract_json_from_response(response: str, schema: Dict = None,
+                               _depth: int = 0) -> Optional[Dict]:
+    """从AI响应中提取第一个符合结构约定的JSON对象
+
+    依次尝试：整段解析（顶层为数组时逐个检查元素）、扫描出的每个最外层对象
+    （某段解析失败时改为检查其内部的对象）。解析出的对象不符合 schema 时
+    （例如 custom_http 返回的外层包装），继续在其字符串字段中查找。
+    """
+    if not response or not isinstance(response, str):
+        return None
+
+    candidates = []
+    stripped = response.strip()
+    if stripped.startswith(('{', '[')):
+        try:
+            data = json.loads(stripped)
+            candidates.append(data)
+            if isinstance(data, list):
+                candidates.extend(data)
+        except (json.JSONDecodeError, RecursionError):
+            pass
+
+    # 按出现顺序深度优先检查各对象，每段只解析一次：外层解析失败的位置落在某个
+    # 内层对象中间时，该内层对象从同一位置开始也必然失败，直接检查它的内部，
+    # 因此总的解析量与响应长度成线性关系
+    pending = [] if candidates else [(span, None) for span in reversed(_object_spans(response))]
+    while pending:
+        (start, end, children), failed_at = pending.pop()
+        if failed_at is not None and start < failed_at < end:
+            error_pos = failed_at
+        elif not _OBJECT_START.match(response, start):
+            error_pos = start + 1
+        else:
+            try:
+                data, error_pos = _decode_object(response, start, end)
+            except RecursionError:
+                # 嵌套过深，不会是约定的结构
+                continue
+            if error_pos is None:
+                if _matches(data, schema):
+                    return data
+                candidates.append(data)
+                continue
+        # 该段不是合法JSON（如正文中成对的括号），改为检查其内部的对象
+        pending.extend((child, error_pos) for child in reversed(children))
+
+    for data in candidates:
+        if _matches(data, schema):
+            return data
+
+    # 外层对象不符合约定：在其字符串字段中继续查找
+    if _depth < _MAX_NESTED_DEPTH:
+        for data in candidates:
+            for text in _nested_strings(data):
+                nested = extract_json_from_response(text, schema, _depth + 1)
+                if nested is not None:
+                    return nested
+
+    return None
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# 熔断器状态
+CLOSED = "closed"        # 正常
+OPEN = "open"            # 熔断中，冷却结束前不再请求
+HALF_OPEN = "half_open"  # 冷却结束，放行一次试探请求
+
+# 尚无延迟数据时按 1 秒计，新后端不会因为没有数据而被冷落
+DEFAULT_LATENCY = 1.0
+
+
+class RateLimitedError(Exception):
+    """后端限流（HTTP 429），retry_after 为服务端建议的等待秒数"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _rate_limit_wait(error: Exception) -> Optional[float]:
+    """错误为限流时返回建议等待秒数（未知时为 0），否则返回 None"""
+    if isinstance(error, RateLimitedError):
+        return error.retry_after or 0
+    if getattr(error, 'status_code', None) != 429:
+        return None
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+class _Backend:
+    def __init__(self, name: str, weight: float = 1.0, fallback: bool = False):
+        self.name = name
+        self.weight = weight
+        self.fallback = fallback
+        self.state = CLOSED
+        self.failures = 0          # 连续失败次数
+        self.open_until = 0.0
+        self.probing = False       # 半开状态下已有试探请求在途
+        self.latency = None        # 延迟的指数移动平均（秒）
+        self.last_error = None
+
+
+class BackendRouter:
+    """在多个AI后端之间按权重和延迟分配请求，失败时自动切换
+
+    - 选择：可用后端按 权重 / 平均延迟 加权随机，延迟低的后端分到更多请求
+    - 熔断：连续失败 failure_threshold 次或被限流时熔断，冷却 cooldown 秒
+      （限流时取服务端的 Retry-After）后只放行一个试探请求，试探结束前其他请求不使用该后端，
+      成功即恢复；所有后端都在熔断中时请求直接失败，不再发往故障中的后端
+    - 兜底：fallback 后端（如本地 Ollama）只在其他后端都不可用或都失败时使用
+    """
+
+    def __init__(self, backends: List[Dict], failure_threshold: int = 3, cooldown: float = 30,
+                 latency_alpha: float = 0.3, rng: random.Random = None, clock: Callable[[], float] = None):
+        if not backends:
+            raise ValueError("至少需要一个后端")
+        self.backends = {
+            item['name']: _Backend(item['name'], item.get('weight', 1.0), item.get('fallback', False))
+            for item in backends
+        }
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_alpha = latency_alpha
+        self._rng = rng or random.Random()
+        self._clock = clock or time.monotonic
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ai_config: Dict) -> 'BackendRouter':
+        """按 ai.routing 配置创建；未启用路由时只包含 current_api"""
+        ai = ai_config.get('ai', {})
+        routing = ai.get('routing', {}) or {}
+        if routing.get('enabled'):
+            backends = [item for item in routing.get('backends', []) if item.get('name') in ai.get('api', {})]
+        else:
+            backends = [{"name": ai.get('current_api')}]
+        return cls(backends,
+                   failure_threshold=routing.get('failure_threshold', 3),
+                   cooldown=routing.get('cooldown', 30),
+                   latency_alpha=routing.get('latency_alpha', 0.3))
+
+    # ------------------------------------------------------------------
+    # 选择
+    # ------------------------------------------------------------------
+
+    def _available(self, backend: _Backend, now: float) -> bool:
+        if backend.state == OPEN and now >= backend.open_until:
+            backend.state = HALF_OPEN
+        return backend.state == CLOSED or (backend.state == HALF_OPEN and not backend.probing)
+
+    def _score(self, backend: _Backend) -> float:
+        return backend.weight / (backend.latency or DEFAULT_LATENCY)
+
+    def candidates(self) -> List[str]:
+        """本次请求依次尝试的后端
+
+        首选按得分加权随机抽取，其余可用后端按得分排在后面，fallback 后端最后；
+        熔断中（冷却未结束）和试探请求在途的后端不返回，全部不可用时返回空列表，请求直接失败。
+        """
+        with self._lock:
+            now = self._clock()
+            available = [b for b in self.backends.values() if self._available(b, now)]
+            primary = [b for b in available if not b.fallback and b.weight > 0]
+            fallback = [b for b in available if b not in primary]
+
+            order = []
+            if primary:
+                first = self._rng.choices(primary, weights=[self._score(b) for b in primary])[0]
+                order.append(first)
+                order.extend(sorted((b for b in primary if b is not first), key=self._score, reverse=True))
+            order.extend(sorted(fallback, key=self._score, reverse=True))
+            return [b.name for b in order]
+
+    def _begin(self, name: str) -> bool:
+        """开始在后端上调用；半开状态下只有第一个调用者成为试探请求，其余返回 False"""
+        with self._lock:
+            backend = self.backends[name]
+            if backend.state == HALF_OPEN:
+                if backend.probing:
+                    return False
+                backend.probing = True
+            return True
+
+    def _abandon(self, name: str):
+        """试探请求被取消，没有结果：放行下一个试探请求"""
+        with self._lock:
+            self.backends[name].probing = False
+
+    # ------------------------------------------------------------------
+    # 结果反馈
+    # ------------------------------------------------------------------
+
+    def record_success(self, name: str, latency: float = None):
+        """记录成功并恢复后端；latency 为空时（如健康检查）不更新平均延迟"""
+        with self._lock:
+            backend = self.backends[name]
+            backend.state = CLOSED
+            backend.probing = False
+            backend.failures = 0
+            backend.last_error = None
+            if latency is None:
+                return
+            if backend.latency is None:
+                backend.latency = latency
+            else:
+                backend.latency += self.latency_alpha * (latency - backend.latency)
+
+    def _open(self, backend: _Backend, duration: float):
+        backend.state = OPEN
+        backend.open_until = max(backend.open_until, self._clock() + duration)
+
+    def record_failure(self, name: str, error: Exception = None, force_open: bool = False):
+        """记录失败；被限流、试探请求失败或连续失败达到阈值时熔断"""
+        with self._lock:
+            backend = self.backends[name]
+            backend.probing = False
+            backend.failures += 1
+            backend.last_error = str(error) if error else "无响应"
+            wait = _rate_limit_wait(error) if error else None
+            if wait is not None:
+                self._open(backend, wait or self.cooldown)
+            elif force_open or backend.state == HALF_OPEN or backend.failures >= self.failure_threshold:
+                self._open(backend, self.cooldown)
+
+    def _settle(self, name: str, started: float, result=None, error: Exception = None) -> bool:
+        """记录一次调用的结果，返回该结果是否可用"""
+        if error is not None:
+            print(f"[WARNING] 后端 {name} 调用失败，尝试下一个后端: {error}")
+            self.record_failure(name, error)
+            return False
+        if result is None:
+            self.record_failure(name)
+            return False
+        self.record_success(name, self._clock() - started)
+        return True
+
+    def call(self, func: Callable[[str], Optional[str]]) -> Optional[str]:
+        """依次在候选后端上调用 func(后端名)，返回第一个非空结果
+
+        func 返回 None 或抛出异常都视为该后端失败，切换到下一个后端。
+        """
+        for name in self.candidates():
+            if not self._begin(name):
+                continue
+            started = self._clock()
+            try:
+                result = func(name)
+            except Exception as e:
+                self._settle(name, started, error=e)
+                continue
+            except BaseException:
+                self._abandon(name)
+                raise
+            if self._settle(name, started, result):
+                return result
+        return None
+
+    async def acall(self, func: Callable[[str], Awaitable[Optional[str]]]) -> Optional[str]:
+        """call 的异步版本，func(后端名) 返回协程"""
+        for name in self.candidates():
+            if not self._begin(name):
+                continue
+            started = self._clock()
+            try:
+                result = await func(name)
+            except Exception as e:
+                self._settle(name, started, error=e)
+                continue
+            except BaseException:
+                self._abandon(name)
+                raise
+            if self._settle(name, started, result):
+                return result
+        return None
+
+    def health_check(self, probe: Callable[[str], bool]) -> Dict[str, bool]:
+        """主动探测所有后端（probe 返回是否健康），按结果更新熔断状态"""
+        results = {}
+        for name in self.backends:
+            try:
+                healthy = bool(probe(name))
+                error = None if healthy else RuntimeError("健康检查未通过")
+            except Exception as e:
+                healthy, error = False, e
+            if healthy:
+                self.record_success(name)
+            else:
+                # 健康检查失败直接熔断，不等累计到失败阈值
+                self.record_failure(name, error, force_open=True)
+            results[name] = healthy
+        return results
+
+    def status(self) -> List[Dict]:
+        """各后端的当前状态"""
+        with self._lock:
+            now = self._clock()
+            return [{
+                "name": b.name,
+                "weight": b.weight,
+                "fallback": b.fallback,
+                "state": b.state,
+                "consecutive_failures": b.failures,
+                "retry_in": round(max(b.open_until - now, 0), 1) if b.state == OPEN else 0,
+                "latency": round(b.latency, 3) if b.latency is not None else None,
+                "last_error": b.last_error,
+            } for b in self.backends.values()]
+
+
+# 同一进程内按路由配置共享路由器，熔断状态不随调用器实例重建而丢失
+_routers: Dict[str, BackendRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(ai_config: Dict) -> BackendRouter:
+    """返回与配置对应的共享路由器"""
+    ai = ai_config.get('ai', {})
+    key = json.dumps([ai.get('current_api'), ai.get('routing')], sort_keys=True, default=str)
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = BackendRouter.from_config(ai_config)
+        return _routers[key]
+
+
+def all_routers() -> List[BackendRouter]:
+    with _routers_lock:
+        return list(_routers.values())
@@ -12,6 +12,8 @@ from datetime import datetime
 from ai_chat_parser import AIChatParser
 from tree_visualizer import TreeVisualizer
 from web_confirmation_ui import WebConfirmationUI
+from tree_merger import TreeMerger, merge_report_summary
+from ai_metrics import metrics
 
 class AITreeAugmentor:
     def __init__(self, config_dir: str = "config"):
@@ -24,6 +26,8 @@ class AITreeAugmentor:
         # 加载现有决策树
         self.tree_file = os.path.join(config_dir, "decision_tree.yaml")
         self.existing_tree = self._load_existing_tree()
+        self.last_merge_report = None
+        self.last_metrics = None
         
     def _load_existing_tree(self) -> Dict:
         """加载现有决策树"""
@@ -124,23 +128,84 @@ class AITreeAugmentor:
         """批量处理聊天记录文件"""
         print(f"开始批量处理 {len(chat_files)} 个聊天记录文件...")
         
+        # 整个批次和每个文件的AI调用分别统计，写入处理报告
+        with metrics.job(f"批量处理 {len(chat_files)} 个文件") as batch_job:
+            if auto_merge:
+                # 自动合并模式：所有路径一次性合并，决策树只写一次
+                results = self.batch_merge_chats(chat_files)
+            else:
+                results = self._process_chat_files(chat_files)
+        self.last_metrics = batch_job
+        return results
+    
+    def _process_chat_files(self, chat_files: List[str]) -> List[Dict]:
+        """逐个处理聊天记录文件（不自动合并）"""
         results = []
         for i, chat_file in enumerate(chat_files, 1):
             print(f"\n📄 处理文件 {i}/{len(chat_files)}: {chat_file}")
             
+            with metrics.job(chat_file) as file_job:
+                results.append(self._process_chat_file(chat_file))
+            results[-1]['ai_usage'] = file_job['total']
+        
+        return results
+    
+    def _process_chat_file(self, chat_file: str) -> Dict:
+        """处理单个聊天记录文件"""
+        try:
+            with open(chat_file, 'r', encoding='utf-8') as f:
+                chat_history = f.read()
+            
+            result = self.process_chat_and_augment(chat_history)
+            result['source_file'] = chat_file
+            
+            if result['success']:
+                print(f"[OK] 文件 {chat_file} 处理成功")
+            else:
+                print(f"[ERROR] 文件 {chat_file} 处理失败: {result.get('error', '未知错误')}")
+            return result
+                
+        except Exception as e:
+            print(f"[ERROR] 处理文件 {chat_file} 时发生错误: {e}")
+            return {
+                "success": False,
+                "source_file": chat_file,
+                "error": str(e)
+            }
+    
+    def batch_merge_chats(self, chat_files: List[str]) -> List[Dict]:
+        """批量解析聊天记录，按前缀树一次性合并所有路径后保存"""
+        results = []
+        paths = []
+        
+        for i, chat_file in enumerate(chat_files, 1):
+            print(f"\n📄 解析文件 {i}/{len(chat_files)}: {chat_file}")
+            
             try:
                 with open(chat_file, 'r', encoding='utf-8') as f:
                     chat_history = f.read()
                 
-                result = self.process_chat_and_augment(chat_history, auto_merge)
-                result['source_file'] = chat_file
-                results.append(result)
+                with metrics.job(chat_file) as file_job:
+                    path_data = self.parser.parse_chat_to_path(chat_history, self.existing_tree)
+                if not path_data:
+                    results.append({
+                        "success": False,
+                        "source_file": chat_file,
+                        "error": "解析聊天记录失败",
+                        "ai_usage": file_job['total']
+                    })
+                    continue
+                
+                paths.append(path_data)
+                results.append({
+                    "success": True,
+                    "source_file": chat_file,
+                    "path_data": path_data,
+                    "new_nodes": self.parser.convert_path_to_tree(path_data) or {},
+                    "ai_usage": file_job['total'],
+                    "timestamp": datetime.now().isoformat()
+                })
                 
-                if result['success']:
-                    print(f"[OK] 文件 {chat_file} 处理成功")
-                else:
-                    print(f"[ERROR] 文件 {chat_file} 处理失败: {result.get('error', '未知错误')}")
-                    
             except Exception as e:
                 print(f"[ERROR] 处理文件 {chat_file} 时发生错误: {e}")
                 results.append({
@@ -149,6 +214,13 @@ class AITreeAugmentor:
                     "error": str(e)
                 })
         
+        if paths:
+            merger = TreeMerger.from_config(self.existing_tree, self.parser.ai_config)
+            report = merger.merge_paths(paths)
+            print(f"[OK] 批量合并 {report['path_count']} 条路径: {merge_report_summary(report)}")
+            self._save_tree(merger.tree)
+            self.last_merge_report = report
+        
         return results
     
     def generate_report(self, results: List[Dict], output_file: str = "augmentation_report.html"):
@@ -163,16 +235,16 @@ class AITreeAugmentor:
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>AI决策树增强报告</title>
     <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .header { background-color: #f0f0f0; padding: 20px; border-radius: 5px; }
-        .summary { background-color: #e8f5e8; padding: 15px; border-radius: 5px; margin: 10px 0; }
-        .error { background-color: #ffebee; padding: 15px; border-radius: 5px; margin: 10px 0; }
-        .file-result { border: 1px solid #ddd; margin: 10px 0; padding: 15px; border-radius: 5px; }
-        .success { border-left: 5px solid #4caf50; }
-        .failure { border-left: 5px solid #f44336; }
-        table { border-collapse: collapse; width: 100%; }
-        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-        th { background-color: #f2f2f2; }
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        .header {{ background-color: #f0f0f0; padding: 20px; border-radius: 5px; }}
+        .summary {{ background-color: #e8f5e8; padding: 15px; border-radius: 5px; margin: 10px 0; }}
+        .error {{ background-color: #ffebee; padding: 15px; border-radius: 5px; margin: 10px 0; }}
+        .file-result {{ border: 1px solid #ddd; margin: 10px 0; padding: 15px; border-radius: 5px; }}
+        .success {{ border-left: 5px solid #4caf50; }}
+        .failure {{ border-left: 5px solid #f44336; }}
+        table {{ border-collapse: collapse; width: 100%; }}
+        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+        th {{ background-color: #f2f2f2; }}
     </style>
 </head>
 <body>
@@ -208,6 +280,8 @@ class AITreeAugmentor:
         </table>
     </div>
     
+    {metrics_section}
+    
     <h2>详细结果</h2>
     {file_results}
 </body>
@@ -218,20 +292,26 @@ class AITreeAugmentor:
         total_files = len(results)
         success_count = sum(1 for r in results if r['success'])
         failure_count = total_files - success_count
-        total_new_nodes = sum(
-            len(r.get('new_nodes', {}).get('nodes', {})) 
-            for r in results if r['success']
-        )
+        if self.last_merge_report:
+            # 批量合并时以去重后实际新增的节点为准
+            total_new_nodes = len(self.last_merge_report['added_nodes'])
+        else:
+            total_new_nodes = sum(
+                len(r.get('new_nodes', {}).get('nodes', {})) 
+                for r in results if r['success']
+            )
         
         # 生成文件结果HTML
         file_results_html = ""
         for result in results:
+            usage_html = self._usage_line(result.get('ai_usage'))
             if result['success']:
                 file_results_html += f"""
                 <div class="file-result success">
                     <h3>[OK] {result['source_file']}</h3>
                     <p><strong>新增节点:</strong> {len(result['new_nodes'].get('nodes', {}))}</p>
-                    <p><strong>修改节点:</strong> {len(result['diff_report']['details']['modified_nodes'])}</p>
+                    <p><strong>修改节点:</strong> {len(result.get('diff_report', {}).get('details', {}).get('modified_nodes', []))}</p>
+                    {usage_html}
                     <p><strong>处理时间:</strong> {result['timestamp']}</p>
                 </div>
                 """
@@ -240,6 +320,7 @@ class AITreeAugmentor:
                 <div class="file-result failure">
                     <h3>[ERROR] {result['source_file']}</h3>
                     <p><strong>错误:</strong> {result.get('error', '未知错误')}</p>
+                    {usage_html}
                 </div>
                 """
         
@@ -250,6 +331,7 @@ class AITreeAugmentor:
             success_count=success_count,
             failure_count=failure_count,
             total_new_nodes=total_new_nodes,
+            metrics_section=self._metrics_section(),
             file_results=file_results_html
         )
         
@@ -260,6 +342,55 @@ class AITreeAugmentor:
         print(f"[OK] 报告已生成: {output_file}")
         return output_file
     
+    def _usage_line(self, usage: Optional[Dict]) -> str:
+        """单个文件的AI调用统计"""
+        if not usage:
+            return ""
+        return (f"<p><strong>AI调用:</strong> {usage['calls']} 次，"
+                f"{usage['total_tokens']} token，耗时 {usage['latency_total']} 秒，"
+                f"估算费用 {usage['cost']} {metrics.currency}</p>")
+    
+    def _metrics_section(self) -> str:
+        """批次的AI调用统计表（按后端/模型）"""
+        if not self.last_metrics:
+            return ""
+        
+        rows = ""
+        for name, stats in [*self.last_metrics['backends'].items(), ("合计", self.last_metrics['total'])]:
+            rows += f"""
+            <tr>
+                <td>{name}</td>
+                <td>{stats['calls']}</td>
+                <td>{stats['failures']}</td>
+                <td>{stats['retries']}</td>
+                <td>{stats['prompt_tokens']}</td>
+                <td>{stats['cache_hit_rate']:.0%}</td>
+                <td>{stats['completion_tokens']}</td>
+                <td>{stats['latency_avg']}</td>
+                <td>{stats['cost']}</td>
+            </tr>"""
+        
+        estimated = self.last_metrics['total']['estimated_calls']
+        note = f"<p>其中 {estimated} 次调用的 token 数为估算值（后端未返回用量）</p>" if estimated else ""
+        return f"""
+    <div class="summary">
+        <h2>AI调用统计</h2>
+        <table>
+            <tr>
+                <th>后端/模型</th>
+                <th>调用次数</th>
+                <th>失败</th>
+                <th>重试</th>
+                <th>输入token</th>
+                <th>缓存命中率</th>
+                <th>输出token</th>
+                <th>平均耗时(秒)</th>
+                <th>估算费用({metrics.currency})</th>
+            </tr>{rows}
+        </table>
+        {note}
+    </div>"""
+    
     def interactive_mode(self):
         """交互模式"""
         print("🎮 进入交互模式...")
@@ -5,6 +5,15 @@ from flask_cors import CORS
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from decision_tree_engine import DecisionTreeEngine
+from tree_merger import TreeMerger
+from tree_layout import TreeLayoutService, slice_tree
+from tree_revisions import TreeRevisionLog
+from tree_search import TreeSearchIndex
+from path_stats import PathStats
+from ai_metrics import metrics
+from prompt_templates import compile_prompt, load_prompts, prompt_versions
+from chat_preprocessor import preprocess_for_prompt
+from ai_router import get_router
 import platform
 
 app = Flask(__name__)
@@ -33,12 +42,20 @@ def get_safe_chars():
 safe_chars = get_safe_chars()
 
 class DecisionTreeAPI:
-    def __init__(self, config_file: str = None):
+    def __init__(self, config_file: str = None, stats_file: str = None):
         if config_file is None:
             # 使用绝对路径
             config_file = os.path.join(os.path.dirname(__file__), 'config', 'decision_tree.yaml')
+        if stats_file is None:
+            # 路径统计数据库默认与决策树放在同一目录，首次记录或查询时才创建
+            stats_file = os.environ.get('PATH_STATS_DB') or \
+                os.path.join(os.path.dirname(config_file), 'path_stats.db')
         self.config_file = config_file
-        self.engine = DecisionTreeEngine(config_file)
+        self.path_stats = PathStats(stats_file)
+        self.engine = DecisionTreeEngine(config_file, stats=self.path_stats)
+        self.layout_service = TreeLayoutService()
+        self.revisions = TreeRevisionLog()
+        self.search_index = TreeSearchIndex()
     
     def load_tree(self):
         """加载决策树数据"""
@@ -88,6 +105,51 @@ class DecisionTreeAPI:
                         errors.append(f"节点 '{node_id}' 引用了不存在的节点 '{option['next_node']}'")
         
         return errors
+    
+    def apply_patch(self, tree_data, ops):
+        """按操作列表修改决策树，返回新的决策树（不修改传入的数据）
+        
+        支持的操作：
+          {"op": "set", "node_id": ..., "value": {...}}  写入节点
+          {"op": "delete", "node_id": ...}               删除节点
+          {"op": "root", "value": ...}                   修改根节点
+        
+        操作格式不正确时抛出 ValueError
+        """
+        if not isinstance(ops, list):
+            raise ValueError("ops 必须是列表")
+        nodes = dict(tree_data.get('nodes', {}))
+        patched = {**tree_data, "nodes": nodes}
+        
+        for i, op in enumerate(ops):
+            if not isinstance(op, dict):
+                raise ValueError(f"第 {i+1} 个操作不是对象")
+            kind = op.get('op')
+            if kind in ('set', 'delete') and not isinstance(op.get('node_id'), str):
+                raise ValueError(f"第 {i+1} 个操作缺少 node_id")
+            if kind == 'set' and not isinstance(op.get('value'), dict):
+                raise ValueError(f"第 {i+1} 个操作的 value 必须是节点对象")
+            if kind == 'root' and not isinstance(op.get('value'), str):
+                raise ValueError(f"第 {i+1} 个操作的 value 必须是节点ID")
+            if kind == 'set':
+                nodes[op['node_id']] = op['value']
+            elif kind == 'delete':
+                nodes.pop(op['node_id'], None)
+            elif kind == 'root':
+                patched['root_node'] = op['value']
+            else:
+                raise ValueError(f"第 {i+1} 个操作类型未知: {kind}")
+        
+        return patched
+
+def load_ai_config():
+    """加载AI配置"""
+    try:
+        with open('config/ai_config.yaml', 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except Exception as e:
+        print(f"{safe_chars['error']} 加载AI配置失败: {e}")
+        return {}
 
 api = DecisionTreeAPI()
 
@@ -95,12 +157,90 @@ api = DecisionTreeAPI()
 def get_tree():
     """获取决策树数据"""
     tree_data = api.load_tree()
-    return jsonify(tree_data)
+    if "error" in tree_data:
+        return jsonify(tree_data)
+    
+    # 完整决策树的版本号，用于增量保存时检测冲突和增量同步
+    revision = api.revisions.record(tree_data)
+    
+    # 指定 depth 时只返回前几层，其余子树由前端展开时按需加载
+    depth = request.args.get('depth', type=int)
+    truncated = []
+    if depth is not None:
+        sliced = slice_tree(tree_data, depth)
+        tree_data = {**tree_data, "nodes": sliced["nodes"]}
+        truncated = sliced["truncated"]
+    
+    # 附带按版本缓存的节点布局（node_id -> {x, depth}），前端可直接渲染
+    positions = api.layout_service.layout(tree_data)["positions"]
+    return jsonify({**tree_data, "positions": positions, "truncated": truncated, "revision": revision})
+
+@app.route('/api/tree/children/<node_id>', methods=['GET'])
+def get_tree_children(node_id):
+    """按需加载节点的后代（默认一层）"""
+    tree_data = api.load_tree()
+    if "error" in tree_data:
+        return jsonify(tree_data), 500
+    if node_id not in tree_data.get('nodes', {}):
+        return jsonify({"error": f"节点 '{node_id}' 不存在"}), 404
+    
+    depth = request.args.get('depth', 1, type=int)
+    sliced = slice_tree(tree_data, max(depth, 1), start_node=node_id)
+    return jsonify({"node_id": node_id, **sliced})
+
+@app.route('/api/tree/delta', methods=['GET'])
+def get_tree_delta():
+    """返回自 since 版本以来变化的节点，供前端更新本地缓存"""
+    tree_data = api.load_tree()
+    if "error" in tree_data:
+        return jsonify(tree_data), 500
+    
+    since = request.args.get('since', '')
+    delta = api.revisions.delta(tree_data, since)
+    if delta is None:
+        # 版本未记录（过旧或服务重启），需要重新完整加载
+        return jsonify({"error": f"版本 '{since}' 不可用", "revision": api.revisions.record(tree_data)}), 410
+    return jsonify(delta)
+
+@app.route('/api/search', methods=['GET'])
+def search_nodes():
+    """按节点ID、问题、选项和解决方案搜索节点"""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    tree_data = api.load_tree()
+    if "error" in tree_data:
+        return jsonify(tree_data), 500
+    
+    # 索引按版本缓存，决策树未变化时直接查询
+    revision = api.revisions.record(tree_data)
+    api.search_index.build(tree_data, revision)
+    results = api.search_index.search(query, limit)
+    for result in results:
+        node_data = tree_data['nodes'][result['node_id']]
+        result['type'] = 'solution' if 'solution' in node_data else 'decision'
+    
+    return jsonify({"query": query, "revision": revision, "results": results})
+
+@app.route('/api/path-stats', methods=['GET'])
+def path_stats():
+    """问题定位路径使用统计：各选项的选择次数和占比、从未选择的选项和从未到达的节点
+
+    min_visits 为判断从未选择的选项时节点至少需要的访问次数，访问太少的节点不下结论。
+    """
+    tree_data = api.load_tree()
+    if "error" in tree_data:
+        return jsonify(tree_data), 500
+    min_visits = request.args.get('min_visits', 1, type=int)
+    return jsonify(api.path_stats.report(tree_data, min_visits))
 
 @app.route('/api/tree', methods=['POST'])
 def save_tree():
     """保存决策树数据"""
     tree_data = request.json
+    # 布局和按需加载标记由服务端生成，不保存到配置文件
+    tree_data.pop('positions', None)
+    tree_data.pop('truncated', None)
+    tree_data.pop('revision', None)
     
     # 验证数据
     errors = api.validate_tree(tree_data)
@@ -112,7 +252,43 @@ def save_tree():
     if "error" in result:
         return jsonify(result), 500
     
-    return jsonify(result)
+    return jsonify({**result, "revision": api.revisions.record(tree_data)})
+
+@app.route('/api/tree/patch', methods=['POST'])
+def patch_tree():
+    """增量保存：应用前端操作日志中变化的节点"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "请求体必须是JSON对象"}), 400
+    
+    # 必须指明基于的版本，没有版本号的客户端应保存完整决策树（POST /api/tree）
+    base_revision = data.get('base_revision')
+    if not base_revision:
+        return jsonify({"error": "缺少 base_revision"}), 400
+    
+    tree_data = api.load_tree()
+    if "error" in tree_data:
+        return jsonify(tree_data), 500
+    
+    # 基于的版本与服务器不一致时拒绝，避免覆盖其他人的修改
+    current_revision = api.revisions.record(tree_data)
+    if base_revision != current_revision:
+        return jsonify({"error": "决策树已被修改，请重新加载", "revision": current_revision}), 409
+    
+    try:
+        tree_data = api.apply_patch(tree_data, data.get('ops', []))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"无效的操作: {e}"}), 400
+    
+    errors = api.validate_tree(tree_data)
+    if errors:
+        return jsonify({"error": "验证失败", "details": errors}), 400
+    
+    result = api.save_tree(tree_data)
+    if "error" in result:
+        return jsonify(result), 500
+    
+    return jsonify({**result, "revision": api.revisions.record(tree_data)})
 
 @app.route('/api/validate', methods=['POST'])
 def validate_tree():
@@ -141,6 +317,29 @@ def test_tree():
         return jsonify({"error": str(e)}), 500
 
 # AI增强相关接口
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """AI调用统计：按后端/模型汇总的 token、提示词缓存命中率、耗时、重试和估算费用
+
+    附带当前各提示词的版本号，提示词修改后可据此对照统计变化。
+    """
+    return jsonify({**metrics.summary(), "prompt_versions": prompt_versions(load_prompts())})
+
+@app.route('/api/metrics', methods=['DELETE'])
+def reset_metrics():
+    """清空AI调用统计"""
+    metrics.reset()
+    return jsonify({"success": True})
+
+@app.route('/api/ai/backends', methods=['GET'])
+def ai_backends():
+    """AI后端路由状态（熔断状态、平均延迟、最近错误）；check=1 时先主动探测各后端"""
+    router = get_router(load_ai_config())
+    if request.args.get('check'):
+        from direct_ai_call import DirectAICaller
+        router.health_check(DirectAICaller().check_backend)
+    return jsonify({"backends": router.status()})
+
 @app.route('/api/ai/direct-process', methods=['POST'])
 def direct_process_chat():
     """直接调用AI API处理聊天记录"""
@@ -161,11 +360,25 @@ def direct_process_chat():
         # 记录AI对话
         log_ai_conversation(caller, chat_history)
         
-        # 1. 直接解析聊天记录为路径（不传递决策树）
-        path_data = caller.parse_chat_to_path(chat_history)
+        with open('config/decision_tree.yaml', 'r', encoding='utf-8') as f:
+            existing_tree = (yaml.safe_load(f) or {}).get('decision_tree', {})
+        
+        # 1. 直接解析聊天记录为路径（决策树只用于本地匹配已有路径，不发送给AI）
+        path_data = caller.parse_chat_to_path(chat_history, existing_tree)
         if not path_data:
             return jsonify({'success': False, 'error': 'AI解析失败'})
         
+        # 与已有路径一致（快速路径）：节点都已存在，决策树无需修改，也不写回文件
+        if path_data.get('fast_path'):
+            return jsonify({
+                'success': True,
+                'data': existing_tree,
+                'changes': [],
+                'new_nodes': {'nodes': {}},
+                'path_data': path_data,
+                'message': '聊天记录与已有路径一致，决策树无需修改'
+            })
+        
         # 2. 转换为节点结构
         nodes = caller.convert_path_to_nodes(path_data)
         if not nodes:
@@ -173,10 +386,6 @@ def direct_process_chat():
         
         # 3. 合并到现有决策树
         try:
-            with open('config/decision_tree.yaml', 'r', encoding='utf-8') as f:
-                tree_data = yaml.safe_load(f)
-                existing_tree = tree_data.get('decision_tree', {})
-            
             merged_tree = caller.merge_to_existing_tree(nodes, existing_tree)
             
             if auto_merge:
@@ -192,24 +401,30 @@ def direct_process_chat():
                     'new_nodes': nodes
                 })
             else:
-                # 返回预览
+                # 返回预览（根据合并报告区分新增和复用的节点）
                 changes = []
-                original_node_ids = set(existing_tree.get('nodes', {}).keys())
-                new_node_ids = set(nodes.get('nodes', {}).keys())
+                report = caller.last_merge_report or {}
                 
-                for node_id in new_node_ids:
-                    if node_id not in original_node_ids:
-                        changes.append({
-                            'id': node_id,
-                            'type': 'new',
-                            'text': f'新增节点: {node_id}'
-                        })
-                    else:
-                        changes.append({
-                            'id': node_id,
-                            'type': 'modified',
-                            'text': f'修改节点: {node_id}'
-                        })
+                for node_id in report.get('added_nodes', []):
+                    changes.append({
+                        'id': node_id,
+                        'type': 'new',
+                        'text': f'新增节点: {node_id}'
+                    })
+                
+                for node_id in report.get('updated_nodes', []):
+                    changes.append({
+                        'id': node_id,
+                        'type': 'modified',
+                        'text': f'修改节点: {node_id}'
+                    })
+                
+                for new_id, existing_id in report.get('reused_nodes', {}).items():
+                    changes.append({
+                        'id': new_id,
+                        'type': 'reused',
+                        'text': f'复用已有节点: {existing_id}'
+                    })
                 
                 return jsonify({
                     'success': True,
@@ -225,6 +440,37 @@ def direct_process_chat():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/ai/batch-merge', methods=['POST'])
+def batch_merge_paths():
+    """批量合并已解析的AI路径（前缀树合并，只保存一次）"""
+    try:
+        data = request.get_json()
+        paths = data.get('paths', [])
+        auto_merge = data.get('auto_merge', False)
+        
+        if not paths:
+            return jsonify({'success': False, 'error': '没有要合并的路径'})
+        
+        with open('config/decision_tree.yaml', 'r', encoding='utf-8') as f:
+            tree_data = yaml.safe_load(f)
+            existing_tree = tree_data.get('decision_tree', {})
+        
+        merger = TreeMerger.from_config(existing_tree, load_ai_config())
+        report = merger.merge_paths(paths)
+        
+        if auto_merge:
+            with open('config/decision_tree.yaml', 'w', encoding='utf-8') as f:
+                yaml.dump({'decision_tree': merger.tree}, f, default_flow_style=False, allow_unicode=True, indent=2)
+        
+        return jsonify({
+            'success': True,
+            'data': merger.tree,
+            'merge_report': report,
+            'message': f"已合并 {report['path_count']} 条路径" if auto_merge else '批量合并预览'
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 def log_ai_conversation(caller, chat_history):
     """记录AI对话"""
     try:
@@ -235,13 +481,9 @@ def log_ai_conversation(caller, chat_history):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         # 构建发送给AI的消息
-        system_prompt = caller.prompts['chat_analysis']['system']
-        user_prompt = caller.prompts['chat_analysis']['user'].format(chat_history=chat_history)
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        template = compile_prompt(caller.prompts['chat_analysis'])
+        messages = template.messages(chat_history=preprocess_for_prompt(caller.ai_config, template, chat_history))
+        system_prompt, user_prompt = messages[0]['content'], messages[1]['content']
         
         # 记录开始时间
         start_time = datetime.now()
@@ -262,7 +504,7 @@ def log_ai_conversation(caller, chat_history):
         log_content.append(f"{safe_chars['time']} 处理时间: {processing_time:.2f}秒")
         log_content.append("")
         
-        log_content.append(f"{safe_chars['info']} 发送给AI的消息:")
+        log_content.append(f"{safe_chars['info']} 发送给AI的消息 (提示词版本 {template.version}):")
         log_content.append(safe_chars['sub_separator'])
         log_content.append(f"{safe_chars['system']} System Prompt:")
         log_content.append(system_prompt)
@@ -321,14 +563,20 @@ def confirm_changes():
             existing_tree = tree_data.get('decision_tree', {})
         
         # 合并决策树
-        merged_tree = existing_tree.copy()
-        if 'nodes' in new_nodes:
-            merged_tree['nodes'] = merged_tree.get('nodes', {}).copy()
-            merged_tree['nodes'].update(new_nodes['nodes'])
-        
-        # 合并根节点（如果新树有根节点）
-        if 'root_node' in new_nodes:
-            merged_tree['root_node'] = new_nodes['root_node']
+        if 'entry_node' in new_nodes:
+            # AI生成的路径：按文本索引去重后挂接
+            merger = TreeMerger.from_config(existing_tree, load_ai_config())
+            merger.merge(new_nodes)
+            merged_tree = merger.tree
+        else:
+            merged_tree = existing_tree.copy()
+            if 'nodes' in new_nodes:
+                merged_tree['nodes'] = merged_tree.get('nodes', {}).copy()
+                merged_tree['nodes'].update(new_nodes['nodes'])
+            
+            # 合并根节点（如果新树有根节点）
+            if 'root_node' in new_nodes:
+                merged_tree['root_node'] = new_nodes['root_node']
         
         # 保存合并后的决策树
         with open('config/decision_tree.yaml', 'w', encoding='utf-8') as f:
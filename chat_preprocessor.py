@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from prompt_context import PromptBuilder, estimate_tokens
+from prompt_templates import PromptTemplate
+
+# 发言人标签，如 "用户: ..."、"客服：..."；不以数字开头，避免把 "12:00:00" 当作发言人
+_TURN_START = re.compile(r'^\s*([^\W\d_][^\s:：]{0,11})\s*[:：]\s?(.*)$')
+
+# 常见的发言人，出现一次即可识别；其他标签需出现至少两次且不是全大写英文
+# （全大写的通常是日志级别，如 "ERROR: ..."）
+KNOWN_SPEAKERS = {"用户", "客户", "客服", "技术支持", "工程师", "坐席", "user", "customer", "agent",
+                  "assistant", "support"}
+
+# 判断一轮对话是否只剩寒暄时忽略的字符
+_FILLER = re.compile(r'[\s\W_]+')
+
+# 聊天记录的最小 token 预算：模型上下文扣除提示词其余部分后不足该值时仍按该值精简，
+# 宁可提示词略超出上下文，也不把聊天记录截成空
+MIN_CHAT_TOKENS = 256
+
+
+def _keyword_pattern(keywords: List[str]) -> Optional[re.Pattern]:
+    """寒暄关键词的正则：英文关键词按整词匹配（"ok" 不匹配 "book"），中文按子串匹配"""
+    if not keywords:
+        return None
+    parts = []
+    for keyword in sorted(keywords, key=len, reverse=True):
+        escaped = re.escape(keyword)
+        if re.fullmatch(r'[a-z0-9]+', keyword):
+            escaped = rf'(?<![a-z0-9]){escaped}(?![a-z0-9])'
+        parts.append(escaped)
+    return re.compile('|'.join(parts))
+
+
+class ChatPreprocessor:
+    """发送给AI之前精简聊天记录，减少提示词 token
+
+    依次执行：
+    1. 去掉只有寒暄的发言（去掉 exclude_keywords 后不剩内容，如 "好的，谢谢"）
+    2. 合并连续重复的行和连续重复的发言
+    3. 截断超长的发言（粘贴的日志等），保留开头和结尾
+    4. 仍超出 max_tokens 时，优先删除不含问题/解决方案关键词、也不紧邻这类发言的发言，
+       第一条和最后一条发言始终保留；最后按预算截断整段文本，保证不超出预算
+
+    问答步骤往往不含关键词（如 "WiFi连接"），因此第 4 步只在超出预算时执行。
+    """
+
+    def __init__(self, problem_keywords: List[str] = None, solution_keywords: List[str] = None,
+                 exclude_keywords: List[str] = None, max_tokens: int = 3000, max_turn_chars: int = 800):
+        self.problem_keywords = [k.lower() for k in problem_keywords or []]
+        self.solution_keywords = [k.lower() for k in solution_keywords or []]
+        self.exclude_keywords = [k.lower() for k in exclude_keywords or []]
+        self._exclude_pattern = _keyword_pattern(self.exclude_keywords)
+        self.max_tokens = max_tokens
+        self.max_turn_chars = max_turn_chars
+
+    @classmethod
+    def from_config(cls, ai_config: Dict, max_tokens: int = None) -> Optional['ChatPreprocessor']:
+        """按 chat_parser 配置创建，未启用预处理时返回 None；max_tokens 可进一步收紧预算"""
+        chat_parser = (ai_config or {}).get('chat_parser', {}) or {}
+        preprocess = chat_parser.get('preprocess', {}) or {}
+        if not preprocess.get('enabled'):
+            return None
+        rules = chat_parser.get('rules', {}) or {}
+        budget = preprocess.get('max_tokens', 3000)
+        if max_tokens is not None:
+            budget = min(budget, max(max_tokens, MIN_CHAT_TOKENS))
+        return cls(rules.get('problem_keywords'), rules.get('solution_keywords'),
+                   rules.get('exclude_keywords'), budget, preprocess.get('max_turn_chars', 800))
+
+    # ------------------------------------------------------------------
+    # 拆分发言
+    # ------------------------------------------------------------------
+
+    def _split_turns(self, chat_history: str) -> List[List]:
+        """拆分为 [发言人, 文本] 列表；不以发言人开头的行（如粘贴的日志）属于上一条发言"""
+        lines = chat_history.strip().splitlines()
+        labels = {}
+        for line in lines:
+            match = _TURN_START.match(line)
+            if match:
+                labels[match.group(1)] = labels.get(match.group(1), 0) + 1
+        speakers = {label for label, count in labels.items()
+                    if label.lower() in KNOWN_SPEAKERS or (count >= 2 and not (label.isascii() and label.isupper()))}
+
+        turns = []
+        for line in lines:
+            match = _TURN_START.match(line)
+            if match and match.group(1) in speakers:
+                turns.append([match.group(1), match.group(2)])
+            elif turns:
+                turns[-1][1] += "\n" + line
+            elif line.strip():
+                turns.append([None, line])
+        return turns
+
+    @staticmethod
+    def _format(turns: List[List]) -> str:
+        return "\n".join(f"{speaker}: {text}" if speaker else text for speaker, text in turns)
+
+    # ------------------------------------------------------------------
+    # 各步骤
+    # ------------------------------------------------------------------
+
+    def _is_greeting(self, text: str) -> bool:
+        """去掉寒暄关键词和标点后什么都不剩的发言（"好的，谢谢"）；"好的，不亮" 这类简短回答保留"""
+        if self._exclude_pattern is None:
+            return False
+        lowered = text.lower()
+        if not self._exclude_pattern.search(lowered):
+            return False
+        return not _FILLER.sub("", self._exclude_pattern.sub("", lowered))
+
+    @staticmethod
+    def _collapse_lines(text: str) -> str:
+        result, previous, count = [], None, 0
+        for line in text.split("\n") + [None]:
+            key = line.strip() if line is not None else None
+            if key == previous and key:
+                count += 1
+                continue
+            if count > 1:
+                result[-1] += f" （重复 {count} 次）"
+            if line is not None:
+                result.append(line)
+            previous, count = key, 1
+        return "\n".join(result)
+
+    def _truncate(self, text: str, max_chars: int) -> str:
+        if len(text) <= max_chars:
+            return text
+        head = max_chars * 2 // 3
+        tail = max_chars - head
+        return f"{text[:head]}\n...[省略 {len(text) - max_chars} 字]...\n{text[-tail:]}"
+
+    def _has_signal(self, text: str) -> bool:
+        lowered = text.lower()
+        return any(keyword in lowered for keyword in self.problem_keywords + self.solution_keywords)
+
+    def _fit_budget(self, turns: List[List]) -> List[List]:
+        """超出预算时按优先级删除发言：无关键词且不紧邻关键词发言的先删，同级先删长的"""
+        signal = [self._has_signal(text) for _, text in turns]
+        last = len(turns) - 1
+        priority = []
+        for index in range(len(turns)):
+            if index in (0, last):
+                continue
+            if signal[index]:
+                score = 2
+            elif signal[index - 1] or (index < last and signal[index + 1]):
+                score = 1
+            else:
+                score = 0
+            if score < 2:
+                priority.append((score, -len(turns[index][1]), index))
+
+        # 按每条发言的 token 数累减（近似值，最终由 _hard_limit 保证预算）
+        costs = [estimate_tokens(self._format([turn])) + 1 for turn in turns]
+        kept = set(range(len(turns)))
+        tokens = sum(costs)
+        for _, _, index in sorted(priority):
+            if tokens <= self.max_tokens:
+                break
+            kept.discard(index)
+            tokens -= costs[index]
+        return [turns[i] for i in sorted(kept)]
+
+    def _hard_limit(self, text: str) -> str:
+        """按预算截断整段文本（保留开头和结尾）"""
+        if estimate_tokens(text) <= self.max_tokens:
+            return text
+        # 中文每字约 1 个 token，按字符数逐步收紧直到满足预算
+        max_chars = self.max_tokens
+        while max_chars > 0:
+            truncated = self._truncate(text, max_chars)
+            if estimate_tokens(truncated) <= self.max_tokens:
+                return truncated
+            max_chars = int(max_chars * 0.9)
+        # 预算连省略标记都放不下时只保留开头
+        head = text[:max(self.max_tokens, 1)]
+        while len(head) > 1 and estimate_tokens(head) > self.max_tokens:
+            head = head[:int(len(head) * 0.9)]
+        return head
+
+    # ------------------------------------------------------------------
+
+    def turns(self, chat_history: str) -> List[List]:
+        """拆分发言并去掉只有寒暄的发言，返回 [发言人, 文本] 列表（无发言人标签时发言人为 None）"""
+        return [[speaker, text] for speaker, text in self._split_turns(chat_history or "")
+                if not self._is_greeting(text)]
+
+    def process(self, chat_history: str) -> Tuple[str, Dict]:
+        """返回精简后的聊天记录和统计（原始/精简后的 token 数和发言数）"""
+        original_turns = len(self._split_turns(chat_history or ""))
+        turns = self.turns(chat_history)
+
+        collapsed = []
+        for speaker, text in turns:
+            text = self._truncate(self._collapse_lines(text), self.max_turn_chars)
+            if collapsed and collapsed[-1][0] == speaker and collapsed[-1][1] == text:
+                continue
+            collapsed.append([speaker, text])
+
+        if estimate_tokens(self._format(collapsed)) > self.max_tokens:
+            collapsed = self._fit_budget(collapsed)
+
+        text = self._hard_limit(self._format(collapsed))
+        return text, {
+            "original_tokens": estimate_tokens(chat_history or ""),
+            "tokens": estimate_tokens(text),
+            "original_turns": original_turns,
+            "turns": len(collapsed),
+        }
+
+
+def preprocess_for_prompt(ai_config: Dict, template: PromptTemplate, chat_history: str) -> str:
+    """按配置精简要写入 template 的聊天记录
+
+    预算取 chat_parser.preprocess.max_tokens 与当前模型上下文扣除提示词其余部分后的较小值，
+    但不低于 MIN_CHAT_TOKENS。未启用预处理时原样返回。
+    """
+    reserved = estimate_tokens(template.system) + estimate_tokens(template.render(chat_history=""))
+    remaining = PromptBuilder.from_config(ai_config).budget - reserved
+    preprocessor = ChatPreprocessor.from_config(ai_config, remaining)
+    if preprocessor is None:
+        return chat_history
+    if remaining < MIN_CHAT_TOKENS:
+        print(f"[WARNING] 模型上下文扣除提示词后只剩 {remaining} token，聊天记录按 {MIN_CHAT_TOKENS} token 精简")
+    text, stats = preprocessor.process(chat_history)
+    print(f"[INFO] 聊天记录预处理: {stats['original_tokens']} → {stats['tokens']} token"
+          f"（{stats['original_turns']} → {stats['turns']} 条发言）")
+    return text
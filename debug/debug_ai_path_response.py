@@ -60,7 +60,7 @@ def debug_ai_path_response():
                     print(f"  节点数量: {len(nodes)}")
                     
                     # 检查是否有路径相关的节点
-                    path_nodes = [k for k in nodes.keys() if 'step_' in k or 'solution' in k]
+                    path_nodes = [k for k in nodes.keys() if k.startswith(('issue_', 'step_', 'solution'))]
                     if path_nodes:
                         print(f"  发现路径节点: {path_nodes}")
                     else:
@@ -3,18 +3,28 @@
 
 import yaml
 import json
-import openai
-import os
-import requests
 from datetime import datetime
+from tree_merger import TreeMerger, convert_path_to_nodes, merge_report_summary
+from ai_client import AIClient
+from ai_metrics import metrics
+from ai_response_parser import PATH_SCHEMA, extract_json_from_response
+from prompt_templates import compile_prompt, load_prompts
+from chat_preprocessor import preprocess_for_prompt
+from path_matcher import match_existing_path
 
 class DirectAICaller:
     def __init__(self, ai_config_file: str = "config/ai_config.yaml", 
                  prompts_file: str = "config/prompts.yaml"):
         """初始化直接AI调用器"""
         self.ai_config = self._load_config(ai_config_file)
-        self.prompts = self._load_config(prompts_file)
-        self.client = self._init_ai_client()
+        self.prompts = self._load_prompts(prompts_file)
+        self.ai = AIClient(self.ai_config)
+        try:
+            self.ai.init_client()
+        except Exception as e:
+            print(f"[ERROR] 初始化AI客户端失败: {e}")
+        metrics.configure(self.ai_config)
+        self.last_merge_report = None
     
     def _load_config(self, config_file: str) -> dict:
         """加载配置文件"""
@@ -25,164 +35,35 @@ class DirectAICaller:
             print(f"[ERROR] 加载配置文件失败: {e}")
             return {}
     
-    def _init_ai_client(self):
-        """初始化AI客户端"""
+    def _load_prompts(self, prompts_file: str) -> dict:
+        """加载提示词配置（进程内按文件缓存）"""
         try:
-            api_type = self.ai_config['ai']['current_api']
-            api_config = self.ai_config['ai']['api'][api_type]
-            
-            if api_type == "custom_http":
-                # 自定义HTTP请求不需要初始化客户端
-                return None
-            elif api_type == "dashscope":
-                api_key = os.getenv('DASHSCOPE_API_KEY')
-                if not api_key:
-                    raise ValueError("请设置DASHSCOPE_API_KEY环境变量")
-                
-                return openai.OpenAI(
-                    api_key=api_key,
-                    base_url=api_config['base_url']
-                )
-            elif api_type == "openai":
-                api_key = os.getenv('OPENAI_API_KEY')
-                if not api_key:
-                    raise ValueError("请设置OPENAI_API_KEY环境变量")
-                
-                return openai.OpenAI(
-                    api_key=api_key,
-                    base_url=api_config['base_url']
-                )
-            elif api_type == "azure":
-                api_key = os.getenv('AZURE_OPENAI_API_KEY')
-                if not api_key:
-                    raise ValueError("请设置AZURE_OPENAI_API_KEY环境变量")
-                
-                return openai.AzureOpenAI(
-                    api_key=api_key,
-                    azure_endpoint=api_config['base_url'],
-                    api_version=api_config['api_version']
-                )
-            elif api_type == "local":
-                return openai.OpenAI(
-                    api_key="not-needed",
-                    base_url=api_config['base_url']
-                )
-            else:
-                raise ValueError(f"不支持的API类型: {api_type}")
-                
+            return load_prompts(prompts_file)
         except Exception as e:
-            print(f"[ERROR] 初始化AI客户端失败: {e}")
-            return None
-    
-    def _call_ai_api(self, messages: list, model: str = None) -> str:
-        """调用AI API"""
-        try:
-            api_type = self.ai_config['ai']['current_api']
-            
-            if api_type == "custom_http":
-                return self._call_custom_http_api(messages)
-            else:
-                if model is None:
-                    model = self.ai_config['ai']['api'][api_type]['model']
-                
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=self.ai_config['ai']['api'][api_type]['temperature'],
-                    max_tokens=self.ai_config['ai']['api'][api_type]['max_tokens']
-                )
-                
-                return response.choices[0].message.content
-                
-        except Exception as e:
-            print(f"[ERROR] AI API调用失败: {e}")
-            return None
+            print(f"[ERROR] 加载配置文件失败: {e}")
+            return {}
     
-    def _call_custom_http_api(self, messages: list) -> str:
-        """调用自定义HTTP API"""
-        try:
-            api_config = self.ai_config['ai']['api']['custom_http']
-            
-            # 获取API密钥
-            api_key_env = self.ai_config['ai']['api_keys']['custom_http']
-            api_key = os.getenv(api_key_env.replace('${', '').replace('}', ''))
-            if not api_key:
-                raise ValueError(f"请设置{api_key_env}环境变量")
-            
-            # 准备请求头
-            headers = {}
-            for key, value in api_config['headers'].items():
-                if value.startswith('${') and value.endswith('}'):
-                    # 替换环境变量
-                    env_var = value[2:-1]
-                    headers[key] = os.getenv(env_var, value)
-                else:
-                    headers[key] = value
-            
-            # 将消息列表转换为单个提示文本
-            prompt_text = self._messages_to_prompt(messages)
-            
-            # 构建请求体
-            body = {
-                "inputs": prompt_text,
-                "parameters": {
-                    "detail": True,
-                    "temperature": 0.1
-                }
-            }
-            
-            # 发送请求 - 使用requests.post(url, headers=headers, json=body)的方式
-            response = requests.post(
-                api_config['url'],
-                headers=headers,
-                json=body,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                error_msg = f"HTTP {response.status_code}: {response.text}"
-                print(f"[ERROR] 自定义HTTP API调用失败: {error_msg}")
-                return None
-            
-            # 直接返回响应文本
-            return response.text
-            
-        except Exception as e:
-            print(f"[ERROR] 自定义HTTP API调用失败: {e}")
-            return None
+    def _call_ai_api(self, messages: list, model: str = None, schema: dict = None) -> str:
+        """调用AI API（见 AIClient.acall），所有后端都失败时返回 None"""
+        return self.ai.call(messages, model=model, schema=schema)
     
-    def _messages_to_prompt(self, messages: list) -> str:
-        """将消息列表转换为单个提示文本"""
-        prompt_parts = []
-        
-        for message in messages:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            
-            if role == 'system':
-                prompt_parts.append(f"系统指令: {content}")
-            elif role == 'user':
-                prompt_parts.append(f"用户: {content}")
-            elif role == 'assistant':
-                prompt_parts.append(f"助手: {content}")
-        
-        return '\n\n'.join(prompt_parts)
+    def check_backend(self, api_type: str) -> bool:
+        """后端健康检查，供 /api/ai/backends?check=1 使用"""
+        return self.ai.check_backend(api_type)
     
-    def parse_chat_to_path(self, chat_history: str) -> dict:
-        """直接解析聊天记录为路径"""
+    def parse_chat_to_path(self, chat_history: str, existing_tree: dict = None) -> dict:
+        """直接解析聊天记录为路径；与 existing_tree 中已有路径完全一致时直接返回该路径，不调用AI"""
         print("[DEBUG] 直接解析聊天记录为路径...")
         
-        system_prompt = self.prompts['chat_analysis']['system']
-        user_prompt = self.prompts['chat_analysis']['user'].format(
-            chat_history=chat_history
-        )
+        if existing_tree:
+            match = match_existing_path(self.ai_config, existing_tree, chat_history)
+            if match:
+                return match['path']
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        template = compile_prompt(self.prompts['chat_analysis'])
+        messages = template.messages(chat_history=preprocess_for_prompt(self.ai_config, template, chat_history))
         
-        response = self._call_ai_api(messages)
+        response = self._call_ai_api(messages, schema=PATH_SCHEMA)
         if not response:
             return None
         
@@ -199,102 +80,15 @@ class DirectAICaller:
             print(f"[ERROR] 解析失败: {e}")
             return None
     
-    def _extract_json_from_response(self, response: str) -> dict:
-        """从AI响应中提取JSON内容"""
-        try:
-            # 方法1: 尝试直接解析整个响应
-            return json.loads(response)
-        except json.JSONDecodeError:
-            pass
-        
-        try:
-            # 方法2: 查找JSON代码块
-            import re
-            json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', response, re.DOTALL)
-            if json_block_match:
-                return json.loads(json_block_match.group(1))
-        except json.JSONDecodeError:
-            pass
-        
-        try:
-            # 方法3: 查找任何JSON对象
-            import re
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-        except json.JSONDecodeError:
-            pass
-        
-        return None
+    def _extract_json_from_response(self, response: str, schema: dict = PATH_SCHEMA) -> dict:
+        """从AI响应中提取符合路径结构的JSON内容"""
+        return extract_json_from_response(response, schema)
     
-    def convert_path_to_nodes(self, path_data: dict) -> dict:
-        """将路径转换为节点结构"""
+    def convert_path_to_nodes(self, path_data: dict, namespace: str = None) -> dict:
+        """将路径转换为节点结构（节点ID由内容哈希生成）"""
         print("🔄 将路径转换为节点结构...")
         
-        if not path_data or 'steps' not in path_data:
-            return None
-        
-        problem = path_data.get('problem', '问题定位')
-        steps = path_data.get('steps', [])
-        solution = path_data.get('solution', '')
-        
-        # 生成节点ID
-        entry_node_id = f"{problem.replace(' ', '_').lower()}_issue"
-        
-        # 构建节点
-        nodes = {}
-        
-        # 入口节点
-        if steps:
-            first_step = steps[0]
-            nodes[entry_node_id] = {
-                "question": first_step.get('question', problem),
-                "options": [
-                    {
-                        "text": first_step.get('answer', ''),
-                        "next_node": f"step_{first_step.get('step', 1)}"
-                    }
-                ]
-            }
-        
-        # 中间步骤节点
-        for i, step in enumerate(steps):
-            step_id = f"step_{step.get('step', i+1)}"
-            
-            if i < len(steps) - 1:
-                # 中间步骤
-                next_step = steps[i + 1]
-                nodes[step_id] = {
-                    "question": next_step.get('question', ''),
-                    "options": [
-                        {
-                            "text": next_step.get('answer', ''),
-                            "next_node": f"step_{next_step.get('step', i+2)}"
-                        }
-                    ]
-                }
-            else:
-                # 最后一步，连接到解决方案
-                nodes[step_id] = {
-                    "question": step.get('question', ''),
-                    "options": [
-                        {
-                            "text": step.get('answer', ''),
-                            "next_node": "solution"
-                        }
-                    ]
-                }
-        
-        # 解决方案节点
-        if solution:
-            nodes["solution"] = {
-                "solution": solution
-            }
-        
-        return {
-            "entry_node": entry_node_id,
-            "nodes": nodes
-        }
+        return convert_path_to_nodes(path_data, namespace)
     
     def merge_to_existing_tree(self, new_nodes: dict, existing_tree: dict) -> dict:
         """将新节点合并到现有决策树"""
@@ -303,40 +97,19 @@ class DirectAICaller:
         if not existing_tree or 'nodes' not in existing_tree:
             return new_nodes
         
-        existing_nodes = existing_tree.get('nodes', {})
-        new_nodes_dict = new_nodes.get('nodes', {})
-        entry_node = new_nodes.get('entry_node', '')
-        
-        # 获取现有根节点
-        existing_root = existing_tree.get('root_node', 'start')
-        
-        # 在现有根节点添加新路径的入口
-        if existing_root in existing_nodes and entry_node in new_nodes_dict:
-            entry_node_data = new_nodes_dict[entry_node]
-            entry_question = entry_node_data.get('question', '新问题')
-            
-            new_option = {
-                "text": entry_question,
-                "next_node": entry_node
-            }
-            
-            if 'options' not in existing_nodes[existing_root]:
-                existing_nodes[existing_root]['options'] = []
-            
-            # 检查是否已存在相同选项
-            existing_options = [opt['text'] for opt in existing_nodes[existing_root]['options']]
-            if new_option['text'] not in existing_options:
-                existing_nodes[existing_root]['options'].append(new_option)
-                print(f"[OK] 已添加新选项: {new_option['text']} -> {entry_node}")
-            else:
-                print(f"[WARNING] 选项已存在: {new_option['text']}")
+        # 基于文本索引合并，相同的问题/选项/解决方案挂接到已有节点
+        merger = TreeMerger.from_config(existing_tree, self.ai_config)
+        report = merger.merge(new_nodes)
+        self.last_merge_report = report
         
-        # 合并所有新节点
-        existing_nodes.update(new_nodes_dict)
+        if report['entry_node']:
+            print(f"[OK] 合并完成: {merge_report_summary(report)}")
+        for conflict in report['conflicts']:
+            print(f"[WARNING] 选项冲突: {conflict['node']} / {conflict['option']}")
         
         return {
-            "root_node": existing_root,
-            "nodes": existing_nodes
+            "root_node": merger.root_node,
+            "nodes": merger.nodes
         }
 
 def main():
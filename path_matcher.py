@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from ai_metrics import metrics
+from chat_preprocessor import ChatPreprocessor
+from tree_layout import tree_revision
+from tree_merger import normalize_text, text_ngrams
+
+# 客户一方的发言人，选项文本（客户的回答）只与这些发言对齐，问题只与客服一方的发言对齐
+CUSTOMER_SPEAKERS = {"用户", "客户", "user", "customer"}
+
+# 按决策树版本缓存的匹配器数量
+MAX_CACHED_MATCHERS = 8
+
+
+class PathMatcher:
+    """把聊天记录与决策树中已有的 根节点→解决方案 路径对齐，完全一致时无需调用AI
+
+    评分规则与 ProblemLocator._fuzzy_match 相同：完全相同为 1.0，一方包含另一方为 0.8，
+    否则为相似度（中文没有空格分词，这里用字符 n-gram 的 Dice 系数）。
+    选项和问题文本建立 n-gram 倒排索引，每条发言只与共享 n-gram 的候选文本计算分数；
+    之后从根节点出发只沿发言匹配到的选项搜索路径（加上最多 max_inferred_steps 条
+    未匹配的选项），不枚举整棵树的路径。
+
+    一条路径视为完全匹配需要同时满足：
+    1. 每一步所选的选项都能依次与一条客户发言对齐（分数达到阈值），最多允许
+       max_inferred_steps 步没有对应发言（如客户直接描述具体现象，跳过了问题分类）
+    2. 与路径对齐的客户发言占全部客户发言（去掉寒暄后）的比例不低于 min_coverage，
+       否则聊天记录中还有树中没有的信息，仍需交给AI解析
+    3. 得分最高的路径唯一（与第二名的差距超过 margin），否则视为有歧义
+    """
+
+    def __init__(self, tree: Dict, similarity_threshold: float = 0.6, ngram_size: int = 2,
+                 min_coverage: float = 0.6, max_inferred_steps: int = 1, margin: float = 0.05,
+                 exclude_keywords: List[str] = None):
+        self.tree = tree or {}
+        self.similarity_threshold = similarity_threshold
+        self.ngram_size = ngram_size
+        self.min_coverage = min_coverage
+        self.max_inferred_steps = max_inferred_steps
+        self.margin = margin
+        self._preprocessor = ChatPreprocessor(exclude_keywords=exclude_keywords)
+
+        # 规范化文本 -> n-gram 集合；n-gram -> 规范化文本集合（倒排索引）
+        self._grams: Dict[str, Set[str]] = {}
+        self._option_index: Dict[str, Set[str]] = {}
+        self._question_index: Dict[str, Set[str]] = {}
+        # 节点ID -> [(选项序号, 选项规范化文本, 下一节点)]；节点ID -> 问题规范化文本
+        self._edges: Dict[str, List[Tuple[int, str, str]]] = {}
+        self._question_keys: Dict[str, str] = {}
+
+        self._build_index()
+
+    @staticmethod
+    def _settings(ai_config: Dict) -> Optional[Dict]:
+        """chat_parser.fast_path 配置对应的构造参数，未启用时返回 None"""
+        chat_parser = (ai_config or {}).get('chat_parser', {}) or {}
+        fast_path = chat_parser.get('fast_path', {}) or {}
+        if not fast_path.get('enabled'):
+            return None
+        rules = chat_parser.get('rules', {}) or {}
+        return {
+            "similarity_threshold": fast_path.get('similarity_threshold', 0.6),
+            "ngram_size": fast_path.get('ngram_size', 2),
+            "min_coverage": fast_path.get('min_coverage', 0.6),
+            "max_inferred_steps": fast_path.get('max_inferred_steps', 1),
+            "exclude_keywords": rules.get('exclude_keywords'),
+        }
+
+    @classmethod
+    def from_config(cls, tree: Dict, ai_config: Dict) -> Optional['PathMatcher']:
+        """按 chat_parser.fast_path 配置创建，未启用时返回 None"""
+        settings = cls._settings(ai_config)
+        return cls(tree, **settings) if settings is not None else None
+
+    @property
+    def nodes(self) -> Dict:
+        return self.tree.get('nodes', {}) or {}
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+
+    def _index_text(self, key: str, index: Dict[str, Set[str]]):
+        for gram in self._gram_set(key):
+            index.setdefault(gram, set()).add(key)
+
+    def _gram_set(self, key: str) -> Set[str]:
+        grams = self._grams.get(key)
+        if grams is None:
+            grams = self._grams[key] = text_ngrams(key, self.ngram_size)
+        return grams
+
+    def _build_index(self):
+        """索引所有问题和选项文本，以及各决策节点的出边"""
+        for node_id, node_data in self.nodes.items():
+            if not isinstance(node_data, dict) or 'solution' in node_data:
+                continue
+            question_key = normalize_text(node_data.get('question', ''))
+            self._question_keys[node_id] = question_key
+            if question_key:
+                self._index_text(question_key, self._question_index)
+            edges = self._edges[node_id] = []
+            for index, option in enumerate(node_data.get('options', []) or []):
+                option_key = normalize_text(option.get('text', ''))
+                if option_key:
+                    self._index_text(option_key, self._option_index)
+                if option.get('next_node') in self.nodes:
+                    edges.append((index, option_key, option['next_node']))
+
+    # ------------------------------------------------------------------
+    # 评分
+    # ------------------------------------------------------------------
+
+    def _score(self, key: str, grams: Set[str], candidate: str) -> float:
+        """与 ProblemLocator._fuzzy_match 相同的分级：相同、包含、相似度"""
+        if key == candidate:
+            return 1.0
+        if candidate in key or key in candidate:
+            return 0.8
+        candidate_grams = self._gram_set(candidate)
+        return 2.0 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+
+    def _scores(self, text: str, index: Dict[str, Set[str]]) -> Dict[str, float]:
+        """发言与索引中候选文本的分数，只保留达到阈值的"""
+        key = normalize_text(text)
+        if not key:
+            return {}
+        # 发言的 n-gram 不放入 _grams，匹配器按决策树版本缓存，避免随聊天记录增长
+        grams = text_ngrams(key, self.ngram_size)
+        candidates = set()
+        for gram in grams:
+            candidates |= index.get(gram, set())
+        scores = {}
+        for candidate in candidates:
+            score = self._score(key, grams, candidate)
+            if score >= self.similarity_threshold:
+                scores[candidate] = score
+        return scores
+
+    def _search(self, answers: Dict[str, List[Tuple[int, float]]],
+                questions: Dict[str, float]) -> List[Tuple]:
+        """从根节点沿匹配到的选项搜索到达解决方案的路径
+
+        answers 为 选项文本 -> [(客户发言序号, 分数)]（按序号排列），questions 为 问题文本 -> 最高分数。
+        返回 [(未对齐步数, 得分, 对齐的客户发言序号, 步骤列表, 解决方案节点ID)]。
+        """
+        root = self.tree.get('root_node', 'start')
+        found = []
+        # 显式栈代替递归：(节点ID, 发言游标, 未对齐步数, 得分, 对齐的发言, 步骤, 已访问节点)
+        stack = [(root, 0, 0, 0.0, frozenset(), (), frozenset((root,)))]
+        while stack:
+            node_id, cursor, inferred, score, used, steps, visited = stack.pop()
+            node_data = self.nodes.get(node_id)
+            if not isinstance(node_data, dict):
+                continue
+            if 'solution' in node_data:
+                if steps and inferred < len(steps):
+                    found.append((inferred, score, used, list(steps), node_id))
+                continue
+            # 客服问过该问题时加分，用于区分选项文本相近的路径
+            bonus = 0.5 * questions.get(self._question_keys.get(node_id), 0.0)
+            for index, option_key, next_node in self._edges.get(node_id, ()):
+                if next_node in visited:
+                    continue
+                position = next(((turn, turn_score) for turn, turn_score in answers.get(option_key, ())
+                                 if turn >= cursor), None)
+                step = steps + ((node_id, index),)
+                if position is not None:
+                    turn, turn_score = position
+                    stack.append((next_node, turn, inferred, score + turn_score + bonus,
+                                  used | {turn}, step, visited | {next_node}))
+                elif inferred < self.max_inferred_steps:
+                    stack.append((next_node, cursor, inferred + 1, score, used, step, visited | {next_node}))
+        return found
+
+    # ------------------------------------------------------------------
+
+    def match(self, chat_history: str) -> Optional[Dict]:
+        """聊天记录完全匹配某条已有路径时返回匹配结果，否则返回 None
+
+        结果包含 path（与AI解析结果格式相同的路径数据）、nodes（路径经过的节点ID）、
+        score（平均每步得分）和 coverage（对齐的客户发言比例）。
+        """
+        if not self._edges:
+            return None
+        turns = self._preprocessor.turns(chat_history)
+        has_customer = any((speaker or '').lower() in CUSTOMER_SPEAKERS for speaker, _ in turns)
+        customer_turns = [text for speaker, text in turns
+                          if not has_customer or (speaker or '').lower() in CUSTOMER_SPEAKERS]
+        agent_turns = [text for speaker, text in turns
+                       if has_customer and (speaker or '').lower() not in CUSTOMER_SPEAKERS]
+        if not customer_turns:
+            return None
+
+        answers: Dict[str, List[Tuple[int, float]]] = {}
+        for turn, text in enumerate(customer_turns):
+            for option_key, score in self._scores(text, self._option_index).items():
+                answers.setdefault(option_key, []).append((turn, score))
+        if not answers:
+            return None
+        questions: Dict[str, float] = {}
+        for text in agent_turns:
+            for question_key, score in self._scores(text, self._question_index).items():
+                questions[question_key] = max(questions.get(question_key, 0.0), score)
+
+        ranked = []
+        for inferred, score, used, steps, solution_id in self._search(answers, questions):
+            coverage = len(used) / len(customer_turns)
+            if coverage < self.min_coverage:
+                continue
+            ranked.append((score / len(steps), coverage, steps, solution_id))
+
+        if not ranked:
+            return None
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        if len(ranked) > 1 and ranked[0][0] - ranked[1][0] <= self.margin:
+            return None
+
+        score, coverage, steps, solution_id = ranked[0]
+        return {
+            "path": self._path_data(steps, solution_id),
+            "nodes": [node_id for node_id, _ in steps] + [solution_id],
+            "score": round(score, 3),
+            "coverage": round(coverage, 3),
+        }
+
+    def _path_data(self, steps: List[Tuple[str, int]], solution_id: str) -> Dict:
+        """转换为与AI解析结果相同的路径格式，合并时各节点都会复用已有节点
+
+        AI解析的路径从具体问题开始、由合并器挂到根节点下，因此根节点这一步只作为 problem，
+        不作为步骤（路径只有根节点一步时除外）。
+        """
+        root_id, root_option = steps[0]
+        problem = self.nodes[root_id]['options'][root_option].get('text', '')
+        if len(steps) > 1:
+            steps = steps[1:]
+        path_steps = []
+        for i, (node_id, option_index) in enumerate(steps, 1):
+            node_data = self.nodes[node_id]
+            path_steps.append({
+                "step": i,
+                "question": node_data.get('question', ''),
+                "answer": node_data['options'][option_index].get('text', '')
+            })
+        return {
+            "problem": problem,
+            "steps": path_steps,
+            "solution": self.nodes[solution_id].get('solution', '')
+        }
+
+
+_matchers: "OrderedDict[tuple, PathMatcher]" = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(tree: Dict, ai_config: Dict) -> Optional[PathMatcher]:
+    """按决策树版本和配置缓存的匹配器，决策树未修改时不重建索引；未启用时返回 None"""
+    settings = PathMatcher._settings(ai_config)
+    if settings is None:
+        return None
+    key = (tree_revision(tree),) + tuple(
+        tuple(value) if isinstance(value, list) else value for value in settings.values())
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is not None:
+            _matchers.move_to_end(key)
+            return matcher
+    # 匹配器保存的是快照，调用方之后就地修改决策树（如合并）不影响已缓存的索引
+    matcher = PathMatcher(copy.deepcopy(tree), **settings)
+    with _matchers_lock:
+        _matchers[key] = matcher
+        while len(_matchers) > MAX_CACHED_MATCHERS:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def match_existing_path(ai_config: Dict, tree: Dict, chat_history: str) -> Optional[Dict]:
+    """按配置尝试把聊天记录匹配到已有路径，命中时记录命中次数并返回匹配结果
+
+    路径数据中附带 fast_path 字段（经过的节点、得分和覆盖率），便于调用方和接口返回值区分。
+    """
+    if not tree or not tree.get('nodes'):
+        return None
+    matcher = get_matcher(tree, ai_config)
+    if matcher is None:
+        return None
+    result = matcher.match(chat_history)
+    if result is None:
+        return None
+
+    result['path']['fast_path'] = {key: result[key] for key in ("nodes", "score", "coverage")}
+    metrics.record_fast_path(" > ".join(result['nodes']))
+    print(f"[INFO] 聊天记录与已有路径一致，跳过AI解析: {' → '.join(result['nodes'])}"
+          f"（得分 {result['score']}，覆盖率 {result['coverage']}）")
+    return result
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS option_counts (
+    node_id TEXT NOT NULL,
+    option_text TEXT NOT NULL,
+    next_node TEXT,
+    count INTEGER NOT NULL DEFAULT 0,
+    last_used TEXT,
+    PRIMARY KEY (node_id, option_text)
+);
+CREATE TABLE IF NOT EXISTS solution_counts (
+    node_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    steps_total INTEGER NOT NULL DEFAULT 0,
+    last_used TEXT
+);
+"""
+
+
+class PathStats:
+    """问题定位路径的使用统计（SQLite 持久化，线程安全）
+
+    每完成一次定位（到达解决方案）在一个事务中累加路径上各选项和该解决方案的计数；
+    中途退出或返回上一步撤销的选择不计入。选项按 (节点ID, 选项文本) 计数，
+    选项文本修改后重新计数。计数同时缓存在内存中，排序选项时不读数据库。
+    数据库在首次使用时才打开（创建），导入或构造时不产生文件。
+    """
+
+    def __init__(self, db_file: str = ":memory:"):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = None
+        # 节点ID -> {选项文本: 次数}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """打开数据库并加载计数（调用方持有锁）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            self._counts = {}
+            for node_id, option_text, count in conn.execute(
+                    "SELECT node_id, option_text, count FROM option_counts"):
+                self._counts.setdefault(node_id, {})[option_text] = count
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def record_session(self, path: List[Dict], solution_node: str):
+        """记录一次完成的定位；path 为 [{"node", "choice", "next_node"}]（ProblemLocator.diagnostic_path 的格式）"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for step in path:
+                    conn.execute(
+                        "INSERT INTO option_counts (node_id, option_text, next_node, count, last_used) "
+                        "VALUES (?, ?, ?, 1, ?) ON CONFLICT (node_id, option_text) DO UPDATE SET "
+                        "count = count + 1, next_node = excluded.next_node, last_used = excluded.last_used",
+                        (step['node'], step['choice'], step.get('next_node'), now))
+                conn.execute(
+                    "INSERT INTO solution_counts (node_id, count, steps_total, last_used) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT (node_id) DO UPDATE SET count = count + 1, "
+                    "steps_total = steps_total + excluded.steps_total, last_used = excluded.last_used",
+                    (solution_node, len(path), now))
+            for step in path:
+                counts = self._counts.setdefault(step['node'], {})
+                counts[step['choice']] = counts.get(step['choice'], 0) + 1
+
+    def option_counts(self, node_id: str) -> Dict[str, int]:
+        """节点各选项被选择的次数（按选项文本）"""
+        with self._lock:
+            self._connection()
+            return dict(self._counts.get(node_id, {}))
+
+    def order_options(self, node_id: str, options: List[Dict]) -> List[Dict]:
+        """按选择次数从高到低排序选项，次数相同时保持原有顺序"""
+        counts = self.option_counts(node_id)
+        return sorted(options, key=lambda option: -counts.get(option.get('text'), 0))
+
+    def report(self, tree: Dict, min_visits: int = 1) -> Dict:
+        """按当前决策树汇总统计
+
+        返回:
+          sessions / avg_steps   完成的定位次数和平均步数
+          nodes                  各决策节点的访问次数和各选项的次数、占比（按次数排序）
+          solutions              各解决方案的次数和平均步数
+          dead_options           访问次数不少于 min_visits 但从未被选择的选项
+          unvisited_nodes        有统计以来从未到达的节点（可考虑删减的分支）
+          stale                  决策树中已不存在的选项的计数
+        """
+        with self._lock:
+            conn = self._connection()
+            options = conn.execute(
+                "SELECT node_id, option_text, next_node, count FROM option_counts").fetchall()
+            solutions = conn.execute(
+                "SELECT node_id, count, steps_total FROM solution_counts").fetchall()
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for node_id, option_text, _, count in options:
+            counts.setdefault(node_id, {})[option_text] = count
+
+        tree_nodes = tree.get('nodes', {}) or {}
+        root = tree.get('root_node')
+        reached = {root} if solutions else set()
+        nodes, dead_options, stale = {}, [], []
+
+        for node_id, node_data in tree_nodes.items():
+            if not isinstance(node_data, dict) or 'options' not in node_data:
+                continue
+            node_counts = counts.get(node_id, {})
+            visits = sum(node_counts.get(option.get('text'), 0) for option in node_data['options'])
+            if not visits:
+                continue
+            entries = []
+            for option in node_data['options']:
+                count = node_counts.get(option.get('text'), 0)
+                entries.append({"text": option.get('text'), "next_node": option.get('next_node'),
+                                "count": count, "share": round(count / visits, 3)})
+                if count:
+                    reached.add(option.get('next_node'))
+                elif visits >= min_visits:
+                    dead_options.append({"node": node_id, "text": option.get('text'),
+                                         "next_node": option.get('next_node')})
+            entries.sort(key=lambda entry: -entry['count'])
+            nodes[node_id] = {"visits": visits, "options": entries}
+
+        for node_id, option_text, next_node, count in options:
+            node_data = tree_nodes.get(node_id)
+            texts = [option.get('text') for option in node_data.get('options', [])] \
+                if isinstance(node_data, dict) else []
+            if option_text not in texts:
+                stale.append({"node": node_id, "text": option_text, "next_node": next_node, "count": count})
+
+        sessions = sum(count for _, count, _ in solutions)
+        steps = sum(steps_total for _, _, steps_total in solutions)
+        return {
+            "sessions": sessions,
+            "avg_steps": round(steps / sessions, 2) if sessions else 0.0,
+            "nodes": nodes,
+            "solutions": {node_id: {"count": count, "avg_steps": round(steps_total / count, 2)}
+                          for node_id, count, steps_total in sorted(solutions, key=lambda row: -row[1])},
+            "dead_options": dead_options,
+            "unvisited_nodes": sorted(node_id for node_id in tree_nodes if node_id not in reached)
+            if sessions else [],
+            "stale": stale,
+        }
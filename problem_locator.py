@@ -6,14 +6,24 @@ import sys
 import yaml
 import re
 from typing import Dict, List, Optional, Tuple
+from path_stats import PathStats
 
 class ProblemLocator:
-    def __init__(self, config_file: str = "config/decision_tree.yaml"):
-        """初始化问题定位器"""
+    def __init__(self, config_file: str = "config/decision_tree.yaml",
+                 stats: PathStats = None, order_by_frequency: bool = False):
+        """初始化问题定位器
+        
+        stats 不为 None 时记录每次完成定位所经过的选项；order_by_frequency 为 True 时
+        按历史选择次数从高到低显示选项，模糊匹配得分相同时优先匹配常用选项。
+        """
         self.config_file = config_file
         self.config = self._load_config()
         self.current_node = self.config['decision_tree']['root_node']
         self.diagnostic_path = []
+        self.stats = stats
+        self.order_by_frequency = order_by_frequency and stats is not None
+        # 最近一次显示的 (节点ID, 选项顺序)，用户输入按显示时的顺序解析
+        self._displayed_options = None
         
     def _load_config(self) -> Dict:
         """加载配置文件"""
@@ -71,6 +81,22 @@ class ProblemLocator:
         nodes = self.config['decision_tree']['nodes']
         return nodes.get(node_id)
     
+    def _ordered_options(self, node_id: str) -> List[Dict]:
+        """节点选项的显示顺序"""
+        options = self._get_node_info(node_id).get('options', [])
+        if self.order_by_frequency:
+            return self.stats.order_options(node_id, options)
+        return options
+    
+    def _current_options(self) -> List[Dict]:
+        """当前节点最近一次显示的选项顺序（编号输入和模糊匹配都按该顺序）
+
+        显示后计数发生变化也不会改变编号对应的选项；尚未显示时按当前计数排序。
+        """
+        if self._displayed_options and self._displayed_options[0] == self.current_node:
+            return self._displayed_options[1]
+        return self._ordered_options(self.current_node)
+    
     def _display_current_question(self):
         """显示当前问题"""
         node_data = self._get_node_info(self.current_node)
@@ -92,7 +118,9 @@ class ProblemLocator:
             # 这是一个决策节点
             print(f"\n❓ {node_data['question']}")
             print("\n选项:")
-            for i, option in enumerate(node_data['options'], 1):
+            options = self._ordered_options(self.current_node)
+            self._displayed_options = (self.current_node, options)
+            for i, option in enumerate(options, 1):
                 print(f"  {i}. {option['text']}")
             return False
         else:
@@ -105,19 +133,20 @@ class ProblemLocator:
         if not node_data or 'options' not in node_data:
             print("[ERROR] 当前节点没有选项")
             return False
+        options = self._current_options()
         
         # 尝试数字匹配
         try:
             choice_num = int(user_input.strip())
-            if 1 <= choice_num <= len(node_data['options']):
-                selected_option = node_data['options'][choice_num - 1]
+            if 1 <= choice_num <= len(options):
+                selected_option = options[choice_num - 1]
                 self._move_to_next_node(selected_option)
                 return True
         except ValueError:
             pass
         
         # 尝试文本匹配
-        best_match = self._find_best_match(user_input, node_data['options'])
+        best_match = self._find_best_match(user_input, options)
         if best_match:
             index, selected_option = best_match
             print(f"[OK] 匹配到选项: {selected_option['text']}")
@@ -155,6 +184,15 @@ class ProblemLocator:
             print(f"{i}. {step['choice']}")
         print("-" * 40)
     
+    def _record_session(self):
+        """记录本次定位经过的选项（返回上一步撤销的选择不在诊断路径中，不计入）"""
+        if self.stats is None or not self.diagnostic_path:
+            return
+        try:
+            self.stats.record_session(self.diagnostic_path, self.current_node)
+        except Exception as e:
+            print(f"[WARNING] 记录路径统计失败: {e}")
+    
     def start_diagnostic(self):
         """开始问题诊断"""
         print("=" * 60)
@@ -177,6 +215,7 @@ class ProblemLocator:
                 if self._display_current_question():
                     # 已到达解决方案
                     self._display_diagnostic_path()
+                    self._record_session()
                     break
                 
                 # 获取用户输入
@@ -238,8 +277,9 @@ def main():
             print("请确保配置文件存在并且格式正确。")
             return
         
-        # 创建并启动问题定位系统
-        locator = ProblemLocator(config_file)
+        # 创建并启动问题定位系统；--hot-paths 按历史选择次数排序选项
+        stats = PathStats("config/path_stats.db")
+        locator = ProblemLocator(config_file, stats, order_by_frequency='--hot-paths' in sys.argv[1:])
         locator.start_diagnostic()
         
     except Exception as e:
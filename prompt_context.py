@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import re
+from typing import Dict, Iterable, List, Set
+
+from prompt_templates import compile_prompt
+
+# 未配置 context_window 时按 8K 上下文处理
+DEFAULT_CONTEXT_WINDOW = 8192
+# 为消息格式等额外开销预留的 token
+PROMPT_OVERHEAD = 256
+
+_CJK_CHAR = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数：中文每字约 1 个 token，其他字符约 4 个字符 1 个 token
+
+    偏保守的估算，不依赖具体模型的分词器。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def compact_json(data) -> str:
+    """无缩进、无多余空格的JSON，用于拼接提示词"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _stub(node_data: Dict) -> Dict:
+    """只保留问题/解决方案文本的节点摘要，不展开其选项"""
+    if not isinstance(node_data, dict):
+        return {}
+    if node_data.get('question'):
+        return {"question": node_data['question'], "summary_only": True}
+    return {"solution": node_data.get('solution', ''), "summary_only": True}
+
+
+def _targets(node_data: Dict) -> List[str]:
+    if not isinstance(node_data, dict):
+        return []
+    return [option['next_node'] for option in node_data.get('options', []) or []
+            if isinstance(option, dict) and option.get('next_node')]
+
+
+def extract_neighbourhood(tree: Dict, focus_ids: Iterable[str]) -> Dict:
+    """提取与变更相关的子树
+
+    包含变更节点和挂接点（引用变更节点的父节点）的完整内容，以及它们引用的
+    其他节点（子节点、兄弟节点）的摘要。摘要节点带 summary_only 标记，
+    其选项未展开，不应视为缺失的引用。
+    """
+    nodes = tree.get('nodes', {})
+    focus = [node_id for node_id in dict.fromkeys(focus_ids) if node_id in nodes]
+    focus_set = set(focus)
+
+    parents = [node_id for node_id, node_data in nodes.items()
+               if node_id not in focus_set and focus_set.intersection(_targets(node_data))]
+    full: List[str] = focus + parents
+    full_set = set(full)
+
+    sub_nodes = {node_id: nodes[node_id] for node_id in full}
+    for node_id in full:
+        for target in _targets(nodes[node_id]):
+            if target not in full_set and target in nodes and target not in sub_nodes:
+                sub_nodes[target] = _stub(nodes[target])
+
+    sub_tree = {"nodes": sub_nodes}
+    if tree.get('root_node') in sub_nodes:
+        sub_tree['root_node'] = tree['root_node']
+    return sub_tree
+
+
+def validation_context(existing_tree: Dict, new_nodes: Dict) -> Dict:
+    """验证新节点时需要的现有决策树上下文
+
+    包含根节点（新路径从根节点挂接）、与新节点ID相同的节点、新节点引用的
+    现有节点和引用新节点ID的现有节点，其余引用以摘要表示。
+    """
+    existing = existing_tree.get('nodes', {})
+    new_dict = new_nodes.get('nodes', {})
+    new_ids = set(new_dict)
+
+    related: Set[str] = set()
+    if existing_tree.get('root_node') in existing:
+        related.add(existing_tree['root_node'])
+    related.update(new_ids & set(existing))
+    for node_data in new_dict.values():
+        related.update(target for target in _targets(node_data) if target in existing)
+    related.update(node_id for node_id, node_data in existing.items()
+                   if new_ids.intersection(_targets(node_data)))
+
+    return extract_neighbourhood(existing_tree, [node_id for node_id in existing if node_id in related])
+
+
+class PromptBuilder:
+    """按模型上下文大小构建提示词
+
+    节点数据以紧凑JSON写入提示词；超出可用 token 预算时按节点分块，
+    每块生成一组消息，由调用方逐块请求后合并结果。
+    """
+
+    def __init__(self, context_window: int = DEFAULT_CONTEXT_WINDOW, max_output_tokens: int = 2000):
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+
+    @classmethod
+    def from_config(cls, ai_config: Dict) -> 'PromptBuilder':
+        """按当前API的 context_window 和 max_tokens 创建"""
+        ai = ai_config.get('ai', {})
+        api_config = ai.get('api', {}).get(ai.get('current_api'), {}) or {}
+        return cls(api_config.get('context_window', DEFAULT_CONTEXT_WINDOW),
+                   api_config.get('max_tokens', 2000))
+
+    @property
+    def budget(self) -> int:
+        """提示词可用的 token 数"""
+        return max(self.context_window - self.max_output_tokens - PROMPT_OVERHEAD, 0)
+
+    def build(self, prompt: Dict, tree_field: str, tree: Dict, **fields) -> List[List[Dict]]:
+        """生成消息列表，tree 写入模板的 tree_field 字段，其他字段按原样写入
+
+        返回一组或多组消息；分块时每块包含 tree 的一部分节点（root_node 保留在每块中），
+        单个节点超出预算时单独成块。
+        """
+        template = compile_prompt(prompt)
+        fields = {key: value if isinstance(value, str) else compact_json(value)
+                  for key, value in fields.items()}
+
+        messages = template.messages(**{**fields, tree_field: compact_json(tree)})
+        if sum(estimate_tokens(message['content']) for message in messages) <= self.budget:
+            return [messages]
+
+        base = {key: value for key, value in tree.items() if key != 'nodes'}
+        fixed = sum(estimate_tokens(message['content']) for message in
+                    template.messages(**{**fields, tree_field: compact_json({**base, "nodes": {}})}))
+        available = max(self.budget - fixed, 1)
+
+        chunks, current, used = [], {}, 0
+        for node_id, node_data in tree.get('nodes', {}).items():
+            cost = estimate_tokens(compact_json({node_id: node_data}))
+            if current and used + cost > available:
+                chunks.append(current)
+                current, used = {}, 0
+            current[node_id] = node_data
+            used += cost
+        if current:
+            chunks.append(current)
+
+        return [
+            template.messages(**{**fields, tree_field: compact_json({**base, "nodes": chunk})})
+            for chunk in chunks
+        ]
+
+
+def merge_chunk_results(results: List[Dict]) -> Dict:
+    """合并分块请求的JSON结果：列表字段拼接，valid 取全部为真，其他字段取首个值"""
+    merged: Dict = {}
+    for result in results:
+        for key, value in result.items():
+            if isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            elif key == 'valid':
+                merged[key] = merged.get(key, True) and bool(value)
+            else:
+                merged.setdefault(key, value)
+    return merged
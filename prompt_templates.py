@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+from string import Formatter
+from typing import Dict, List
+
+import yaml
+
+
+class PromptTemplate:
+    """编译后的提示词模板
+
+    模板在编译时解析一次，渲染时只拼接字符串。version 为模板内容的哈希，
+    提示词修改后随之变化，可用于对照调用统计和日志。
+
+    服务商的提示词缓存按请求前缀匹配：system 消息和 user 模板中第一个
+    占位符之前的文本（static_prefix）每次调用都逐字节相同，因此模板应把
+    说明和示例放在前面、把聊天记录等可变内容放在最后。
+    """
+
+    def __init__(self, system: str, user: str):
+        self.system = system
+        self.user = user
+        self.version = hashlib.sha256(f"{system}\0{user}".encode('utf-8')).hexdigest()[:12]
+        self._parts = [(literal, field) for literal, field, _, _ in Formatter().parse(user)]
+        self.fields = [field for _, field in self._parts if field is not None]
+        prefix = []
+        for literal, field in self._parts:
+            prefix.append(literal)
+            if field is not None:
+                break
+        self.static_prefix = "".join(prefix)
+        # 带格式说明、属性或下标的占位符交给 str.format 处理
+        self._simple = all(field.isidentifier() and spec == "" and conversion is None
+                           for _, field, spec, conversion in Formatter().parse(user) if field is not None)
+
+    def render(self, **fields) -> str:
+        """渲染 user 模板"""
+        if not self._simple:
+            return self.user.format(**fields)
+        return "".join(literal + (str(fields[field]) if field is not None else "")
+                       for literal, field in self._parts)
+
+    def messages(self, **fields) -> List[Dict]:
+        """system 和渲染后的 user 消息"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.render(**fields)}
+        ]
+
+
+_compiled: Dict[tuple, PromptTemplate] = {}
+
+
+def compile_prompt(prompt: Dict) -> PromptTemplate:
+    """编译 prompts.yaml 中的一项（含 system、user），相同内容只编译一次"""
+    key = (prompt['system'], prompt['user'])
+    template = _compiled.get(key)
+    if template is None:
+        template = _compiled[key] = PromptTemplate(*key)
+    return template
+
+
+_loaded: Dict[str, tuple] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_prompts(prompts_file: str = "config/prompts.yaml") -> Dict:
+    """读取提示词配置，文件未修改时返回进程内缓存的结果（调用方不应修改）"""
+    path = os.path.abspath(prompts_file)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        prompts = yaml.safe_load(f) or {}
+    with _loaded_lock:
+        _loaded[path] = (stamp, prompts)
+    return prompts
+
+
+def prompt_versions(prompts: Dict) -> Dict[str, str]:
+    """各提示词的版本号"""
+    return {name: compile_prompt(prompt).version for name, prompt in prompts.items()
+            if isinstance(prompt, dict) and 'system' in prompt and 'user' in prompt}
@@ -5,6 +5,7 @@ from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 import json
+from path_stats import PathStats
 
 class DecisionOption(BaseModel):
     text: str
@@ -22,8 +23,12 @@ class DecisionTreeConfig(BaseModel):
     nodes: Dict[str, Any]
 
 class DecisionTreeEngine:
-    def __init__(self, config_file: str = "config/decision_tree.yaml"):
+    def __init__(self, config_file: str = "config/decision_tree.yaml",
+                 stats: Optional[PathStats] = None, order_by_frequency: bool = False):
+        """stats 不为 None 时在到达解决方案时记录经过的选项；order_by_frequency 为 True 时按历史选择次数排序选项"""
         self.config_file = config_file
+        self.stats = stats
+        self.order_by_frequency = order_by_frequency and stats is not None
         self.config = self._load_config()
         self.graph = self._build_graph()
     
@@ -52,11 +57,17 @@ class DecisionTreeEngine:
         
         return workflow.compile()
     
+    def _ordered_options(self, node_id: str, node_data: Dict) -> List[Dict]:
+        """选项的显示顺序，选项编号按该顺序解析"""
+        if self.order_by_frequency:
+            return self.stats.order_options(node_id, node_data['options'])
+        return node_data['options']
+    
     def _create_decision_node(self, node_id: str, node_data: Dict) -> callable:
         """创建决策节点"""
         def decision_node(state: Dict) -> Dict:
             question = node_data['question']
-            options = node_data['options']
+            options = self._ordered_options(node_id, node_data)
             
             # 构建选项文本
             options_text = "\n".join([f"{i+1}. {opt['text']}" for i, opt in enumerate(options)])
@@ -64,6 +75,7 @@ class DecisionTreeEngine:
             # 生成AI消息
             ai_message = f"问题：{question}\n\n请选择以下选项之一：\n{options_text}\n\n请输入选项编号（1-{len(options)}）："
             
+            # 显示的选项顺序保存在状态中，下一次选择按该顺序解析
             return {
                 **state,
                 "current_node": node_id,
@@ -104,17 +116,26 @@ class DecisionTreeEngine:
             if current_node in self.config.nodes:
                 node_data = self.config.nodes[current_node]
                 if 'options' in node_data and 0 <= choice_index < len(node_data['options']):
-                    selected_option = node_data['options'][choice_index]
+                    # 按显示给用户的顺序解析编号，显示后计数变化不影响选择
+                    if state.get("current_node") == current_node and state.get("options"):
+                        options = state["options"]
+                    else:
+                        options = self._ordered_options(current_node, node_data)
+                    selected_option = options[choice_index]
                     next_node = selected_option['next_node']
                     
                     # 更新状态
                     state["current_node"] = next_node
                     state["selected_option"] = selected_option['text']
+                    state["path"] = state.get("path", []) + [
+                        {"node": current_node, "choice": selected_option['text'], "next_node": next_node}]
                     
                     # 检查下一节点是否为解决方案节点
                     if next_node in self.config.nodes:
                         next_node_data = self.config.nodes[next_node]
                         if 'solution' in next_node_data:
+                            if self.stats is not None:
+                                self.stats.record_session(state["path"], next_node)
                             # 直接返回解决方案
                             return {
                                 **state,
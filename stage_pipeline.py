@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+class StageError(Exception):
+    """必需阶段失败或超时，流水线中止
+
+    阶段函数也可以直接抛出 StageError，以指定返回给调用方的错误信息。
+    """
+
+    def __init__(self, message: str, stage: str = None):
+        super().__init__(message)
+        self.stage = stage
+
+
+class StageCancelled(Exception):
+    """阶段已超时或流水线已中止，结果会被丢弃，阶段应停止执行且不再产生副作用"""
+
+
+# 当前阶段的取消标志，阶段线程（及其调用的AI客户端）通过 check_cancelled 检查
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar('stage_cancel_event', default=None)
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """当前阶段的取消标志，不在流水线阶段中时为 None"""
+    return _cancel_event.get()
+
+
+def check_cancelled():
+    """当前阶段已被取消时抛出 StageCancelled；阶段在修改共享数据前应调用"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise StageCancelled("阶段已取消")
+
+
+class Stage:
+    """流水线中的一个阶段
+
+    func 接收 {依赖阶段名: 结果}，返回本阶段结果。required 为 False 的阶段
+    失败或超时时使用 fallback 作为结果，不影响其他阶段。
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: tuple = (),
+                 timeout: Optional[float] = None, required: bool = True, fallback: Any = None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.required = required
+        self.fallback = fallback
+
+
+class StagePipeline:
+    """按依赖关系执行阶段，依赖已满足的阶段并发执行
+
+    总耗时约为依赖图中最长路径上各阶段耗时之和。阶段超时或流水线因必需阶段
+    失败而中止时，设置仍在运行的阶段的取消标志：线程无法强制终止，阶段应在
+    产生副作用前调用 check_cancelled（AI客户端的同步调用会自动检查并取消在途请求），
+    之后抛出的 StageCancelled 和其他结果都被丢弃。
+    """
+
+    def __init__(self, stages: List[Stage], max_workers: int = 4):
+        self.stages = stages
+        self.max_workers = max_workers
+        self.timings = {}     # 阶段名 -> 耗时（秒）
+        self.failures = {}    # 可选阶段名 -> 失败原因
+        self._check_graph()
+
+    def _check_graph(self):
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"阶段名重复: {names}")
+        known = set()
+        for stage in self.stages:
+            missing = [dep for dep in stage.deps if dep not in names]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 依赖未知阶段: {missing}")
+        # 按依赖逐层展开，展开不了的即存在环
+        remaining = list(self.stages)
+        while remaining:
+            ready = [stage for stage in remaining if all(dep in known for dep in stage.deps)]
+            if not ready:
+                raise ValueError(f"阶段依赖存在环: {[stage.name for stage in remaining]}")
+            known.update(stage.name for stage in ready)
+            remaining = [stage for stage in remaining if stage.name not in known]
+
+    def _finish(self, stage: Stage, results: Dict, started: float, error: Exception = None,
+                value: Any = None):
+        self.timings[stage.name] = round(time.monotonic() - started, 3)
+        if error is None:
+            results[stage.name] = value
+            return
+        if stage.required:
+            if isinstance(error, StageError):
+                error.stage = error.stage or stage.name
+                raise error
+            raise StageError(f"阶段 {stage.name} 失败: {error}", stage.name) from error
+        self.failures[stage.name] = str(error) or type(error).__name__
+        results[stage.name] = stage.fallback
+
+    @staticmethod
+    def _run_stage(stage: Stage, inputs: Dict, cancel_event: threading.Event) -> Any:
+        _cancel_event.set(cancel_event)
+        return stage.func(inputs)
+
+    def run(self) -> Dict[str, Any]:
+        """执行全部阶段，返回 {阶段名: 结果}；必需阶段失败时抛出 StageError"""
+        self.timings = {}
+        self.failures = {}
+        results = {}
+        pending = list(self.stages)
+        running = {}  # future -> (阶段, 开始时间, 截止时间, 取消标志)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                ready = [stage for stage in pending if all(dep in results for dep in stage.deps)]
+                for stage in ready:
+                    pending.remove(stage)
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    started = time.monotonic()
+                    deadline = started + stage.timeout if stage.timeout else None
+                    cancel_event = threading.Event()
+                    # 在当前上下文的副本中执行，contextvars（如调用统计的任务范围）对阶段可见
+                    future = executor.submit(contextvars.copy_context().run, self._run_stage,
+                                             stage, inputs, cancel_event)
+                    running[future] = (stage, started, deadline, cancel_event)
+
+                deadlines = [deadline for _, _, deadline, _ in running.values() if deadline is not None]
+                timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, started, _, _ = running.pop(future)
+                    error = future.exception()
+                    self._finish(stage, results, started, error,
+                                 None if error else future.result())
+
+                now = time.monotonic()
+                for future, (stage, started, deadline, cancel_event) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        running.pop(future)
+                        future.cancel()
+                        cancel_event.set()
+                        self._finish(stage, results, started, TimeoutError(f"超过 {stage.timeout} 秒"))
+        finally:
+            # 流水线中止时通知仍在运行的阶段停止
+            for _, _, _, cancel_event in running.values():
+                cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import time
+import httpx
+from types import SimpleNamespace
+from ai_client import AIClient, CustomHttpBatcher, run_sync
+from ai_metrics import metrics
+
+def fake_client(delay, state):
+    """模拟 AsyncOpenAI：每次请求耗时 delay 秒，记录同时进行的请求数"""
+    async def create(**request):
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        content = request["messages"][-1]["content"]
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+                               choices=[SimpleNamespace(message=SimpleNamespace(content=f"回复:{content}"))])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def make_client(max_concurrency):
+    client = AIClient({"ai": {"current_api": "local", "max_concurrency": max_concurrency,
+                              "api": {"local": {"model": "qwen2.5:7b"}}}})
+    state = {"in_flight": 0, "max_in_flight": 0}
+    client.clients["local"] = fake_client(0.2, state)
+    return client, state
+
+def test_requests_in_flight_on_one_thread():
+    """测试多个请求在同一个事件循环上同时进行"""
+    print("🧪 测试并发请求...")
+
+    client, state = make_client(max_concurrency=20)
+    groups = [[{"role": "user", "content": str(i)}] for i in range(20)]
+
+    started = time.monotonic()
+    with metrics.job("many") as job:
+        responses = client.call_many(groups)
+    elapsed = time.monotonic() - started
+
+    if responses != [f"回复:{i}" for i in range(20)]:
+        print(f"[ERROR] 结果顺序不正确: {responses}")
+        return False
+    if state["max_in_flight"] != 20 or elapsed > 1.0:
+        print(f"[ERROR] 请求未并发执行: 同时 {state['max_in_flight']} 个，耗时 {elapsed:.2f}s")
+        return False
+    if job["total"]["calls"] != 20:
+        print(f"[ERROR] 调用统计未计入当前任务: {job['total']}")
+        return False
+
+    print(f"[OK] 20 个请求同时进行，耗时 {elapsed:.2f}s")
+    return True
+
+def test_max_concurrency():
+    """测试同时进行的请求数受 max_concurrency 限制"""
+    print("\n🧪 测试并发上限...")
+
+    client, state = make_client(max_concurrency=3)
+    client.call_many([[{"role": "user", "content": str(i)}] for i in range(7)])
+
+    if state["max_in_flight"] != 3:
+        print(f"[ERROR] 同时进行的请求数为 {state['max_in_flight']}")
+        return False
+
+    print("[OK] 同时进行的请求数不超过 3")
+    return True
+
+def test_sync_wrapper():
+    """测试同步包装返回结果，且不能在事件循环内部调用"""
+    print("\n🧪 测试同步包装...")
+
+    client, _ = make_client(max_concurrency=8)
+    if client.call([{"role": "user", "content": "你好"}]) != "回复:你好":
+        print("[ERROR] 同步调用结果不正确")
+        return False
+
+    async def nested():
+        try:
+            client.call([{"role": "user", "content": "你好"}])
+        except RuntimeError:
+            return True
+        return False
+
+    if not run_sync(nested()):
+        print("[ERROR] 在事件循环内同步调用应报错")
+        return False
+
+    print("[OK] 同步调用返回结果，事件循环内同步调用被拒绝")
+    return True
+
+def make_http_client(batch_supported, drop_last=False):
+    """custom_http 客户端，模拟的服务端回显输入，记录每次请求的 inputs
+
+    drop_last 为 True 时批量响应少返回最后一条
+    """
+    os.environ.setdefault('CUSTOM_API_KEY', 'test-key')
+    client = AIClient({"ai": {"current_api": "custom_http", "max_concurrency": 20,
+                              "api_keys": {"custom_http": "${CUSTOM_API_KEY}"},
+                              "api": {"custom_http": {"url": "http://tgi.local/", "headers": {}}}}})
+    posted = []
+
+    async def handler(request):
+        inputs = json.loads(request.content)["inputs"]
+        posted.append(inputs)
+        await asyncio.sleep(0.05)
+        if isinstance(inputs, list):
+            if not batch_supported:
+                return httpx.Response(422, json={"error": "inputs must be a string"})
+            items = [{"generated_text": text[-2:]} for text in inputs]
+            return httpx.Response(200, json=items[:-1] if drop_last else items)
+        return httpx.Response(200, json={"generated_text": inputs[-2:]})
+
+    client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.batcher = CustomHttpBatcher(max_batch_size=8, max_wait=0.01)
+    return client, posted
+
+def test_custom_http_batching():
+    """测试 custom_http 并发请求合并为批量请求并按顺序拆分响应"""
+    print("\n🧪 测试自定义HTTP批处理...")
+
+    client, posted = make_http_client(batch_supported=True)
+    groups = [[{"role": "user", "content": f"{i:02d}"}] for i in range(17)]
+    responses = client.call_many(groups)
+
+    texts = [json.loads(response)["generated_text"] for response in responses]
+    if texts != [f"{i:02d}" for i in range(17)]:
+        print(f"[ERROR] 响应拆分不正确: {texts}")
+        return False
+    # 第一个请求在服务端空闲时立即发出，其余 16 个合并为两批
+    if len(posted) != 3 or not isinstance(posted[1], list) or client.batcher.supported is not True:
+        print(f"[ERROR] 请求未合并: {[len(inputs) if isinstance(inputs, list) else 1 for inputs in posted]}")
+        return False
+
+    print(f"[OK] 17 个请求通过 {len(posted)} 次HTTP请求完成")
+    return True
+
+def test_custom_http_batching_unsupported():
+    """测试服务端不支持批量请求时改为逐条发送"""
+    print("\n🧪 测试不支持批量请求的服务端...")
+
+    client, posted = make_http_client(batch_supported=False)
+    responses = client.call_many([[{"role": "user", "content": f"{i:02d}"}] for i in range(5)])
+
+    texts = [json.loads(response)["generated_text"] for response in responses]
+    if texts != [f"{i:02d}" for i in range(5)] or client.batcher.supported is not False:
+        print(f"[ERROR] 未正确回退: {texts}")
+        return False
+    client.call_many([[{"role": "user", "content": f"{i:02d}"}] for i in range(5)])
+    if sum(isinstance(inputs, list) for inputs in posted) != 1:
+        print("[ERROR] 确认不支持后仍在发送批量请求")
+        return False
+
+    print("[OK] 批量请求被拒绝后逐条发送，之后不再合并")
+    return True
+
+def test_custom_http_batch_length_mismatch():
+    """测试已确认支持批量请求后，响应列表长度不符时该批次逐条重发"""
+    print("\n🧪 测试批量响应长度不符...")
+
+    client, posted = make_http_client(batch_supported=True, drop_last=True)
+    client.batcher.supported = True
+    responses = client.call_many([[{"role": "user", "content": f"{i:02d}"}] for i in range(5)])
+
+    texts = [json.loads(response)["generated_text"] for response in responses]
+    if texts != [f"{i:02d}" for i in range(5)]:
+        print(f"[ERROR] 调用方不应得到整个批量响应: {texts}")
+        return False
+    if sum(isinstance(inputs, list) for inputs in posted) != 1 or len(posted) != 1 + 1 + 4:
+        print(f"[ERROR] 该批次应逐条重发: {posted}")
+        return False
+
+    print("[OK] 长度不符的批次逐条重发，每个请求得到自己的响应")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试AI客户端...")
+
+    results = [
+        test_requests_in_flight_on_one_thread(),
+        test_max_concurrency(),
+        test_sync_wrapper(),
+        test_custom_http_batching(),
+        test_custom_http_batching_unsupported(),
+        test_custom_http_batch_length_mismatch(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from types import SimpleNamespace
+from ai_metrics import AIMetrics, custom_http_usage, metrics
+from stage_pipeline import Stage, StagePipeline
+from ai_client import AIClient
+from direct_ai_call import DirectAICaller
+from ai_tree_augmentor import AITreeAugmentor
+
+def test_aggregation_and_jobs():
+    """测试按后端/模型汇总、估算费用和任务统计"""
+    print("🧪 测试调用统计汇总...")
+
+    recorder = AIMetrics()
+    recorder.configure({"metrics": {"pricing": {"qwen-plus": {"prompt": 1.0, "completion": 2.0}}}})
+
+    with recorder.job("batch") as batch:
+        recorder.record("dashscope", "qwen-plus", 1000, 500, latency=1.0)
+        with recorder.job("file") as file_job:
+            recorder.record("dashscope", "qwen-plus", 2000, 0, latency=3.0, retries=1)
+        recorder.record("custom_http", None, 10, 10, success=False, estimated=True)
+    recorder.record("dashscope", "qwen-plus", 1, 1)
+
+    if batch["total"]["calls"] != 3 or file_job["total"]["calls"] != 1:
+        print(f"[ERROR] 任务统计不正确: {batch['total']} / {file_job['total']}")
+        return False
+    stats = batch["backends"]["dashscope/qwen-plus"]
+    if stats["cost"] != 4.0 or stats["latency_avg"] != 2.0 or stats["retries"] != 1:
+        print(f"[ERROR] 后端统计不正确: {stats}")
+        return False
+    total = recorder.summary()["total"]
+    if total["calls"] != 4 or total["failures"] != 1 or total["estimated_calls"] != 1:
+        print(f"[ERROR] 合计不正确: {total}")
+        return False
+
+    print(f"[OK] 批次 {batch['total']['total_tokens']} token，费用 {batch['total']['cost']}")
+    return True
+
+def test_job_spans_pipeline_threads():
+    """测试流水线中并发阶段的调用计入当前任务"""
+    print("\n🧪 测试并发阶段的任务统计...")
+
+    recorder = AIMetrics()
+
+    def call(_):
+        recorder.record("dashscope", "qwen-turbo", 10, 10)
+
+    with recorder.job("chat") as job:
+        StagePipeline([Stage("a", call), Stage("b", call), Stage("c", call, deps=("a",))]).run()
+
+    if job["total"]["calls"] != 3:
+        print(f"[ERROR] 任务只统计到 {job['total']['calls']} 次调用")
+        return False
+
+    print("[OK] 3 次并发调用均计入任务")
+    return True
+
+def test_usage_extraction():
+    """测试从响应中读取用量"""
+    print("\n🧪 测试用量提取...")
+
+    tgi = '[{"generated_text": "{}", "details": {"generated_tokens": 7, "prefill": [{}, {}, {}]}}]'
+    if custom_http_usage(tgi, "提示词") != (3, 7, False):
+        print(f"[ERROR] TGI 用量不正确: {custom_http_usage(tgi, '提示词')}")
+        return False
+    if custom_http_usage("纯文本回复", "提示词")[2] is not True:
+        print("[ERROR] 无用量信息时应标记为估算")
+        return False
+
+    caller = DirectAICaller.__new__(DirectAICaller)
+    caller.ai = AIClient({"ai": {"current_api": "openai", "api": {"openai": {
+        "model": "gpt-4", "temperature": 0.1, "max_tokens": 100}}}})
+    response = SimpleNamespace(
+        usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                              prompt_tokens_details=SimpleNamespace(cached_tokens=90)),
+        choices=[SimpleNamespace(message=SimpleNamespace(content="好的"))]
+    )
+
+    async def create(**request):
+        return response
+
+    caller.ai.clients["openai"] = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    with metrics.job("direct") as job:
+        caller._call_ai_api([{"role": "user", "content": "你好"}])
+    stats = job["backends"].get("openai/gpt-4", {})
+    if stats.get("prompt_tokens") != 120 or stats.get("completion_tokens") != 30 or stats.get("estimated_calls"):
+        print(f"[ERROR] 未记录响应中的用量: {job['backends']}")
+        return False
+    if stats.get("cached_tokens") != 90 or stats.get("cache_hit_rate") != 0.75:
+        print(f"[ERROR] 未记录提示词缓存命中: {stats}")
+        return False
+
+    # 命中缓存的输入按 cached_prompt 价格计费
+    recorder = AIMetrics()
+    recorder.configure({"metrics": {"pricing": {"gpt-4": {"prompt": 1.0, "cached_prompt": 0.5}}}})
+    if recorder.cost("gpt-4", 1000, 0, cached_tokens=800) != 0.6:
+        print(f"[ERROR] 缓存命中的费用不正确: {recorder.cost('gpt-4', 1000, 0, cached_tokens=800)}")
+        return False
+
+    print("[OK] 用量和缓存命中来自响应，缺失时估算")
+    return True
+
+def test_report_section():
+    """测试批量处理报告包含调用统计"""
+    print("\n🧪 测试处理报告...")
+
+    recorder = AIMetrics()
+    with recorder.job("batch") as batch:
+        recorder.record("dashscope", "qwen-plus", 100, 50, latency=0.5)
+
+    augmentor = AITreeAugmentor.__new__(AITreeAugmentor)
+    augmentor.last_merge_report = None
+    augmentor.last_metrics = batch
+    results = [{
+        "success": True, "source_file": "chat.txt", "new_nodes": {"nodes": {}},
+        "timestamp": "2024-01-01T00:00:00", "ai_usage": batch["total"]
+    }]
+
+    output_file = os.path.join(tempfile.mkdtemp(), "report.html")
+    augmentor.generate_report(results, output_file)
+    with open(output_file, encoding="utf-8") as f:
+        html = f.read()
+    if "AI调用统计" not in html or "dashscope/qwen-plus" not in html or "150 token" not in html:
+        print("[ERROR] 报告缺少调用统计")
+        return False
+
+    print("[OK] 报告包含按后端/模型的调用统计")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试AI调用统计...")
+
+    results = [
+        test_aggregation_and_jobs(),
+        test_job_spans_pipeline_threads(),
+        test_usage_extraction(),
+        test_report_section(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
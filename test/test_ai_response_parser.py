@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+from ai_response_parser import (PATH_SCHEMA, build_grammar, build_response_format, extract_json_from_response,
+                                iter_json_object_spans, validate_json_schema)
+
+PATH_DATA = {
+    "problem": "电脑无法连接网络",
+    "steps": [
+        {"step": 1, "question": "请问是WiFi还是有线连接？", "answer": "WiFi连接"},
+        {"step": 2, "question": "请尝试重启路由器", "answer": "重启后还是不行"}
+    ],
+    "solution": "请更新或重新安装网络适配器驱动"
+}
+
+def test_extract_formats():
+    """测试从不同格式的响应中提取路径"""
+    print("🧪 测试响应格式解析...")
+
+    path_json = json.dumps(PATH_DATA, ensure_ascii=False, indent=2)
+    test_cases = [
+        ("纯JSON", path_json),
+        ("代码块", f"分析结果如下：\n```json\n{path_json}\n```\n以上。"),
+        ("前后有说明文字", f"好的，{{先说明}}一下。\n{path_json}\n如有问题请告诉我 {{"),
+        ("字符串中含括号", path_json.replace("请尝试重启路由器", "请输入 {\\\"cmd\\\": \\\"}\\\"}")),
+        ("custom_http 包装", json.dumps([{"generated_text": path_json}], ensure_ascii=False)),
+        ("顶层数组", json.dumps([{"note": "解析结果"}, PATH_DATA], ensure_ascii=False)),
+        ("前面有未闭合的括号", f"输出格式为 {{ problem, steps, solution，结果：\n{path_json}"),
+        ("前面的括号段不是JSON", f"{{ 说明：以下为路径 {path_json} }}"),
+    ]
+
+    passed = 0
+    for name, response in test_cases:
+        result = extract_json_from_response(response, PATH_SCHEMA)
+        if result and len(result.get('steps', [])) == 2:
+            print(f"[OK] {name}")
+            passed += 1
+        else:
+            print(f"[ERROR] {name}: {result}")
+
+    return passed == len(test_cases)
+
+def test_schema_rejects_invalid():
+    """测试不符合结构约定的JSON被拒绝"""
+    print("\n🧪 测试结构校验...")
+
+    errors = validate_json_schema({"steps": [{"question": "只有问题"}]}, PATH_SCHEMA)
+    if errors != ["$.steps[0] 缺少字段 answer"]:
+        print(f"[ERROR] 校验错误不正确: {errors}")
+        return False
+
+    # 先出现的对象不符合约定时，应继续查找后面的对象
+    response = '{"note": "草稿"} 最终结果: ' + json.dumps(PATH_DATA, ensure_ascii=False)
+    if extract_json_from_response(response, PATH_SCHEMA) != PATH_DATA:
+        print("[ERROR] 没有跳过不符合约定的对象")
+        return False
+    if extract_json_from_response('{"steps": "不是数组"}', PATH_SCHEMA) is not None:
+        print("[ERROR] 应返回None")
+        return False
+
+    print("[OK] 结构校验正常")
+    return True
+
+def test_scanner_is_linear():
+    """测试扫描器处理深层嵌套和大输入"""
+    print("\n🧪 测试括号扫描器...")
+
+    deep = '{"a":' * 200 + '1' + '}' * 200
+    spans = list(iter_json_object_spans("前缀 " + deep + " 后缀 {}"))
+    if len(spans) != 2 or spans[0][1] - spans[0][0] != len(deep):
+        print(f"[ERROR] 扫描结果不正确: {spans}")
+        return False
+
+    # 大量未闭合的括号不应导致回溯
+    if list(iter_json_object_spans("{" * 100000)):
+        print("[ERROR] 未闭合的括号不应返回结果")
+        return False
+    # 未闭合的括号内部已闭合的对象仍然返回
+    spans = list(iter_json_object_spans("{" * 100000 + deep + " {}"))
+    if len(spans) != 2 or spans[0][1] - spans[0][0] != len(deep):
+        print(f"[ERROR] 未闭合括号之后的对象未找到: {spans}")
+        return False
+
+    print("[OK] 扫描器正常")
+    return True
+
+def test_extract_is_linear():
+    """测试提取耗时与响应长度成线性关系：解析失败的括号段不重新扫描，嵌套过深的JSON不报错"""
+    print("\n🧪 测试提取耗时...")
+
+    path_json = json.dumps(PATH_DATA, ensure_ascii=False)
+    n = 20000
+    test_cases = [
+        ("未闭合的深层括号", "{" * n + "}" * (n - 1) + path_json),
+        ("成对的深层括号", "{" * n + "}" * n + path_json),
+        ("嵌套的非法对象", '{"a" ' * n + "}" * n + path_json),
+        ("大量正文括号", "见 {注} " * n + path_json),
+        ("嵌套过深的JSON", '{"a":' * n + "1" + "}" * n + " " + path_json),
+    ]
+
+    for name, response in test_cases:
+        started = time.monotonic()
+        result = extract_json_from_response(response, PATH_SCHEMA)
+        elapsed = time.monotonic() - started
+        if result != PATH_DATA:
+            print(f"[ERROR] {name}: 未找到路径")
+            return False
+        if elapsed > 2:
+            print(f"[ERROR] {name}: {len(response)} 字符耗时 {elapsed:.2f}s")
+            return False
+        print(f"[OK] {name}: {len(response)} 字符耗时 {elapsed * 1000:.0f} ms")
+
+    if extract_json_from_response('{"a":' * n + "1" + "}" * n, PATH_SCHEMA) is not None:
+        print("[ERROR] 嵌套过深的JSON应返回None")
+        return False
+
+    return True
+
+def test_structured_output_params():
+    """测试结构化输出请求参数"""
+    print("\n🧪 测试结构化输出参数...")
+
+    schema_format = build_response_format("json_schema", PATH_SCHEMA, "chat_path")
+    if schema_format["json_schema"] != {"name": "chat_path", "schema": PATH_SCHEMA}:
+        print(f"[ERROR] json_schema 参数不正确: {schema_format}")
+        return False
+    if build_response_format("json_object", PATH_SCHEMA) != {"type": "json_object"}:
+        print("[ERROR] json_object 参数不正确")
+        return False
+    if build_response_format("grammar", PATH_SCHEMA) or build_response_format("none", PATH_SCHEMA):
+        print("[ERROR] 非OpenAI模式不应生成 response_format")
+        return False
+    if build_grammar("grammar", PATH_SCHEMA) != {"type": "json", "value": PATH_SCHEMA}:
+        print("[ERROR] grammar 参数不正确")
+        return False
+    if build_grammar("json_schema", PATH_SCHEMA) is not None:
+        print("[ERROR] 非grammar模式不应生成 grammar")
+        return False
+
+    print("[OK] 结构化输出参数正常")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试AI响应解析器...")
+
+    results = [
+        test_extract_formats(),
+        test_schema_rejects_invalid(),
+        test_scanner_is_linear(),
+        test_extract_is_linear(),
+        test_structured_output_params(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
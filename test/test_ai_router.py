@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+from types import SimpleNamespace
+from ai_router import BackendRouter, RateLimitedError, OPEN, CLOSED
+from ai_client import AIClient
+from direct_ai_call import DirectAICaller
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_weighted_latency_selection():
+    """测试按权重和延迟选择首选后端，fallback 后端排在最后"""
+    print("🧪 测试后端选择...")
+
+    router = BackendRouter([
+        {"name": "dashscope", "weight": 1},
+        {"name": "openai", "weight": 1},
+        {"name": "local", "fallback": True},
+    ], rng=random.Random(0))
+    router.record_success("dashscope", 0.5)
+    router.record_success("openai", 4.5)
+
+    firsts = [router.candidates()[0] for _ in range(1000)]
+    share = firsts.count("dashscope") / len(firsts)
+    if not 0.85 < share < 0.95:
+        print(f"[ERROR] 低延迟后端的份额不正确: {share:.2f}")
+        return False
+    if router.candidates()[-1] != "local" or "local" in firsts:
+        print("[ERROR] fallback 后端应只作为兜底")
+        return False
+
+    print(f"[OK] 低延迟后端承担 {share:.0%} 的首选请求")
+    return True
+
+def test_circuit_breaker():
+    """测试连续失败和限流熔断，冷却后试探恢复"""
+    print("\n🧪 测试熔断...")
+
+    clock = FakeClock()
+    router = BackendRouter([{"name": "dashscope"}, {"name": "openai"}],
+                           failure_threshold=2, cooldown=30, clock=clock)
+
+    router.record_failure("dashscope")
+    if "dashscope" not in router.candidates():
+        print("[ERROR] 未达到阈值不应熔断")
+        return False
+    router.record_failure("dashscope")
+    if router.candidates() != ["openai"]:
+        print(f"[ERROR] 熔断后仍被选中: {router.candidates()}")
+        return False
+
+    # 冷却结束后放行试探请求，试探失败重新熔断，成功则恢复
+    clock.now = 31
+    if "dashscope" not in router.candidates():
+        print("[ERROR] 冷却结束后应放行试探请求")
+        return False
+    router.record_failure("dashscope")
+    if router.backends["dashscope"].state != OPEN:
+        print("[ERROR] 试探失败应重新熔断")
+        return False
+    clock.now = 62
+    router.candidates()
+    router.record_success("dashscope", 1.0)
+    if router.backends["dashscope"].state != CLOSED:
+        print("[ERROR] 试探成功应恢复")
+        return False
+
+    # 限流：一次即熔断，冷却时间取 Retry-After
+    router.record_failure("openai", RateLimitedError("HTTP 429", retry_after=5))
+    status = {item["name"]: item for item in router.status()}
+    if status["openai"]["state"] != OPEN or status["openai"]["retry_in"] != 5:
+        print(f"[ERROR] 限流处理不正确: {status['openai']}")
+        return False
+
+    print("[OK] 连续失败和限流熔断，冷却后试探恢复")
+    return True
+
+def test_failover():
+    """测试调用失败时切换后端"""
+    print("\n🧪 测试故障切换...")
+
+    router = BackendRouter([{"name": "dashscope"}, {"name": "local", "fallback": True}])
+    tried = []
+
+    def call(name):
+        tried.append(name)
+        if name == "dashscope":
+            raise RateLimitedError("HTTP 429")
+        return f"{name} 的回复"
+
+    if router.call(call) != "local 的回复" or tried != ["dashscope", "local"]:
+        print(f"[ERROR] 未切换到兜底后端: {tried}")
+        return False
+    if router.call(lambda name: None) is not None:
+        print("[ERROR] 全部失败时应返回 None")
+        return False
+
+    print(f"[OK] 依次尝试: {tried}")
+    return True
+
+def test_single_probe():
+    """测试冷却结束后并发请求中只有一个试探请求发往恢复中的后端"""
+    print("\n🧪 测试并发试探...")
+
+    clock = FakeClock()
+    router = BackendRouter([{"name": "dashscope"}, {"name": "openai"}], cooldown=30, clock=clock)
+    router.record_failure("dashscope", force_open=True)
+    clock.now = 31
+    tried = []
+
+    async def call(name):
+        tried.append(name)
+        await asyncio.sleep(0.01)
+        return f"{name} 的回复"
+
+    async def fan_out():
+        return await asyncio.gather(*(router.acall(call) for _ in range(10)))
+
+    results = asyncio.run(fan_out())
+    if tried.count("dashscope") != 1 or tried.count("openai") != 9 or None in results:
+        print(f"[ERROR] 试探请求数不正确: {tried}")
+        return False
+    if router.backends["dashscope"].state != CLOSED or "dashscope" not in router.candidates():
+        print("[ERROR] 试探成功后应恢复")
+        return False
+
+    # 只有一个后端且试探在途时，其他请求不发往该后端
+    router = BackendRouter([{"name": "dashscope"}], cooldown=30, clock=clock)
+    router.record_failure("dashscope", force_open=True)
+    clock.now = 62
+    tried.clear()
+
+    async def cancelled_probe():
+        probe = asyncio.ensure_future(router.acall(call))
+        await asyncio.sleep(0)
+        others = await asyncio.gather(*(router.acall(call) for _ in range(3)))
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        return others
+
+    if asyncio.run(cancelled_probe()) != [None] * 3 or tried != ["dashscope"]:
+        print(f"[ERROR] 试探在途时不应放行其他请求: {tried}")
+        return False
+    if router.candidates() != ["dashscope"]:
+        print("[ERROR] 试探被取消后应放行下一个试探请求")
+        return False
+
+    print(f"[OK] {len(results)} 个并发请求中 1 个试探恢复中的后端")
+    return True
+
+def test_all_open_fail_fast():
+    """测试所有后端都熔断时请求直接失败，冷却结束后只放行一个试探请求"""
+    print("\n🧪 测试全部熔断...")
+
+    clock = FakeClock()
+    router = BackendRouter([{"name": "dashscope"}, {"name": "openai"}], cooldown=30, clock=clock)
+    router.record_failure("dashscope", force_open=True)
+    clock.now = 10
+    router.record_failure("openai", force_open=True)
+    tried = []
+
+    def call(name):
+        tried.append(name)
+        return f"{name} 的回复"
+
+    if router.candidates() != [] or router.call(call) is not None or tried:
+        print(f"[ERROR] 全部熔断时不应发出请求: {tried}")
+        return False
+
+    # dashscope 先结束冷却：只放行一个试探请求，其余请求直接失败
+    clock.now = 31
+    if router.candidates() != ["dashscope"] or not router._begin("dashscope"):
+        print("[ERROR] 冷却结束后应放行试探请求")
+        return False
+    if router.candidates() != []:
+        print(f"[ERROR] 试探在途时不应放行其他请求: {router.candidates()}")
+        return False
+    router.record_success("dashscope", 1.0)
+    if router.call(call) != "dashscope 的回复" or tried != ["dashscope"]:
+        print(f"[ERROR] 试探成功后应恢复: {tried}")
+        return False
+
+    print("[OK] 全部熔断时直接失败，冷却结束后试探恢复")
+    return True
+
+def test_caller_routes_to_ollama():
+    """测试调用器在主后端限流时使用本地 Ollama"""
+    print("\n🧪 测试调用器故障切换...")
+
+    caller = DirectAICaller.__new__(DirectAICaller)
+    caller.ai = AIClient({"ai": {
+        "current_api": "dashscope",
+        "api": {
+            "dashscope": {"model": "qwen-plus", "cheap_model": "qwen-turbo"},
+            "local": {"model": "qwen2.5:7b"},
+        },
+        "routing": {"enabled": True, "backends": [
+            {"name": "dashscope"}, {"name": "local", "fallback": True}
+        ]}
+    }})
+    requests_seen = []
+
+    class RateLimit(Exception):
+        status_code = 429
+
+    async def rate_limited(**request):
+        raise RateLimit("rate limited")
+
+    async def ollama(**request):
+        requests_seen.append(request["model"])
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content="本地回复"))])
+
+    completions = lambda create: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    caller.ai.clients = {"dashscope": completions(rate_limited), "local": completions(ollama)}
+
+    response = caller._call_ai_api([{"role": "user", "content": "你好"}], model="cheap")
+    if response != "本地回复" or requests_seen != ["qwen2.5:7b"]:
+        print(f"[ERROR] 未切换到本地模型: {response} {requests_seen}")
+        return False
+
+    print("[OK] 主后端限流后由本地 Ollama 返回结果")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试AI后端路由...")
+
+    results = [
+        test_weighted_latency_selection(),
+        test_circuit_breaker(),
+        test_failover(),
+        test_single_probe(),
+        test_all_open_fail_fast(),
+        test_caller_routes_to_ollama(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
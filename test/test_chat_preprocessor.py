@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from chat_preprocessor import ChatPreprocessor, preprocess_for_prompt
+from prompt_context import estimate_tokens
+from prompt_templates import compile_prompt
+
+RULES = {
+    "problem_keywords": ["问题", "故障", "错误", "异常", "无法", "不能"],
+    "solution_keywords": ["解决", "修复", "处理", "方法", "步骤", "操作"],
+    "exclude_keywords": ["你好", "谢谢", "再见", "ok", "好的"],
+}
+
+CHAT = """客服: 你好
+用户: 你好
+用户: 我的电脑无法连接网络了
+客服: 请问是WiFi还是有线连接？
+用户: WiFi连接
+客服: 请尝试重启路由器
+用户: 重启后还是不行，日志如下
+2024-01-01 10:00:00 ERROR: dhcp timeout
+2024-01-01 10:00:00 ERROR: dhcp timeout
+2024-01-01 10:00:00 ERROR: dhcp timeout
+客服: 请更新网络适配器驱动
+用户: 更新后可以连接了，谢谢
+客服: 好的
+用户: OK，再见"""
+
+def make_preprocessor(max_tokens=3000, max_turn_chars=800):
+    return ChatPreprocessor(RULES["problem_keywords"], RULES["solution_keywords"], RULES["exclude_keywords"],
+                            max_tokens=max_tokens, max_turn_chars=max_turn_chars)
+
+def test_cleanup():
+    """测试去掉寒暄、合并重复行，保留问答步骤"""
+    print("🧪 测试聊天记录清理...")
+
+    text, stats = make_preprocessor().process(CHAT)
+    for removed in ["客服: 你好", "客服: 好的", "OK，再见"]:
+        if removed in text:
+            print(f"[ERROR] 寒暄未去掉: {removed}")
+            return False
+    for kept in ["用户: WiFi连接", "更新后可以连接了，谢谢", "（重复 3 次）"]:
+        if kept not in text:
+            print(f"[ERROR] 缺少内容: {kept}\n{text}")
+            return False
+    if text.count("dhcp timeout") != 1 or stats["turns"] != 7 or stats["original_turns"] != 11:
+        print(f"[ERROR] 统计不正确: {stats}")
+        return False
+
+    print(f"[OK] {stats['original_turns']} 条发言精简为 {stats['turns']} 条，"
+          f"{stats['original_tokens']} → {stats['tokens']} token")
+    return True
+
+def test_long_paste_truncated():
+    """测试超长粘贴内容保留开头和结尾，时间戳行不被当作发言人"""
+    print("\n🧪 测试超长粘贴...")
+
+    log = "\n".join(f"12:00:{i:02d} kernel: eth0 link down, retry {i}" for i in range(60))
+    text, _ = make_preprocessor(max_turn_chars=300).process(f"用户: 网络故障，日志：\n{log}\n客服: 请更换网线")
+    if "retry 0" not in text or "retry 59" not in text or "省略" not in text:
+        print(f"[ERROR] 截断不正确:\n{text}")
+        return False
+    if not text.endswith("客服: 请更换网线"):
+        print("[ERROR] 日志之后的发言丢失")
+        return False
+
+    print("[OK] 超长粘贴只保留开头和结尾")
+    return True
+
+def test_short_answers_kept():
+    """测试以寒暄词开头的简短回答保留，英文关键词按整词匹配"""
+    print("\n🧪 测试简短回答...")
+
+    preprocessor = make_preprocessor()
+    chat = "\n".join([
+        "客服: 显示器电源灯亮吗？", "用户: 好的，不亮",
+        "客服: 是 HDMI 连接吗？", "用户: ok 是",
+        "客服: 换线后呢？", "用户: 好的，可以了",
+        "客服: 屏幕显示什么？", "用户: book mode",
+        "客服: 好的", "用户: OK，谢谢",
+    ])
+    kept = [text for _, text in preprocessor.turns(chat)]
+    for answer in ["好的，不亮", "ok 是", "好的，可以了", "book mode"]:
+        if answer not in kept:
+            print(f"[ERROR] 回答被当作寒暄删除: {answer}")
+            return False
+    if "好的" in kept or "OK，谢谢" in kept:
+        print(f"[ERROR] 寒暄未删除: {kept}")
+        return False
+
+    print("[OK] 只删除去掉寒暄词后没有内容的发言")
+    return True
+
+def test_token_budget():
+    """测试超出预算时优先保留关键词发言，且结果不超出预算"""
+    print("\n🧪 测试 token 预算...")
+
+    chat = "\n".join(
+        ["用户: 打印机无法打印"]
+        + [f"客服: 请确认第{i}项设置是否正确，例如纸张大小、纸盒和打印质量" for i in range(40)]
+        + ["客服: 解决方法是重新安装打印机驱动", "用户: 已恢复"]
+    )
+    for budget in (120, 40, 5):
+        text, stats = make_preprocessor(max_tokens=budget).process(chat)
+        if stats["tokens"] > budget or estimate_tokens(text) > budget:
+            print(f"[ERROR] 超出预算 {budget}: {stats}")
+            return False
+
+    text, _ = make_preprocessor(max_tokens=120).process(chat)
+    for kept in ["打印机无法打印", "解决方法是重新安装打印机驱动", "已恢复"]:
+        if kept not in text:
+            print(f"[ERROR] 关键词发言被删除: {kept}\n{text}")
+            return False
+
+    print("[OK] 结果不超出预算，关键词发言和首尾发言保留")
+    return True
+
+def test_prompt_budget_from_config():
+    """测试按配置预处理，上下文很小时仍保留聊天记录，未启用时原样返回"""
+    print("\n🧪 测试按配置预处理...")
+
+    template = compile_prompt({"system": "你是诊断专家", "user": "聊天记录：\n{chat_history}"})
+    config = {"ai": {"current_api": "local", "api": {"local": {"context_window": 8192}}},
+              "chat_parser": {"rules": RULES, "preprocess": {"enabled": True, "max_tokens": 3000}}}
+    if "客服: 你好" in preprocess_for_prompt(config, template, CHAT):
+        print("[ERROR] 启用后应精简聊天记录")
+        return False
+
+    # 上下文不足以容纳提示词时按最小预算精简，不能发送空的聊天记录
+    config["ai"]["api"]["local"]["context_window"] = 16
+    if "无法连接网络" not in preprocess_for_prompt(config, template, CHAT):
+        print("[ERROR] 上下文很小时不应返回空的聊天记录")
+        return False
+
+    config["chat_parser"]["preprocess"]["enabled"] = False
+    if preprocess_for_prompt(config, template, CHAT) != CHAT:
+        print("[ERROR] 未启用时应原样返回")
+        return False
+
+    print("[OK] 按 chat_parser.preprocess 配置执行")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试聊天记录预处理...")
+
+    results = [
+        test_cleanup(),
+        test_long_paste_truncated(),
+        test_short_answers_kept(),
+        test_token_budget(),
+        test_prompt_budget_from_config(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,21 @@
 import os
 import yaml
 import json
-import requests
-from unittest.mock import patch, Mock
+import httpx
 from ai_chat_parser import AIChatParser
 
-def create_mock_response(content_field_path, response_data):
-    """创建模拟的HTTP响应"""
-    mock_response = Mock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = response_data
-    mock_response.text = json.dumps(response_data, ensure_ascii=False)
-    return mock_response
+def mock_http(parser, status_code, response_data):
+    """让解析器的HTTP请求返回模拟响应，返回记录请求的列表"""
+    requests_sent = []
+
+    def handler(request):
+        requests_sent.append(request)
+        if isinstance(response_data, str):
+            return httpx.Response(status_code, text=response_data)
+        return httpx.Response(status_code, json=response_data)
+
+    parser.ai.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return requests_sent
 
 def test_custom_http_api_with_mock():
     """使用打桩测试自定义HTTP API功能"""
@@ -142,59 +146,48 @@ def test_custom_http_api_with_mock():
             # 重新创建解析器
             parser = AIChatParser(ai_config_file='test_ai_config.yaml')
             
-            # 创建模拟响应
-            mock_response = create_mock_response(content_field, test_case['response_data'])
+            # 模拟HTTP响应
+            requests_sent = mock_http(parser, 200, test_case['response_data'])
+            print(f"模拟响应: {json.dumps(test_case['response_data'], ensure_ascii=False, indent=2)}")
+            print(f"内容字段路径: {content_field}")
             
-            # 使用patch模拟requests.post
-            with patch('requests.post', return_value=mock_response) as mock_post:
-                print(f"模拟响应: {json.dumps(test_case['response_data'], ensure_ascii=False, indent=2)}")
-                print(f"内容字段路径: {content_field}")
-                
-                # 调用API
-                response = parser._call_ai_api(test_messages)
-                
-                if response:
-                    print("[OK] 测试成功!")
-                    print(f"提取的内容: {response}")
-                    
-                    # 验证请求参数
-                    mock_post.assert_called_once()
-                    call_args = mock_post.call_args
-                    print(f"请求URL: {call_args[0][0]}")
-                    print(f"请求头: {json.dumps(call_args[1]['headers'], indent=2, ensure_ascii=False)}")
-                    print(f"请求体: {json.dumps(call_args[1]['json'], indent=2, ensure_ascii=False)}")
-                else:
-                    print("[ERROR] 测试失败")
+            # 调用API
+            response = parser._call_ai_api(test_messages)
+            
+            if response:
+                print("[OK] 测试成功!")
+                print(f"提取的内容: {response}")
                 
-                print()
+                # 验证请求参数
+                assert len(requests_sent) == 1
+                sent = requests_sent[0]
+                print(f"请求URL: {sent.url}")
+                print(f"请求头: {json.dumps(dict(sent.headers), indent=2, ensure_ascii=False)}")
+                print(f"请求体: {json.dumps(json.loads(sent.content), indent=2, ensure_ascii=False)}")
+            else:
+                print("[ERROR] 测试失败")
+            
+            print()
         
         # 测试错误情况
         print("🧪 测试错误情况")
         print("-" * 50)
         
         # 测试HTTP错误
-        error_response = Mock()
-        error_response.status_code = 500
-        error_response.text = "Internal Server Error"
-        
-        with patch('requests.post', return_value=error_response) as mock_post:
-            response = parser._call_ai_api(test_messages)
-            if response is None:
-                print("[OK] HTTP错误处理正确")
-            else:
-                print("[ERROR] HTTP错误处理失败")
+        mock_http(parser, 500, "Internal Server Error")
+        response = parser._call_ai_api(test_messages)
+        if response is None:
+            print("[OK] HTTP错误处理正确")
+        else:
+            print("[ERROR] HTTP错误处理失败")
         
         # 测试解析错误
-        invalid_response = Mock()
-        invalid_response.status_code = 200
-        invalid_response.json.return_value = {"invalid": "response"}
-        
-        with patch('requests.post', return_value=invalid_response) as mock_post:
-            response = parser._call_ai_api(test_messages)
-            if response is None:
-                print("[OK] 解析错误处理正确")
-            else:
-                print("[ERROR] 解析错误处理失败")
+        mock_http(parser, 200, {"invalid": "response"})
+        response = parser._call_ai_api(test_messages)
+        if response is None:
+            print("[OK] 解析错误处理正确")
+        else:
+            print("[ERROR] 解析错误处理失败")
                 
     except Exception as e:
         print(f"[ERROR] 测试失败: {e}")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import time
+from tree_layout import TreeLayoutService, slice_tree, tree_revision
+
+def build_tree(width, depth):
+    """构造每个节点有 width 个子节点、共 depth 层的决策树"""
+    nodes = {}
+
+    def add(node_id, level):
+        if level == depth:
+            nodes[node_id] = {"solution": f"{node_id} 的解决方案"}
+            return
+        nodes[node_id] = {"question": f"{node_id} 的问题", "options": []}
+        for i in range(width):
+            child_id = f"{node_id}_{i}"
+            nodes[node_id]["options"].append({"text": f"选项{i}", "next_node": child_id})
+            add(child_id, level + 1)
+
+    add("start", 0)
+    return {"root_node": "start", "nodes": nodes}
+
+def has_overlap(positions):
+    """同一层的相邻节点间距是否小于1个单位"""
+    levels = {}
+    for pos in positions.values():
+        levels.setdefault(pos['depth'], []).append(pos['x'])
+    for xs in levels.values():
+        xs.sort()
+        if any(b - a < 0.999 for a, b in zip(xs, xs[1:])):
+            return True
+    return False
+
+def test_layout_positions():
+    """测试布局坐标"""
+    print("🧪 测试布局坐标...")
+
+    tree = build_tree(3, 3)
+    layout = TreeLayoutService().layout(tree)
+    positions = layout['positions']
+
+    if len(positions) != len(tree['nodes']):
+        print(f"[ERROR] 节点数量不一致: {len(positions)}")
+        return False
+    if positions['start'] != {"x": 0.0, "depth": 0}:
+        print(f"[ERROR] 根节点位置不正确: {positions['start']}")
+        return False
+    if has_overlap(positions):
+        print("[ERROR] 同层节点重叠")
+        return False
+    children = [positions[f"start_{i}"]['x'] for i in range(3)]
+    if abs((children[0] + children[-1]) / 2) > 1e-6:
+        print(f"[ERROR] 父节点没有居中: {children}")
+        return False
+
+    print(f"[OK] 版本 {layout['revision']}，{len(positions)} 个节点")
+    return True
+
+def test_revision_cache():
+    """测试按版本缓存和子树增量计算"""
+    print("\n🧪 测试布局缓存...")
+
+    tree = build_tree(3, 4)
+    service = TreeLayoutService()
+    first = service.layout(tree)
+    full = service.last_recomputed
+
+    service.layout(copy.deepcopy(tree))
+    if service.last_recomputed != 0:
+        print("[ERROR] 相同版本应直接命中缓存")
+        return False
+
+    # 在一个叶子节点下新增子节点：只重新计算该路径上的子树
+    changed = copy.deepcopy(tree)
+    changed['nodes']['start_0_0_0_0'] = {"question": "新问题", "options": [{"text": "是", "next_node": "new_leaf"}]}
+    changed['nodes']['new_leaf'] = {"solution": "新的解决方案"}
+    result = service.layout(changed)
+
+    if result['revision'] == first['revision'] or result['revision'] != tree_revision(changed):
+        print("[ERROR] 版本号不正确")
+        return False
+    if service.last_recomputed > 7:
+        print(f"[ERROR] 重新计算了 {service.last_recomputed}/{full} 个子树")
+        return False
+    if result['positions'] != TreeLayoutService().layout(changed)['positions']:
+        print("[ERROR] 增量布局与完整布局不一致")
+        return False
+    if has_overlap(result['positions']):
+        print("[ERROR] 增量布局后同层节点重叠")
+        return False
+
+    print(f"[OK] 完整计算 {full} 个子树，增量计算 {service.last_recomputed} 个")
+    return True
+
+def test_shared_nodes_and_cycles():
+    """测试多父节点和环"""
+    print("\n🧪 测试多父节点和环...")
+
+    tree = {
+        "root_node": "start",
+        "nodes": {
+            "start": {"question": "问题？", "options": [{"text": "A", "next_node": "a"},
+                                                       {"text": "B", "next_node": "b"}]},
+            "a": {"question": "A？", "options": [{"text": "继续", "next_node": "shared"}]},
+            "b": {"question": "B？", "options": [{"text": "继续", "next_node": "shared"},
+                                               {"text": "返回", "next_node": "start"}]},
+            "shared": {"solution": "共同的解决方案"},
+            "loop_1": {"question": "环1", "options": [{"text": "下一步", "next_node": "loop_2"}]},
+            "loop_2": {"question": "环2", "options": [{"text": "下一步", "next_node": "loop_1"}]}
+        }
+    }
+
+    positions = TreeLayoutService().layout(tree)['positions']
+    if set(positions) != set(tree['nodes']):
+        print(f"[ERROR] 缺少节点: {set(tree['nodes']) - set(positions)}")
+        return False
+    if positions['shared']['depth'] != 2:
+        print("[ERROR] 共享节点应放在最浅的层级")
+        return False
+
+    print("[OK] 所有节点都有位置")
+    return True
+
+def test_deep_tree():
+    """测试深层决策树：轮廓共享而不复制，计算量与节点数成线性关系"""
+    print("\n🧪 测试深层决策树...")
+
+    # 每一层一个问题节点和一个解决方案节点，共 3000 层
+    nodes = {}
+    for i in range(3000):
+        nodes[f"q{i}"] = {"question": f"第{i}步？", "options": [{"text": "已解决", "next_node": f"s{i}"},
+                                                            {"text": "未解决", "next_node": f"q{i + 1}"}]}
+        nodes[f"s{i}"] = {"solution": f"第{i}步的解决方案"}
+    nodes["q3000"] = {"solution": "联系技术支持"}
+    tree = {"root_node": "q0", "nodes": nodes}
+
+    started = time.monotonic()
+    positions = TreeLayoutService().layout(tree)['positions']
+    elapsed = time.monotonic() - started
+    if positions['q3000']['depth'] != 3000 or has_overlap(positions):
+        print("[ERROR] 深层决策树布局不正确")
+        return False
+    if positions['s0']['x'] >= positions['q1']['x']:
+        print("[ERROR] 子节点顺序不正确")
+        return False
+
+    print(f"[OK] {len(positions)} 个节点布局耗时 {elapsed * 1000:.1f} ms")
+    return True
+
+def test_slice_tree():
+    """测试按层级截取决策树"""
+    print("\n🧪 测试按层级截取...")
+
+    tree = build_tree(2, 4)
+    sliced = slice_tree(tree, 1)
+    if set(sliced['nodes']) != {"start", "start_0", "start_1"}:
+        print(f"[ERROR] 截取的节点不正确: {sorted(sliced['nodes'])}")
+        return False
+    if sorted(sliced['truncated']) != ["start_0", "start_1"]:
+        print(f"[ERROR] 截断节点不正确: {sliced['truncated']}")
+        return False
+
+    children = slice_tree(tree, 1, start_node="start_0")
+    if set(children['nodes']) != {"start_0_0", "start_0_1"}:
+        print(f"[ERROR] 子节点不正确: {sorted(children['nodes'])}")
+        return False
+
+    full = slice_tree(tree, 10)
+    if len(full['nodes']) != len(tree['nodes']) or full['truncated']:
+        print("[ERROR] 深度足够时应返回完整树")
+        return False
+
+    print(f"[OK] 第1层截断节点: {sliced['truncated']}")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试布局服务...")
+
+    results = [
+        test_layout_positions(),
+        test_revision_cache(),
+        test_shared_nodes_and_cycles(),
+        test_deep_tree(),
+        test_slice_tree(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
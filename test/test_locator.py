@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import contextlib
+import io
 import os
 import sys
 import yaml
 from problem_locator import ProblemLocator
+from path_stats import PathStats
 
 def test_config_loading():
     """测试配置文件加载"""
@@ -111,6 +114,52 @@ def test_diagnostic_path():
     
     return True
 
+def test_frequency_order():
+    """测试按历史选择次数排序选项，编号和模糊匹配都按排序后的顺序"""
+    print("\n🧪 测试按使用频率排序选项...")
+    
+    stats = PathStats()
+    locator = ProblemLocator("config/decision_tree.yaml", stats)
+    for _ in range(2):
+        locator.current_node = "start"
+        locator.diagnostic_path = []
+        locator._process_user_input("性能问题")
+        locator._record_session()
+    if stats.option_counts("start") != {"性能问题": 2}:
+        print(f"[ERROR] 未记录选择: {stats.option_counts('start')}")
+        return False
+    
+    locator = ProblemLocator("config/decision_tree.yaml", stats, order_by_frequency=True)
+    if locator._ordered_options("start")[0]['text'] != "性能问题":
+        print("[ERROR] 常用选项应排在最前")
+        return False
+    # "问题" 与多个选项得分相同，优先匹配常用选项
+    locator._process_user_input("问题")
+    if locator.current_node != "performance_issue":
+        print(f"[ERROR] 得分相同时应优先匹配常用选项: {locator.current_node}")
+        return False
+    locator.current_node = "start"
+    locator._process_user_input("1")
+    if locator.current_node != "performance_issue":
+        print(f"[ERROR] 编号应按排序后的顺序解析: {locator.current_node}")
+        return False
+    
+    # 显示选项后其他会话改变了计数，编号仍按显示时的顺序解析
+    locator.current_node = "start"
+    with contextlib.redirect_stdout(io.StringIO()):
+        locator._display_current_question()
+    other = locator._ordered_options("start")[1]
+    for _ in range(3):
+        stats.record_session([{"node": "start", "choice": other['text'], "next_node": other['next_node']}],
+                             other['next_node'])
+    locator._process_user_input("1")
+    if locator.current_node != "performance_issue":
+        print(f"[ERROR] 编号应按显示时的顺序解析: {locator.current_node}")
+        return False
+    
+    print("[OK] 常用选项排在最前")
+    return True
+
 def main():
     """主测试函数"""
     print("[DEBUG] 问题定位器功能测试")
@@ -121,6 +170,7 @@ def main():
         ("模糊匹配", test_fuzzy_matching),
         ("节点遍历", test_node_traversal),
         ("诊断路径", test_diagnostic_path),
+        ("使用频率排序", test_frequency_order),
     ]
     
     passed = 0
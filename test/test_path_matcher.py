@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import hashlib
+import time
+from ai_chat_parser import AIChatParser
+from ai_metrics import metrics
+from direct_ai_call import DirectAICaller
+from path_matcher import PathMatcher, get_matcher, match_existing_path
+from tree_merger import TreeMerger, convert_path_to_nodes
+
+TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {"question": "您遇到了什么类型的问题？", "options": [
+            {"text": "网络连接问题", "next_node": "network_issue"},
+            {"text": "打印问题", "next_node": "printer_issue"},
+        ]},
+        "network_issue": {"question": "您的网络问题具体表现是什么？", "options": [
+            {"text": "无法连接网络", "next_node": "no_connection"},
+            {"text": "网络速度很慢", "next_node": "slow_network"},
+        ]},
+        "no_connection": {"question": "您的网络连接方式是什么？", "options": [
+            {"text": "WiFi连接", "next_node": "wifi_fix"},
+            {"text": "有线连接", "next_node": "wired_fix"},
+        ]},
+        "printer_issue": {"question": "打印机有什么现象？", "options": [
+            {"text": "卡纸", "next_node": "paper_jam"},
+        ]},
+        "wifi_fix": {"solution": "检查WiFi开关和密码，重启路由器。"},
+        "wired_fix": {"solution": "检查网线是否插好，更换网线。"},
+        "slow_network": {"solution": "关闭占用带宽的程序。"},
+        "paper_jam": {"solution": "取出卡住的纸张。"},
+    }
+}
+
+CONFIG = {
+    "chat_parser": {
+        "fast_path": {"enabled": True},
+        "rules": {"exclude_keywords": ["你好", "谢谢", "再见", "ok", "好的"]},
+    }
+}
+
+RETRACE = """用户: 你好，我的电脑无法连接网络了
+客服: 请问您的网络连接方式是什么？WiFi还是有线连接？
+用户: WiFi连接
+客服: 请检查WiFi开关和密码，然后重启路由器
+用户: 好了，谢谢"""
+
+NEW_INFO = """用户: 我的电脑无法连接网络了
+客服: 请问是WiFi还是有线连接？
+用户: WiFi连接
+客服: 请尝试重启路由器
+用户: 重启后还是不行
+客服: 请检查网络适配器驱动
+用户: 设备管理器里有感叹号，显示驱动有问题
+客服: 请重新安装网络适配器驱动
+用户: 重装后可以连接了"""
+
+def test_full_match():
+    """测试与已有路径一致的聊天记录（客户跳过了问题分类）匹配到该路径，合并时全部复用已有节点"""
+    print("🧪 测试匹配已有路径...")
+
+    result = PathMatcher.from_config(TREE, CONFIG).match(RETRACE)
+    if not result or result['nodes'] != ["start", "network_issue", "no_connection", "wifi_fix"]:
+        print(f"[ERROR] 匹配结果不正确: {result}")
+        return False
+    answers = [step['answer'] for step in result['path']['steps']]
+    # 结尾的“好了，谢谢”去掉寒暄后剩“好了”，仍计为客户发言，但不对应任何步骤
+    if answers != ["无法连接网络", "WiFi连接"] or result['path']['problem'] != "网络连接问题" \
+            or result['coverage'] != round(2 / 3, 3):
+        print(f"[ERROR] 路径数据不正确: {result['path']}")
+        return False
+
+    tree = copy.deepcopy(TREE)
+    report = TreeMerger(tree).merge_paths([result['path']])
+    if report['added_nodes'] or report['updated_nodes'] or tree != TREE:
+        print(f"[ERROR] 合并匹配的路径不应修改决策树: {report}")
+        return False
+
+    print(f"[OK] 匹配路径 {' → '.join(result['nodes'])}，得分 {result['score']}")
+    return True
+
+def test_no_match():
+    """测试有新信息、有歧义或未启用时不走快速路径"""
+    print("\n🧪 测试不匹配的情况...")
+
+    matcher = PathMatcher.from_config(TREE, CONFIG)
+    if matcher.match(NEW_INFO) is not None:
+        print("[ERROR] 含树中没有的排查步骤时不应匹配")
+        return False
+    if matcher.match("用户: 无法连接网络\n客服: 是哪种连接方式？\n用户: 不清楚") is not None:
+        print("[ERROR] 最后一步没有回答时不应匹配")
+        return False
+
+    # 两条路径的回答相同，无法区分
+    tree = copy.deepcopy(TREE)
+    tree['nodes']['network_issue']['options'] += [{"text": "无法连接网络", "next_node": "wired_fix"},
+                                                   {"text": "无法连接网络", "next_node": "slow_network"}]
+    if PathMatcher.from_config(tree, CONFIG).match("用户: 无法连接网络") is not None:
+        print("[ERROR] 有歧义时不应匹配")
+        return False
+
+    if PathMatcher.from_config(TREE, {}) is not None or match_existing_path({}, TREE, RETRACE) is not None:
+        print("[ERROR] 未启用时不应匹配")
+        return False
+
+    print("[OK] 新信息、未回答、歧义和未启用时都交给AI解析")
+    return True
+
+def test_root_only_match():
+    """测试只有根节点一步的路径：转换和合并都不新增节点"""
+    print("\n🧪 测试只有根节点一步的路径...")
+
+    tree = {"root_node": "start", "nodes": {
+        "start": {"question": "您遇到了什么类型的问题？", "options": [
+            {"text": "打印机卡纸", "next_node": "paper_jam"},
+            {"text": "屏幕不亮", "next_node": "no_display"},
+        ]},
+        "paper_jam": {"solution": "取出卡住的纸张。"},
+        "no_display": {"solution": "检查显示器电源。"},
+    }}
+    result = match_existing_path(CONFIG, tree, "用户: 打印机卡纸了\n客服: 请取出卡住的纸张")
+    if not result or result['nodes'] != ["start", "paper_jam"]:
+        print(f"[ERROR] 匹配结果不正确: {result}")
+        return False
+
+    merged = copy.deepcopy(tree)
+    merger = TreeMerger(merged)
+    report = merger.merge(convert_path_to_nodes(result['path']))
+    batch_report = merger.merge_paths([result['path']])
+    if report['added_nodes'] != [] or report['updated_nodes'] != [] or batch_report['added_nodes'] != [] \
+            or merged != tree:
+        print(f"[ERROR] 不应新增节点: {report} {batch_report}")
+        return False
+
+    print("[OK] 已有路径不生成新节点")
+    return True
+
+def test_indexed_lookup():
+    """测试匹配器按决策树版本缓存，且只沿匹配到的选项搜索（路径数很多时也能匹配）"""
+    print("\n🧪 测试索引查找和缓存...")
+
+    tree = copy.deepcopy(TREE)
+    if get_matcher(tree, CONFIG) is not get_matcher(copy.deepcopy(tree), CONFIG):
+        print("[ERROR] 决策树未修改时应复用匹配器")
+        return False
+    tree['nodes']['wifi_fix']['solution'] = "更新网卡驱动。"
+    if get_matcher(tree, CONFIG) is get_matcher(TREE, CONFIG):
+        print("[ERROR] 决策树修改后应重建匹配器")
+        return False
+
+    # 200 x 100 = 20000 条路径，匹配最后一条；选项文本取哈希值，互不相似
+    def label(*parts):
+        return hashlib.md5(repr(parts).encode()).hexdigest()[:10]
+
+    nodes = {"start": {"question": "设备类型？", "options": []}}
+    for i in range(200):
+        nodes["start"]["options"].append({"text": f"型号{label(i)}", "next_node": f"d{i}"})
+        nodes[f"d{i}"] = {"question": f"型号{label(i)}的故障代码？", "options": []}
+        for j in range(100):
+            nodes[f"d{i}"]["options"].append({"text": f"代码{label(i, j)}", "next_node": f"s{i}_{j}"})
+            nodes[f"s{i}_{j}"] = {"solution": f"按手册处理 {label(i, j)}"}
+    big_tree = {"root_node": "start", "nodes": nodes}
+    matcher = get_matcher(big_tree, CONFIG)
+    started = time.monotonic()
+    result = matcher.match(f"用户: 型号{label(199)}\n客服: 故障代码是多少？\n用户: 代码{label(199, 99)}")
+    elapsed = time.monotonic() - started
+    if not result or result['nodes'] != ["start", "d199", "s199_99"]:
+        print(f"[ERROR] 应匹配到最后一条路径: {result}")
+        return False
+
+    print(f"[OK] 20000 条路径中匹配耗时 {elapsed * 1000:.1f} ms")
+    return True
+
+class NoAI:
+    """任何AI调用都视为失败"""
+
+    def call(self, *args, **kwargs):
+        raise AssertionError("不应调用AI")
+
+    call_many = call
+
+def test_callers_skip_ai():
+    """测试解析器和直接调用器命中快速路径时不调用AI，并记录命中次数"""
+    print("\n🧪 测试跳过AI调用...")
+
+    metrics.reset()
+    parser = AIChatParser.__new__(AIChatParser)
+    parser.ai_config = CONFIG
+    parser.ai = NoAI()
+    result = parser.process_chat_and_generate_tree(RETRACE, TREE)
+    if not result['success'] or result['new_nodes'] is not TREE or "fast_path" not in result:
+        print(f"[ERROR] 解析器未走快速路径: {result}")
+        return False
+
+    caller = DirectAICaller.__new__(DirectAICaller)
+    caller.ai_config = CONFIG
+    caller.ai = NoAI()
+    path_data = caller.parse_chat_to_path(RETRACE, TREE)
+    if path_data['fast_path']['nodes'][-1] != "wifi_fix":
+        print(f"[ERROR] 直接调用器未走快速路径: {path_data}")
+        return False
+
+    fast_path = metrics.summary()['fast_path']
+    if fast_path != {"hits": 2, "paths": {"start > network_issue > no_connection > wifi_fix": 2}}:
+        print(f"[ERROR] 命中次数不正确: {fast_path}")
+        return False
+    if metrics.summary()['total']['calls'] != 0:
+        print("[ERROR] 快速路径不应产生AI调用")
+        return False
+
+    print(f"[OK] 命中统计: {fast_path}")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试已有路径匹配...")
+
+    results = [
+        test_full_match(),
+        test_no_match(),
+        test_root_only_match(),
+        test_indexed_lookup(),
+        test_callers_skip_ai(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import yaml
+from path_stats import PathStats
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {"question": "问题类型？", "options": [
+            {"text": "网络", "next_node": "network"},
+            {"text": "打印机", "next_node": "printer"},
+            {"text": "声音", "next_node": "audio"},
+        ]},
+        "network": {"question": "连接方式？", "options": [
+            {"text": "WiFi", "next_node": "wifi_fix"},
+            {"text": "有线", "next_node": "wired_fix"},
+        ]},
+        "wifi_fix": {"solution": "重启路由器"},
+        "wired_fix": {"solution": "更换网线"},
+        "printer": {"solution": "检查纸张"},
+        "audio": {"solution": "检查音量"},
+    }
+}
+
+def step(node, choice, next_node):
+    return {"node": node, "choice": choice, "next_node": next_node}
+
+WIFI_PATH = [step("start", "网络", "network"), step("network", "WiFi", "wifi_fix")]
+
+def test_counts_persisted():
+    """测试计数写入 SQLite（首次使用时才创建），重新打开后仍在，并按次数排序选项"""
+    print("🧪 测试计数持久化...")
+
+    db_file = os.path.join(tempfile.mkdtemp(), "path_stats.db")
+    stats = PathStats(db_file)
+    if os.path.exists(db_file):
+        print("[ERROR] 数据库应在首次使用时才创建")
+        return False
+    stats.record_session(WIFI_PATH, "wifi_fix")
+    stats.record_session(WIFI_PATH, "wifi_fix")
+    stats.record_session([step("start", "打印机", "printer")], "printer")
+    stats.close()
+
+    stats = PathStats(db_file)
+    if stats.option_counts("start") != {"网络": 2, "打印机": 1}:
+        print(f"[ERROR] 计数不正确: {stats.option_counts('start')}")
+        return False
+    ordered = [option['text'] for option in stats.order_options("start", TREE['nodes']['start']['options'])]
+    if ordered != ["网络", "打印机", "声音"]:
+        print(f"[ERROR] 排序不正确: {ordered}")
+        return False
+    ordered = [option['text'] for option in stats.order_options("network", TREE['nodes']['network']['options'][::-1])]
+    if ordered != ["WiFi", "有线"]:
+        print(f"[ERROR] 排序不正确: {ordered}")
+        return False
+
+    print(f"[OK] 重新打开后计数: {stats.option_counts('start')}")
+    return True
+
+def test_report():
+    """测试汇总报告：占比、平均步数、从未选择的选项、从未到达的节点和已删除选项的计数"""
+    print("\n🧪 测试统计报告...")
+
+    stats = PathStats()
+    for _ in range(3):
+        stats.record_session(WIFI_PATH, "wifi_fix")
+    stats.record_session([step("start", "打印机", "printer")], "printer")
+    stats.record_session([step("start", "旧选项", "old")], "old")
+
+    report = stats.report(TREE)
+    if report['sessions'] != 5 or report['avg_steps'] != 1.6:
+        print(f"[ERROR] 会话统计不正确: {report['sessions']} {report['avg_steps']}")
+        return False
+    start = report['nodes']['start']
+    if start['visits'] != 4 or start['options'][0] != {"text": "网络", "next_node": "network", "count": 3, "share": 0.75}:
+        print(f"[ERROR] 节点统计不正确: {start}")
+        return False
+    dead = {(item['node'], item['text']) for item in report['dead_options']}
+    if dead != {("start", "声音"), ("network", "有线")}:
+        print(f"[ERROR] 从未选择的选项不正确: {dead}")
+        return False
+    if report['unvisited_nodes'] != ["audio", "wired_fix"]:
+        print(f"[ERROR] 从未到达的节点不正确: {report['unvisited_nodes']}")
+        return False
+    if [item['text'] for item in report['stale']] != ["旧选项"]:
+        print(f"[ERROR] 已删除选项不正确: {report['stale']}")
+        return False
+    if stats.report(TREE, min_visits=5)['dead_options']:
+        print("[ERROR] 访问次数不足的节点不应判断为从未选择")
+        return False
+
+    print(f"[OK] 从未到达的节点: {report['unvisited_nodes']}")
+    return True
+
+def test_engine_records_and_orders():
+    """测试 DecisionTreeEngine 到达解决方案时记录路径，并按显示的顺序解析选项编号"""
+    print("\n🧪 测试决策引擎统计...")
+
+    from decision_tree_engine import DecisionTreeEngine
+
+    config_file = os.path.join(tempfile.mkdtemp(), "decision_tree.yaml")
+    with open(config_file, 'w', encoding='utf-8') as f:
+        yaml.dump({"decision_tree": TREE}, f, allow_unicode=True)
+
+    stats = PathStats()
+    engine = DecisionTreeEngine(config_file, stats=stats)
+    state = engine.process_user_response("1")
+    state = engine.process_user_response("2", state)
+    if state.get("solution") != "更换网线" or stats.option_counts("network") != {"有线": 1}:
+        print(f"[ERROR] 未记录路径: {stats.option_counts('network')}")
+        return False
+
+    engine = DecisionTreeEngine(config_file, stats=stats, order_by_frequency=True)
+    state = engine.process_user_response("1")
+    if [option['text'] for option in state['options']] != ["有线", "WiFi"]:
+        print(f"[ERROR] 选项未按次数排序: {state['options']}")
+        return False
+    # 显示选项后其他会话改变了计数，编号仍按显示时的顺序解析
+    for _ in range(2):
+        stats.record_session(WIFI_PATH, "wifi_fix")
+    state = engine.process_user_response("1", state)
+    if state.get("solution") != "更换网线":
+        print(f"[ERROR] 选项编号应按排序后的顺序解析: {state}")
+        return False
+
+    print("[OK] 引擎记录路径并按次数排序选项")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试路径使用统计...")
+
+    results = [
+        test_counts_persisted(),
+        test_report(),
+        test_engine_records_and_orders(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
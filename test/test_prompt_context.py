@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from prompt_context import PromptBuilder, estimate_tokens, extract_neighbourhood, validation_context
+from ai_chat_parser import AIChatParser
+
+PROMPT = {"system": "检查决策树", "user": "决策树结构：\n{tree_structure}"}
+
+def build_tree(branch_count):
+    """根节点下 branch_count 个分支，最后挂一条新路径"""
+    nodes = {"start": {"question": "您遇到了什么问题？", "options": []}}
+    for i in range(branch_count):
+        nodes["start"]["options"].append({"text": f"问题{i}", "next_node": f"q{i}"})
+        nodes[f"q{i}"] = {"question": f"问题{i}的具体表现？", "options": [
+            {"text": "是", "next_node": f"s{i}"}
+        ]}
+        nodes[f"s{i}"] = {"solution": f"问题{i}的解决方案"}
+    nodes["start"]["options"].append({"text": "无法打印", "next_node": "printer"})
+    nodes["printer"] = {"question": "打印机是否亮灯？", "options": [
+        {"text": "不亮", "next_node": "printer_power"}
+    ]}
+    nodes["printer_power"] = {"solution": "检查打印机电源"}
+    return {"root_node": "start", "nodes": nodes}
+
+def test_neighbourhood():
+    """测试只提取变更节点附近的子树"""
+    print("🧪 测试变更邻域提取...")
+
+    sub_tree = extract_neighbourhood(build_tree(20), ["printer", "printer_power"])
+    nodes = sub_tree["nodes"]
+
+    # 新路径和挂接点完整，兄弟分支只保留摘要，无关的深层节点不出现
+    if "options" not in nodes["start"] or "options" not in nodes["printer"]:
+        print("[ERROR] 变更节点或挂接点不完整")
+        return False
+    if not nodes["q0"].get("summary_only") or "s0" in nodes:
+        print(f"[ERROR] 兄弟节点处理不正确: {sorted(nodes)}")
+        return False
+
+    context = validation_context(build_tree(20), {"nodes": {"printer_2": {"solution": "检查纸张"}}})
+    if set(context["nodes"]) != {"start"} | {f"q{i}" for i in range(20)} | {"printer"}:
+        print(f"[ERROR] 验证上下文不正确: {sorted(context['nodes'])}")
+        return False
+
+    print(f"[OK] 子树包含 {len(nodes)} 个节点（完整决策树 {len(build_tree(20)['nodes'])} 个）")
+    return True
+
+def test_chunking():
+    """测试超出上下文时按节点分块"""
+    print("\n🧪 测试提示词分块...")
+
+    tree = build_tree(40)
+    builder = PromptBuilder(context_window=2000, max_output_tokens=500)
+    groups = builder.build(PROMPT, "tree_structure", tree)
+
+    if len(groups) < 2:
+        print("[ERROR] 超出预算时应分块")
+        return False
+    seen = []
+    for messages in groups:
+        size = sum(estimate_tokens(message["content"]) for message in messages)
+        if size > builder.budget:
+            print(f"[ERROR] 分块超出预算: {size} > {builder.budget}")
+            return False
+        chunk = json.loads(messages[1]["content"].split("\n", 1)[1])
+        seen.extend(chunk["nodes"])
+    if sorted(seen) != sorted(tree["nodes"]):
+        print("[ERROR] 分块未完整覆盖全部节点")
+        return False
+    if "\n  " in groups[0][1]["content"]:
+        print("[ERROR] JSON 应紧凑输出")
+        return False
+
+    print(f"[OK] {len(tree['nodes'])} 个节点分为 {len(groups)} 块")
+    return True
+
+def test_check_errors_scales_with_change():
+    """测试错误检查的提示词大小与决策树大小无关"""
+    print("\n🧪 测试错误检查提示词大小...")
+
+    parser = AIChatParser.__new__(AIChatParser)
+    parser.ai_config = {"ai": {"current_api": "dashscope", "api": {"dashscope": {"max_tokens": 2000}}}}
+    parser.prompts = {"error_handling": PROMPT}
+    sizes = []
+
+    def call(messages, model=None, schema=None):
+        sizes.append(sum(len(message["content"]) for message in messages))
+        return '{"errors": [], "warnings": []}'
+
+    parser._call_ai_many = lambda groups, model=None: [call(messages, model) for messages in groups]
+    for branch_count in (10, 1000):
+        result = parser.check_errors(build_tree(branch_count), focus_nodes=["printer", "printer_power"])
+        if result != {"errors": [], "warnings": []}:
+            print(f"[ERROR] 结果不正确: {result}")
+            return False
+
+    # 兄弟节点摘要随根节点的分支数增长（超出上下文时分块），但远小于整棵树
+    full_size = len(json.dumps(build_tree(1000), ensure_ascii=False, indent=2))
+    large_size = sum(sizes[1:])
+    if large_size > full_size / 2:
+        print(f"[ERROR] 提示词过大: {large_size}（完整决策树 {full_size}）")
+        return False
+
+    print(f"[OK] 提示词字符数: {sizes[0]} / {large_size}（完整决策树 {full_size}，{len(sizes) - 1} 块）")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试提示词上下文构建...")
+
+    results = [
+        test_neighbourhood(),
+        test_chunking(),
+        test_check_errors_scales_with_change(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import time
+from prompt_templates import compile_prompt, load_prompts, prompt_versions
+
+PROMPTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "prompts.yaml")
+
+def test_render_matches_format():
+    """测试编译后的模板渲染结果与 str.format 一致"""
+    print("🧪 测试模板渲染...")
+
+    for name, prompt in load_prompts(PROMPTS_FILE).items():
+        template = compile_prompt(prompt)
+        fields = {field: f"<{field}>" for field in template.fields}
+        if template.render(**fields) != prompt['user'].format(**fields):
+            print(f"[ERROR] {name} 渲染结果不一致")
+            return False
+
+    template = compile_prompt({"system": "s", "user": "{value:>5}|{items[0]}"})
+    if template.render(value="a", items=["b"]) != "    a|b":
+        print("[ERROR] 带格式说明的占位符渲染不正确")
+        return False
+
+    print("[OK] 渲染结果与 str.format 一致")
+    return True
+
+def test_static_prefix():
+    """测试可变内容在模板末尾，不同调用的消息前缀逐字节相同"""
+    print("\n🧪 测试静态前缀...")
+
+    prompts = load_prompts(PROMPTS_FILE)
+    for name, prompt in prompts.items():
+        template = compile_prompt(prompt)
+        tail = template.user.rsplit("}", 1)[-1]
+        if tail.strip():
+            print(f"[ERROR] {name} 的可变内容之后还有固定文本: {tail.strip()}")
+            return False
+
+    template = compile_prompt(prompts['chat_analysis'])
+    first = template.messages(chat_history="用户: 无法上网")
+    second = template.messages(chat_history="用户: 打印机卡纸")
+    if first[0] != second[0] or not first[1]['content'].startswith(template.static_prefix) \
+            or not second[1]['content'].startswith(template.static_prefix):
+        print("[ERROR] 不同调用的前缀不一致")
+        return False
+    if "返回格式示例" not in template.static_prefix:
+        print("[ERROR] 返回格式示例应在静态前缀中")
+        return False
+
+    print(f"[OK] chat_analysis 的 user 消息前 {len(template.static_prefix)} 个字符固定")
+    return True
+
+def test_versions_and_cache():
+    """测试模板版本号和配置文件缓存"""
+    print("\n🧪 测试版本号和缓存...")
+
+    prompt = {"system": "你是助手", "user": "问题：{question}"}
+    if compile_prompt(prompt) is not compile_prompt(dict(prompt)):
+        print("[ERROR] 相同内容应只编译一次")
+        return False
+    if compile_prompt(prompt).version == compile_prompt({**prompt, "user": "问题: {question}"}).version:
+        print("[ERROR] 内容变化后版本号应变化")
+        return False
+
+    path = os.path.join(tempfile.mkdtemp(), "prompts.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("demo:\n  system: 你是助手\n  user: \"问题：{question}\"\n")
+    first = load_prompts(path)
+    if load_prompts(path) is not first:
+        print("[ERROR] 文件未修改时应返回缓存")
+        return False
+    time.sleep(0.01)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("demo:\n  system: 你是专家\n  user: \"问题：{question}\"\n")
+    if prompt_versions(load_prompts(path))['demo'] == prompt_versions(first)['demo']:
+        print("[ERROR] 文件修改后应重新加载")
+        return False
+
+    print(f"[OK] 版本号: {prompt_versions(first)}")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试提示词模板...")
+
+    results = [
+        test_render_matches_format(),
+        test_static_prefix(),
+        test_versions_and_cache(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
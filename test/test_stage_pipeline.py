@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from stage_pipeline import Stage, StageCancelled, StageError, StagePipeline, check_cancelled
+from ai_chat_parser import AIChatParser
+from ai_client import AIClient
+
+def sleeper(seconds, value):
+    def run(_):
+        time.sleep(seconds)
+        return value
+    return run
+
+def test_independent_stages_run_concurrently():
+    """测试互不依赖的阶段并发执行"""
+    print("🧪 测试阶段并发...")
+
+    pipeline = StagePipeline([
+        Stage('parse', sleeper(0.1, 'nodes')),
+        Stage('check', sleeper(0.3, 'ok'), deps=('parse',)),
+        Stage('confirm', sleeper(0.3, 'msg'), deps=('parse',)),
+    ])
+    started = time.monotonic()
+    results = pipeline.run()
+    elapsed = time.monotonic() - started
+
+    if results != {'parse': 'nodes', 'check': 'ok', 'confirm': 'msg'}:
+        print(f"[ERROR] 结果不正确: {results}")
+        return False
+    if elapsed > 0.6:
+        print(f"[ERROR] 阶段未并发执行，耗时 {elapsed:.2f} 秒")
+        return False
+
+    print(f"[OK] 耗时 {elapsed:.2f} 秒，各阶段: {pipeline.timings}")
+    return True
+
+def test_timeout_and_failure():
+    """测试可选阶段超时使用默认结果，必需阶段失败中止流水线"""
+    print("\n🧪 测试超时和失败...")
+
+    pipeline = StagePipeline([
+        Stage('parse', sleeper(0, 'nodes')),
+        Stage('check', sleeper(1, 'late'), deps=('parse',), timeout=0.1, required=False, fallback='default'),
+    ])
+    started = time.monotonic()
+    results = pipeline.run()
+    if results['check'] != 'default' or 'check' not in pipeline.failures or time.monotonic() - started > 0.5:
+        print(f"[ERROR] 超时阶段处理不正确: {results}")
+        return False
+
+    def fail(_):
+        raise StageError("解析聊天记录失败")
+
+    try:
+        StagePipeline([Stage('parse', fail), Stage('check', sleeper(0, 'ok'), deps=('parse',))]).run()
+        print("[ERROR] 必需阶段失败时应抛出 StageError")
+        return False
+    except StageError as e:
+        if str(e) != "解析聊天记录失败" or e.stage != 'parse':
+            print(f"[ERROR] 错误信息不正确: {e} ({e.stage})")
+            return False
+
+    try:
+        StagePipeline([Stage('a', fail, deps=('b',)), Stage('b', fail, deps=('a',))])
+        print("[ERROR] 依赖环未被检测")
+        return False
+    except ValueError:
+        pass
+
+    print("[OK] 超时使用默认结果，必需阶段失败中止，依赖环被拒绝")
+    return True
+
+def test_cancelled_stage_stops():
+    """测试超时或流水线中止后阶段收到取消标志，不再产生副作用，在途的AI请求被取消"""
+    print("\n🧪 测试阶段取消...")
+
+    side_effects = []
+    outcomes = {}
+    finished = threading.Event()
+
+    def slow_writer(_):
+        try:
+            time.sleep(0.3)
+            check_cancelled()
+            side_effects.append("写入")
+        except StageCancelled:
+            outcomes['writer'] = "cancelled"
+        finally:
+            finished.set()
+
+    pipeline = StagePipeline([Stage('write', slow_writer, timeout=0.1, required=False)])
+    pipeline.run()
+    if not finished.wait(1) or side_effects or outcomes.get('writer') != "cancelled":
+        print(f"[ERROR] 超时的阶段仍产生了副作用: {side_effects}")
+        return False
+
+    # 阶段中的同步AI调用：超时后取消在途请求
+    request_state = {}
+    request_done = threading.Event()
+
+    async def slow_create(**request):
+        try:
+            await asyncio.sleep(1)
+            request_state['completed'] = True
+        except asyncio.CancelledError:
+            request_state['cancelled'] = True
+            raise
+        finally:
+            request_done.set()
+
+    client = AIClient({"ai": {"current_api": "dashscope", "api": {"dashscope": {"model": "qwen-plus"}}}})
+    client.clients = {"dashscope": SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=slow_create)))}
+
+    def ask_ai(_):
+        try:
+            return client.call([{"role": "user", "content": "你好"}])
+        except StageCancelled:
+            outcomes['ai'] = "cancelled"
+            raise
+
+    started = time.monotonic()
+    StagePipeline([Stage('ask', ask_ai, timeout=0.1, required=False)]).run()
+    if not request_done.wait(1) or request_state != {'cancelled': True} or time.monotonic() - started > 0.5:
+        print(f"[ERROR] 超时后AI请求未取消: {request_state}")
+        return False
+
+    # 必需阶段失败中止流水线时，并发运行的其他阶段也被取消
+    finished.clear()
+    outcomes.clear()
+
+    def fail(_):
+        time.sleep(0.05)
+        raise StageError("解析聊天记录失败")
+
+    try:
+        StagePipeline([Stage('parse', fail), Stage('write', slow_writer)]).run()
+    except StageError:
+        pass
+    if not finished.wait(1) or side_effects or outcomes.get('writer') != "cancelled":
+        print(f"[ERROR] 流水线中止后其他阶段仍产生了副作用: {side_effects}")
+        return False
+
+    print("[OK] 超时和中止后阶段停止，在途AI请求被取消")
+    return True
+
+def test_parser_fan_out():
+    """测试 process_chat_and_generate_tree 并发执行错误检查和确认信息"""
+    print("\n🧪 测试聊天记录处理流水线...")
+
+    parser = AIChatParser.__new__(AIChatParser)
+    parser.ai_config = {
+        "ai": {"current_api": "dashscope", "api": {"dashscope": {"model": "qwen-plus", "cheap_model": "qwen-turbo"}}},
+        "pipeline": {"stages": {"check_errors": {"model": "cheap"}, "confirmation": {"timeout": 0.1}}}
+    }
+    models = {}
+    nodes = {"entry_node": "a", "nodes": {"a": {"solution": "重启路由器"}}}
+
+    def check_errors(tree, model=None, focus_nodes=None):
+        models['check_errors'] = model
+        time.sleep(0.3)
+        return {"errors": [], "warnings": []}
+
+    def confirmation(changes, model=None):
+        time.sleep(1)
+        return "迟到的确认信息"
+
+    parser.parse_chat_history = lambda chat: nodes
+    parser.check_errors = check_errors
+    parser.generate_confirmation_message = confirmation
+
+    result = parser.process_chat_and_generate_tree("用户: 无法上网")
+    if not result['success'] or result['new_nodes'] != nodes:
+        print(f"[ERROR] 处理失败: {result}")
+        return False
+    if models['check_errors'] != 'cheap' or AIClient(parser.ai_config).resolve_model('dashscope', 'cheap') != 'qwen-turbo':
+        print(f"[ERROR] 错误检查未使用轻量模型: {models}")
+        return False
+    if result['confirmation_message'] != "请确认以下变更...":
+        print(f"[ERROR] 确认信息超时后应使用默认信息: {result['confirmation_message']}")
+        return False
+    timings = result['stage_timings']
+
+    parser.parse_chat_history = lambda chat: None
+    result = parser.process_chat_and_generate_tree("用户: 无法上网")
+    if result != {"success": False, "error": "解析聊天记录失败"}:
+        print(f"[ERROR] 解析失败结果不正确: {result}")
+        return False
+
+    print(f"[OK] 各阶段耗时: {timings}")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试阶段流水线...")
+
+    results = [
+        test_independent_stages_run_concurrently(),
+        test_timeout_and_failure(),
+        test_cancelled_stage_stops(),
+        test_parser_fan_out(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
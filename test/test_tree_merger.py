@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+from tree_merger import PathTrie, TreeMerger, convert_path_to_nodes, normalize_text, remap_colliding_ids
+
+BASE_TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {
+            "question": "您遇到了什么类型的问题？",
+            "options": [
+                {"text": "请问是WiFi还是有线连接？", "next_node": "wifi_check"}
+            ]
+        },
+        "wifi_check": {
+            "question": "请问是WiFi还是有线连接？",
+            "options": [
+                {"text": "WiFi连接", "next_node": "router_check"}
+            ]
+        },
+        "router_check": {
+            "question": "请尝试重启路由器",
+            "options": [
+                {"text": "重启后还是不行", "next_node": "driver_fix"}
+            ]
+        },
+        "driver_fix": {
+            "solution": "请更新或重新安装网络适配器驱动"
+        }
+    }
+}
+
+def build_path(first_answer, second_question, second_answer, solution):
+    """构造一条AI生成的路径"""
+    return {
+        "entry_node": "step_entry",
+        "nodes": {
+            "step_entry": {
+                "question": "请问是WiFi还是有线连接？",
+                "options": [{"text": first_answer, "next_node": "step_1"}]
+            },
+            "step_1": {
+                "question": second_question,
+                "options": [{"text": second_answer, "next_node": "solution"}]
+            },
+            "solution": {
+                "solution": solution
+            }
+        }
+    }
+
+def test_normalize_text():
+    """测试文本规范化"""
+    print("🧪 测试文本规范化...")
+
+    test_cases = [
+        ("WiFi 连接", "wifi连接"),
+        ("ＷｉＦｉ连接！", "wifi连接"),
+        ("请问是WiFi还是有线连接？", "请问是wifi还是有线连接"),
+        ("", ""),
+    ]
+
+    passed = 0
+    for text, expected in test_cases:
+        result = normalize_text(text)
+        if result == expected:
+            print(f"[OK] '{text}' -> '{result}'")
+            passed += 1
+        else:
+            print(f"[ERROR] '{text}' -> '{result}' (期望: '{expected}')")
+
+    return passed == len(test_cases)
+
+def test_duplicate_path_is_reused():
+    """测试重复路径不会生成新分支"""
+    print("\n🧪 测试重复路径复用...")
+
+    tree = copy.deepcopy(BASE_TREE)
+    merger = TreeMerger(tree)
+    report = merger.merge(build_path("WiFi连接", "请尝试重启路由器", "重启后还是不行",
+                                     "请更新或重新安装网络适配器驱动。"))
+
+    if report['added_nodes'] or len(tree['nodes']) != 4:
+        print(f"[ERROR] 不应新增节点: {report['added_nodes']}")
+        return False
+    if len(tree['nodes']['start']['options']) != 1:
+        print("[ERROR] 根节点不应新增选项")
+        return False
+
+    print(f"[OK] 复用节点: {report['reused_nodes']}")
+    return True
+
+def test_new_branch_attaches_to_existing_node():
+    """测试新分支挂接到已有节点"""
+    print("\n🧪 测试新分支挂接...")
+
+    tree = copy.deepcopy(BASE_TREE)
+    merger = TreeMerger(tree)
+    report = merger.merge(build_path("有线连接", "请检查网线是否插好", "网线松了",
+                                     "请重新插好网线"))
+
+    wifi_options = [opt['text'] for opt in tree['nodes']['wifi_check']['options']]
+    if wifi_options != ["WiFi连接", "有线连接"]:
+        print(f"[ERROR] wifi_check 选项不正确: {wifi_options}")
+        return False
+    if len(report['added_nodes']) != 2:
+        print(f"[ERROR] 应新增2个节点: {report['added_nodes']}")
+        return False
+    if "solution" in tree['nodes'] and tree['nodes'].get("solution", {}).get("solution") != "请重新插好网线":
+        print("[ERROR] 节点被覆盖")
+        return False
+
+    print(f"[OK] 新增节点: {report['added_nodes']}")
+    return True
+
+def test_existing_ids_not_overwritten():
+    """测试相同ID的新节点不会覆盖已有节点"""
+    print("\n🧪 测试节点ID冲突...")
+
+    tree = copy.deepcopy(BASE_TREE)
+    tree['nodes']['step_1'] = {"solution": "已有的step_1节点"}
+    merger = TreeMerger(tree)
+    report = merger.merge(build_path("有线连接", "请检查网线是否插好", "网线松了",
+                                     "请重新插好网线"))
+
+    if tree['nodes']['step_1'].get('solution') != "已有的step_1节点":
+        print("[ERROR] 已有节点被覆盖")
+        return False
+    if 'step_1' not in report['renamed_nodes']:
+        print("[ERROR] 冲突节点没有重命名")
+        return False
+
+    print(f"[OK] 重命名节点: {report['renamed_nodes']}")
+    return True
+
+def test_content_hashed_ids():
+    """测试内容哈希节点ID：按前缀路径生成，重复的问题不合并，没有解决方案的路径不转换"""
+    print("\n🧪 测试内容哈希节点ID...")
+
+    path_data = {
+        "problem": "电脑无法连接网络",
+        "steps": [
+            {"step": 1, "question": "请问是WiFi还是有线连接？", "answer": "WiFi连接"},
+            {"step": 2, "question": "请尝试重启路由器", "answer": "重启后还是不行"}
+        ],
+        "solution": "请更新或重新安装网络适配器驱动"
+    }
+    other_path = {
+        "problem": "打印机无法打印",
+        "steps": [
+            {"step": 1, "question": "打印机是否显示错误？", "answer": "显示卡纸"}
+        ],
+        "solution": "请取出卡住的纸张"
+    }
+
+    first = convert_path_to_nodes(path_data)
+    second = convert_path_to_nodes(path_data)
+    other = convert_path_to_nodes(other_path)
+
+    if first != second:
+        print("[ERROR] 相同路径生成的ID不一致")
+        return False
+    if set(first['nodes']) & set(other['nodes']):
+        print("[ERROR] 不同路径的节点ID冲突")
+        return False
+    if len(first['nodes']) != 3:
+        print(f"[ERROR] 节点数量应为3: {list(first['nodes'])}")
+        return False
+
+    # 同一个问题在路径中出现两次时是两个节点，不形成环
+    repeated = convert_path_to_nodes({
+        "problem": "打印机无法打印",
+        "steps": [
+            {"question": "打印机是否显示错误？", "answer": "没有错误"},
+            {"question": "打印机指示灯亮吗？", "answer": "不亮"},
+            {"question": "请重新插拔电源线", "answer": "已插拔"},
+            {"question": "打印机指示灯亮吗？", "answer": "亮了"}
+        ],
+        "solution": "电源线接触不良，插紧即可"
+    })
+    chain, node_id = [], repeated['entry_node']
+    while node_id in repeated['nodes'] and node_id not in chain:
+        chain.append(node_id)
+        node_id = repeated['nodes'][node_id].get('options', [{}])[0].get('next_node')
+    if len(repeated['nodes']) != 5 or len(chain) != 5 or 'solution' not in repeated['nodes'][chain[-1]]:
+        print(f"[ERROR] 重复的问题应生成不同节点: {repeated}")
+        return False
+
+    # 没有解决方案的路径无法终结
+    if convert_path_to_nodes({**path_data, "solution": ""}) is not None:
+        print("[ERROR] 没有解决方案的路径不应转换")
+        return False
+
+    namespaced = convert_path_to_nodes(path_data, namespace="run1")
+    if not namespaced['entry_node'].startswith("run1_"):
+        print("[ERROR] namespace 未生效")
+        return False
+
+    print(f"[OK] 入口节点: {first['entry_node']}")
+    return True
+
+def test_remap_colliding_ids():
+    """测试批量重映射冲突ID"""
+    print("\n🧪 测试批量重映射冲突ID...")
+
+    existing = {"solution": {"solution": "旧的解决方案"}, "step_1": {"question": "旧问题"}}
+    new_nodes = {
+        "entry_node": "step_1",
+        "nodes": {
+            "step_1": {"question": "新问题", "options": [{"text": "是", "next_node": "solution"}]},
+            "solution": {"solution": "新的解决方案"}
+        }
+    }
+
+    remapped, mapping = remap_colliding_ids(new_nodes, existing)
+    expected = {"step_1": "step_1_2", "solution": "solution_2"}
+    if mapping != expected:
+        print(f"[ERROR] 映射不正确: {mapping}")
+        return False
+    if remapped['entry_node'] != "step_1_2":
+        print("[ERROR] entry_node 未重映射")
+        return False
+    if remapped['nodes']['step_1_2']['options'][0]['next_node'] != "solution_2":
+        print("[ERROR] 选项引用未重映射")
+        return False
+
+    print(f"[OK] 映射: {mapping}")
+    return True
+
+def test_merge_paths_shares_prefix():
+    """测试批量合并时共享前缀折叠为同一分支"""
+    print("\n🧪 测试批量前缀树合并...")
+
+    tree = {"root_node": "start", "nodes": {"start": {"question": "问题类型？", "options": []}}}
+    paths = [
+        {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "WiFi"},
+                                     {"question": "重启路由器后呢？", "answer": "还是不行"}],
+         "solution": "更新网卡驱动"},
+        {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "wifi"},
+                                     {"question": "重启路由器后呢？", "answer": "恢复正常"}],
+         "solution": "路由器故障，重启即可"},
+        {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "有线"}],
+         "solution": "检查网线"},
+    ]
+
+    report = TreeMerger(tree).merge_paths(paths)
+
+    if len(tree['nodes']['start']['options']) != 1:
+        print("[ERROR] 共享前缀的路径应只挂接一个入口")
+        return False
+    entry = tree['nodes'][report['entry_nodes'][0]]
+    if [opt['text'] for opt in entry['options']] != ["WiFi", "有线"]:
+        print(f"[ERROR] 入口选项不正确: {entry['options']}")
+        return False
+    if len(report['added_nodes']) != 5:
+        print(f"[ERROR] 应新增5个节点: {report['added_nodes']}")
+        return False
+
+    # 再次合并同一批路径不应新增节点
+    second = TreeMerger(tree).merge_paths(paths)
+    if second['added_nodes']:
+        print(f"[ERROR] 重复合并新增了节点: {second['added_nodes']}")
+        return False
+
+    print(f"[OK] 合并 {report['path_count']} 条路径，新增 {len(report['added_nodes'])} 个节点")
+    return True
+
+def test_conflicting_path_not_counted():
+    """测试与已有分支冲突的路径被拒绝，且不计入路径数和回答次数"""
+    print("\n🧪 测试冲突路径不计数...")
+
+    trie = PathTrie()
+    wifi = {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "WiFi"}],
+            "solution": "重启路由器"}
+    wired = {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "有线"},
+                                         {"question": "网线插好了吗？", "answer": "插好了"}],
+             "solution": "更换网线"}
+    # 已有解决方案的回答后面还有问题 / 同一个回答后面接了不同的问题
+    conflicting = [
+        {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "WiFi"},
+                                     {"question": "路由器指示灯亮吗？", "answer": "不亮"}],
+         "solution": "检查电源"},
+        {"problem": "网络", "steps": [{"question": "WiFi还是有线？", "answer": "有线"},
+                                     {"question": "网口指示灯亮吗？", "answer": "不亮"}],
+         "solution": "检查网口"},
+    ]
+    trie.insert(wifi)
+    trie.insert(wired)
+    results = [trie.insert(path_data) for path_data in conflicting]
+    if results != [False, False] or len(trie.conflicts) != 2:
+        print(f"[ERROR] 冲突路径应被拒绝: {results} {trie.conflicts}")
+        return False
+    answers = trie.roots[normalize_text("WiFi还是有线？")]['answers']
+    if any(edge['count'] != 1 for edge in answers.values()):
+        print(f"[ERROR] 被拒绝的路径不应计数: {[edge['count'] for edge in answers.values()]}")
+        return False
+    edge = answers[normalize_text("有线")]
+    if trie.path_count != 2 or list(edge['next']) != [normalize_text("网线插好了吗？")]:
+        print(f"[ERROR] 被拒绝的路径不应计数: path_count={trie.path_count}")
+        return False
+
+    print(f"[OK] 拒绝 {len(trie.conflicts)} 条冲突路径，计数不变")
+    return True
+
+def find_cycle(tree):
+    """返回决策树中的一个环路（节点列表），没有环路时返回 None"""
+    state, stack = {}, []
+
+    def visit(node_id):
+        state[node_id] = 1
+        stack.append(node_id)
+        for option in tree['nodes'].get(node_id, {}).get('options', []):
+            next_node = option.get('next_node')
+            if state.get(next_node) == 1:
+                return stack[stack.index(next_node):] + [next_node]
+            if next_node in tree['nodes'] and next_node not in state:
+                cycle = visit(next_node)
+                if cycle:
+                    return cycle
+        stack.pop()
+        state[node_id] = 2
+        return None
+
+    for node_id in tree['nodes']:
+        if node_id not in state:
+            cycle = visit(node_id)
+            if cycle:
+                return cycle
+    return None
+
+def test_merge_does_not_create_cycle():
+    """测试复用相似节点时不会连回当前路径的上游，合并后没有环路"""
+    print("\n🧪 测试合并不产生环路...")
+
+    tree = {"root_node": "start", "nodes": {
+        "start": {"question": "问题类型？", "options": [{"text": "网络", "next_node": "net"}]},
+        "net": {"question": "是WiFi还是有线连接？", "options": [{"text": "WiFi", "next_node": "wifi"}]},
+        "wifi": {"question": "路由器指示灯是否正常？", "options": [{"text": "正常", "next_node": "wifi_fix"}]},
+        "wifi_fix": {"solution": "重启路由器"},
+    }}
+    path_data = {"problem": "网络", "steps": [
+        {"question": "路由器指示灯是否正常？", "answer": "不亮"},
+        {"question": "是WiFi还是有线连接？", "answer": "有线"},
+    ], "solution": "检查路由器电源"}
+    for merge in (lambda merger: merger.merge(convert_path_to_nodes(path_data)),
+                  lambda merger: merger.merge_paths([path_data])):
+        merged = copy.deepcopy(tree)
+        report = merge(TreeMerger(merged))
+        cycle = find_cycle(merged)
+        if cycle:
+            print(f"[ERROR] 合并后出现环路: {' → '.join(cycle)}")
+            return False
+        if not report['added_nodes']:
+            print(f"[ERROR] 路径未合并: {report}")
+            return False
+
+    print(f"[OK] 合并后没有环路，新增 {len(report['added_nodes'])} 个节点")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试决策树合并器...")
+
+    results = [
+        test_normalize_text(),
+        test_duplicate_path_is_reused(),
+        test_new_branch_attaches_to_existing_node(),
+        test_existing_ids_not_overwritten(),
+        test_content_hashed_ids(),
+        test_remap_colliding_ids(),
+        test_merge_paths_shares_prefix(),
+        test_conflicting_path_not_counted(),
+        test_merge_does_not_create_cycle(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import api_server
+from tree_layout import tree_revision
+
+def with_temp_config(fn):
+    """在临时配置文件上运行，避免修改真实的决策树"""
+    original = api_server.api.config_file
+    temp_dir = tempfile.mkdtemp()
+    temp_file = os.path.join(temp_dir, 'decision_tree.yaml')
+    shutil.copy(original, temp_file)
+    api_server.api.config_file = temp_file
+    try:
+        return fn(api_server.app.test_client())
+    finally:
+        api_server.api.config_file = original
+        shutil.rmtree(temp_dir)
+
+def test_apply_patch():
+    """测试按操作列表修改决策树"""
+    print("🧪 测试应用增量操作...")
+
+    tree = {
+        "root_node": "start",
+        "nodes": {
+            "start": {"question": "问题？", "options": [{"text": "是", "next_node": "old"}]},
+            "old": {"solution": "旧方案"}
+        }
+    }
+    patched = api_server.api.apply_patch(tree, [
+        {"op": "delete", "node_id": "old"},
+        {"op": "set", "node_id": "new", "value": {"solution": "新方案"}},
+        {"op": "set", "node_id": "start",
+         "value": {"question": "问题？", "options": [{"text": "是", "next_node": "new"}]}},
+    ])
+
+    if "old" not in tree['nodes']:
+        print("[ERROR] 原决策树被修改")
+        return False
+    if set(patched['nodes']) != {"start", "new"} or api_server.api.validate_tree(patched):
+        print(f"[ERROR] 修改结果不正确: {patched}")
+        return False
+
+    print(f"[OK] 修改后节点: {sorted(patched['nodes'])}")
+    return True
+
+def test_patch_endpoint():
+    """测试增量保存接口、版本冲突检测和请求格式校验"""
+    print("\n🧪 测试增量保存接口...")
+
+    def run(client):
+        tree = client.get('/api/tree').get_json()
+        revision = tree['revision']
+        if set(tree.get('positions', {})) != set(tree['nodes']):
+            print("[ERROR] /api/tree 应返回每个节点的 positions")
+            return False
+        node_id = next(iter(tree['nodes']))
+        value = {**tree['nodes'][node_id], "question": "修改后的问题"}
+
+        response = client.post('/api/tree/patch', json={
+            "base_revision": revision,
+            "ops": [{"op": "set", "node_id": node_id, "value": value}]
+        })
+        if response.status_code != 200:
+            print(f"[ERROR] 保存失败: {response.get_json()}")
+            return False
+        new_revision = response.get_json()['revision']
+        if new_revision != tree_revision(api_server.api.load_tree()):
+            print("[ERROR] 返回的版本号与保存结果不一致")
+            return False
+
+        # 基于旧版本的修改应被拒绝
+        stale = client.post('/api/tree/patch', json={"base_revision": revision, "ops": []})
+        if stale.status_code != 409:
+            print(f"[ERROR] 旧版本应返回409: {stale.status_code}")
+            return False
+
+        # 未指明基于的版本、操作格式不正确时返回400
+        missing = client.post('/api/tree/patch', json={"ops": [{"op": "delete", "node_id": node_id}]})
+        if missing.status_code != 400 or node_id not in api_server.api.load_tree()['nodes']:
+            print(f"[ERROR] 缺少 base_revision 应返回400: {missing.status_code}")
+            return False
+        for ops in (["delete"], [{"op": "set", "node_id": node_id}], {"op": "delete"}):
+            malformed = client.post('/api/tree/patch', json={"base_revision": new_revision, "ops": ops})
+            if malformed.status_code != 400:
+                print(f"[ERROR] 格式错误的操作 {ops} 应返回400: {malformed.status_code}")
+                return False
+
+        # 产生悬空引用的修改应被拒绝
+        invalid = client.post('/api/tree/patch', json={
+            "base_revision": new_revision,
+            "ops": [{"op": "set", "node_id": node_id,
+                     "value": {"question": "?", "options": [{"text": "x", "next_node": "missing"}]}}]
+        })
+        if invalid.status_code != 400:
+            print(f"[ERROR] 无效修改应返回400: {invalid.status_code}")
+            return False
+
+        print(f"[OK] 版本 {revision} -> {new_revision}")
+        return True
+
+    return with_temp_config(run)
+
+def main():
+    """主函数"""
+    print("开始测试决策树增量保存...")
+
+    results = [
+        test_apply_patch(),
+        test_patch_endpoint(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
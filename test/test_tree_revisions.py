@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+from tree_revisions import TreeRevisionLog
+
+BASE_TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {"question": "问题类型？", "options": [
+            {"text": "网络", "next_node": "network"},
+            {"text": "打印机", "next_node": "printer"}
+        ]},
+        "network": {"solution": "重启路由器"},
+        "printer": {"solution": "检查纸张"}
+    }
+}
+
+def test_delta_between_revisions():
+    """测试两个版本之间的增量"""
+    print("🧪 测试版本增量...")
+
+    log = TreeRevisionLog()
+    base = log.record(BASE_TREE)
+
+    tree = copy.deepcopy(BASE_TREE)
+    tree['nodes']['network'] = {"solution": "更新网卡驱动"}
+    del tree['nodes']['printer']
+    tree['nodes']['start']['options'].pop()
+    tree['nodes']['disk'] = {"solution": "清理磁盘"}
+
+    delta = log.delta(tree, base)
+    if set(delta['changed']) != {"start", "network", "disk"}:
+        print(f"[ERROR] 变化节点不正确: {sorted(delta['changed'])}")
+        return False
+    if delta['removed'] != ["printer"]:
+        print(f"[ERROR] 删除节点不正确: {delta['removed']}")
+        return False
+
+    # 基础版本加上增量应得到当前决策树
+    nodes = {**BASE_TREE['nodes'], **delta['changed']}
+    for node_id in delta['removed']:
+        del nodes[node_id]
+    if nodes != tree['nodes']:
+        print("[ERROR] 应用增量后与当前决策树不一致")
+        return False
+
+    same = log.delta(tree, delta['revision'])
+    if same['changed'] or same['removed']:
+        print("[ERROR] 同一版本的增量应为空")
+        return False
+
+    print(f"[OK] {base} -> {delta['revision']}: 变化 {len(delta['changed'])}, 删除 {len(delta['removed'])}")
+    return True
+
+def test_unknown_revision():
+    """测试未记录或已淘汰的版本"""
+    print("\n🧪 测试未知版本...")
+
+    log = TreeRevisionLog(max_revisions=2)
+    first = log.record(BASE_TREE)
+    for i in range(2):
+        tree = copy.deepcopy(BASE_TREE)
+        tree['nodes']['network'] = {"solution": f"方案{i}"}
+        log.record(tree)
+
+    if log.delta(BASE_TREE, "unknown") is not None:
+        print("[ERROR] 未知版本应返回 None")
+        return False
+    if log.delta(tree, first) is not None:
+        print("[ERROR] 已淘汰的版本应返回 None")
+        return False
+
+    print("[OK] 未知版本需要完整加载")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试决策树版本增量...")
+
+    results = [
+        test_delta_between_revisions(),
+        test_unknown_revision(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
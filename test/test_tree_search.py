@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from tree_search import TreeSearchIndex, tokenize
+
+TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {"question": "您遇到了什么类型的问题？", "options": [
+            {"text": "网络问题", "next_node": "network_issue"},
+            {"text": "打印机问题", "next_node": "printer_issue"}
+        ]},
+        "network_issue": {"question": "请问是WiFi还是有线连接？", "options": [
+            {"text": "WiFi连接", "next_node": "router_restart"}
+        ]},
+        "printer_issue": {"solution": "请检查打印机是否缺纸"},
+        "router_restart": {"solution": "请尝试重启路由器"}
+    }
+}
+
+def test_tokenize():
+    """测试中英文混合分词"""
+    print("🧪 测试分词...")
+
+    tokens = tokenize("重启路由器 Wi-Fi")
+    expected = ["wi", "fi", "重启", "启路", "路由", "由器"]
+    if tokens != expected:
+        print(f"[ERROR] 分词结果: {tokens} (期望: {expected})")
+        return False
+
+    print(f"[OK] {tokens}")
+    return True
+
+def test_search_ranking():
+    """测试搜索命中与排序"""
+    print("\n🧪 测试搜索排序...")
+
+    index = TreeSearchIndex()
+    index.build(TREE, "r1")
+
+    # 同一节点多个字段命中时返回权重最高的字段
+    results = index.search("wifi")
+    ids = [r['node_id'] for r in results]
+    if ids != ["network_issue"]:
+        print(f"[ERROR] wifi 命中: {ids}")
+        return False
+    if results[0]['field'] != "question":
+        print(f"[ERROR] 命中字段应为 question: {results[0]}")
+        return False
+
+    # 多个词需全部命中
+    if [r['node_id'] for r in index.search("路由器 重启")] != ["router_restart"]:
+        print("[ERROR] 多词查询结果不正确")
+        return False
+    if index.search("路由器 打印"):
+        print("[ERROR] 不应返回只命中部分词的节点")
+        return False
+
+    print(f"[OK] wifi -> {ids}")
+    return True
+
+def test_prefix_matching():
+    """测试前缀匹配（输入过程中的搜索）"""
+    print("\n🧪 测试前缀匹配...")
+
+    index = TreeSearchIndex()
+    index.build(TREE, "r1")
+
+    cases = [
+        ("netw", "network_issue"),
+        ("print", "printer_issue"),
+        ("打", "printer_issue"),
+    ]
+    for query, expected in cases:
+        ids = [r['node_id'] for r in index.search(query)]
+        if expected not in ids:
+            print(f"[ERROR] '{query}' 未命中 {expected}: {ids}")
+            return False
+        print(f"[OK] '{query}' -> {ids}")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试节点搜索索引...")
+
+    results = [
+        test_tokenize(),
+        test_search_ranking(),
+        test_prefix_matching(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from tree_visualizer import TreeVisualizer
+
+ORIGINAL_TREE = {
+    "root_node": "start",
+    "nodes": {
+        "start": {"question": "您遇到了什么类型的问题？", "options": [
+            {"text": "网络问题", "next_node": "network_issue"}
+        ]},
+        "network_issue": {"question": "网络问题具体是什么？", "options": [
+            {"text": "无法连接", "next_node": "no_connection"}
+        ]}
+    }
+}
+
+NEW_NODES = {
+    "nodes": {
+        "no_connection": {"solution": "请检查网线，页面中不应出现 </script> 截断"}
+    }
+}
+
+def test_single_file_html():
+    """测试单文件HTML生成（无CDN依赖，数据安全内嵌）"""
+    print("🧪 测试单文件HTML...")
+
+    visualizer = TreeVisualizer()
+    data = visualizer.generate_visualization_data(ORIGINAL_TREE, NEW_NODES)
+    html = visualizer.generate_html_visualization(data)
+
+    if "https://" in html.replace("http://www.w3.org/2000/svg", ""):
+        print("[ERROR] 页面引用了外部资源")
+        return False
+    if "</script> 截断" in html or "<\\/script> 截断" not in html:
+        print("[ERROR] 数据中的 </script> 未转义")
+        return False
+    if "__DATA_SCRIPTS__" in html:
+        print("[ERROR] 占位符未替换")
+        return False
+
+    print(f"[OK] 页面大小 {len(html)} 字节")
+    return True
+
+def test_chunks_cover_all_nodes():
+    """测试数据分块覆盖全部节点且按层级顺序"""
+    print("\n🧪 测试数据分块...")
+
+    visualizer = TreeVisualizer()
+    data = visualizer.generate_visualization_data(ORIGINAL_TREE, NEW_NODES)
+    chunks = visualizer.split_visualization_data(data, chunk_size=1)
+
+    if "layout" not in chunks[0]:
+        print("[ERROR] 第一块应包含布局")
+        return False
+    order = [node_id for chunk in chunks[1:] for node_id in chunk['nodes']]
+    if order != ["start", "network_issue", "no_connection"]:
+        print(f"[ERROR] 分块顺序不正确: {order}")
+        return False
+    relations = sum(len(chunk.get('relations', [])) for chunk in chunks)
+    if relations != len(data['relations']):
+        print("[ERROR] 关系数量不一致")
+        return False
+
+    print(f"[OK] {len(chunks) - 1} 个数据块: {order}")
+    return True
+
+def test_export_bundle():
+    """测试导出离线目录"""
+    print("\n🧪 测试导出离线目录...")
+
+    visualizer = TreeVisualizer()
+    data = visualizer.generate_visualization_data(ORIGINAL_TREE, NEW_NODES)
+    output_dir = tempfile.mkdtemp()
+    try:
+        index_file = visualizer.save_visualization(data, output_dir, bundle=True)
+        chunk_files = sorted(os.listdir(os.path.join(output_dir, "data")))
+        with open(index_file, encoding='utf-8') as f:
+            html = f.read()
+        if not chunk_files or any(name not in html for name in chunk_files):
+            print(f"[ERROR] 页面未引用全部数据块: {chunk_files}")
+            return False
+        print(f"[OK] 数据块: {chunk_files}")
+        return True
+    finally:
+        shutil.rmtree(output_dir)
+
+def test_model_update_node():
+    """测试可视化模型按节点增量更新"""
+    print("\n🧪 测试可视化模型增量更新...")
+
+    visualizer = TreeVisualizer()
+    model = visualizer.create_model(ORIGINAL_TREE, NEW_NODES)
+    full = model.data()
+
+    # 只改文本：不重新布局，原始决策树不被修改
+    delta = model.update_node("network_issue", {"question": "网络问题是什么？", "options": [
+        {"text": "无法连接", "next_node": "no_connection"}
+    ]})
+    if delta["layout"] is not None or delta["node"]["status"] != "modified":
+        print(f"[ERROR] 文本修改的增量不正确: {delta}")
+        return False
+    if ORIGINAL_TREE["nodes"]["network_issue"]["question"] != "网络问题具体是什么？":
+        print("[ERROR] 原始决策树被修改")
+        return False
+
+    # 改子节点：重新布局，出边被替换
+    delta = model.update_node("network_issue", {"question": "网络问题是什么？", "options": []})
+    if delta["layout"] is None or delta["relations"]:
+        print(f"[ERROR] 子节点修改的增量不正确: {delta}")
+        return False
+    data = model.data()
+    if data is full or len(data["relations"]) != len(full["relations"]) - 1:
+        print("[ERROR] 完整数据未反映修改")
+        return False
+
+    print("[OK] 文本修改不重新布局，子节点修改返回新布局")
+    return True
+
+def test_model_diff_view():
+    """测试只显示变更的视图"""
+    print("\n🧪 测试变更视图...")
+
+    visualizer = TreeVisualizer()
+    view = visualizer.create_model(ORIGINAL_TREE, NEW_NODES).diff_view()
+
+    nodes = sorted(view["nodes"])
+    if nodes != ["network_issue", "no_connection"]:
+        print(f"[ERROR] 变更视图节点不正确: {nodes}")
+        return False
+    if set(view["layout"]["positions"]) != set(nodes) or len(view["relations"]) != 1:
+        print("[ERROR] 变更视图的布局或关系不正确")
+        return False
+
+    print(f"[OK] 变更视图: {nodes}（父节点作为上下文）")
+    return True
+
+def main():
+    """主函数"""
+    print("开始测试决策树可视化导出...")
+
+    results = [
+        test_single_file_html(),
+        test_chunks_cover_all_nodes(),
+        test_export_bundle(),
+        test_model_update_node(),
+        test_model_diff_view(),
+    ]
+
+    print(f"\n 测试结果: {sum(results)}/{len(results)} 通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def tree_revision(tree: Dict) -> str:
+    """决策树快照的版本号（内容哈希）"""
+    canonical = json.dumps(tree, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def build_children_index(tree: Dict) -> Dict[str, List[str]]:
+    """节点 -> 子节点列表（只保留指向存在节点的选项）"""
+    nodes = tree.get('nodes', {})
+    children = {}
+    for node_id, node_data in nodes.items():
+        node_children = []
+        for option in (node_data or {}).get('options', []) or []:
+            next_node = option.get('next_node')
+            if next_node and next_node in nodes:
+                node_children.append(next_node)
+        children[node_id] = node_children
+    return children
+
+
+def build_spanning_forest(tree: Dict) -> Tuple[List[str], Dict[str, List[str]], Dict[str, int]]:
+    """广度优先构建生成森林，多父节点的节点归属层级最浅的父节点
+
+    返回 (根节点列表, 生成树子节点表, 节点深度)。只能从环中到达的节点单独作为根。
+    """
+    children = build_children_index(tree)
+    has_parent = {child for node_children in children.values() for child in node_children}
+
+    roots = [node_id for node_id in children if node_id not in has_parent]
+    root_node = tree.get('root_node')
+    if root_node in roots and roots[0] != root_node:
+        roots.remove(root_node)
+        roots.insert(0, root_node)
+
+    tree_children = {}
+    depths = {}
+    placed_roots = []
+
+    def grow_from(root_id):
+        placed_roots.append(root_id)
+        depths[root_id] = 0
+        queue = [root_id]
+        head = 0
+        while head < len(queue):
+            node_id = queue[head]
+            head += 1
+            tree_children[node_id] = []
+            for child_id in children[node_id]:
+                if child_id in depths:
+                    continue
+                depths[child_id] = depths[node_id] + 1
+                tree_children[node_id].append(child_id)
+                queue.append(child_id)
+
+    for root_id in roots:
+        grow_from(root_id)
+    for node_id in children:
+        if node_id not in depths:
+            grow_from(node_id)
+
+    return placed_roots, tree_children, depths
+
+
+def slice_tree(tree: Dict, max_depth: int, start_node: str = None) -> Dict:
+    """按层级截取决策树，用于按需加载
+
+    不指定 start_node 时从根节点开始，返回层级不超过 max_depth 的节点；指定时返回
+    start_node 之下 1..max_depth 层的后代。truncated 为子节点未包含在结果中的节点。
+    """
+    nodes = tree.get('nodes', {})
+    children = build_children_index(tree)
+
+    if start_node is None:
+        _, _, depths = build_spanning_forest(tree)
+        included = [node_id for node_id in nodes if depths.get(node_id, 0) <= max_depth]
+    else:
+        depths = {start_node: 0}
+        queue = [start_node]
+        head = 0
+        while head < len(queue):
+            node_id = queue[head]
+            head += 1
+            if depths[node_id] >= max_depth:
+                continue
+            for child_id in children.get(node_id, []):
+                if child_id not in depths:
+                    depths[child_id] = depths[node_id] + 1
+                    queue.append(child_id)
+        included = queue[1:]
+
+    included_set = set(included)
+    truncated = [
+        node_id for node_id in included
+        if any(child_id not in included_set and child_id != start_node for child_id in children[node_id])
+    ]
+
+    return {
+        "nodes": {node_id: nodes[node_id] for node_id in included},
+        "truncated": truncated
+    }
+
+
+# 轮廓为从子树根向下的不可变链表 (本层相对上一层的水平差, 下一层)，第一层为相对子树根的位置。
+# 整体平移只需替换第一个单元，拼接时共享另一轮廓的剩余部分，缓存的子树轮廓不会被修改。
+Contour = Optional[Tuple[float, 'Contour']]
+
+
+def _contour_values(contour: Contour, count: int):
+    """依次返回轮廓前 count 层的位置"""
+    x = 0.0
+    for _ in range(count):
+        delta, contour = contour
+        x += delta
+        yield x
+
+
+def _shift_contour(contour: Contour, shift: float) -> Contour:
+    delta, rest = contour
+    return (delta + shift, rest)
+
+
+def _splice_contour(front: Contour, count: int, back: Contour) -> Contour:
+    """前 count 层取 front，更深的层共享 back（back 的层数多于 count）"""
+    xs = list(_contour_values(front, count))
+    x = 0.0
+    for _ in range(count):
+        delta, back = back
+        x += delta
+    delta, rest = back
+    tail = (x + delta - xs[-1], rest)
+    for i in range(count - 1, 0, -1):
+        tail = (xs[i] - xs[i - 1], tail)
+    return (xs[0], tail)
+
+
+class _SubtreeLayout:
+    """子树的相对布局：子节点相对本节点的偏移，以及左右轮廓和层数"""
+
+    __slots__ = ('key', 'offsets', 'left', 'right', 'height')
+
+    def __init__(self, key: Tuple, offsets: List[float], left: Contour, right: Contour, height: int):
+        self.key = key
+        self.offsets = offsets
+        self.left = left
+        self.right = right
+        self.height = height
+
+
+class TreeLayoutService:
+    """决策树布局服务
+
+    使用 Reingold-Tilford 轮廓算法计算整洁树布局，坐标单位为节点间距：
+    x 为水平位置（第一个根节点为0），depth 为层级。每个子树的相对布局按
+    生成树子节点列表缓存，树变化时只重新计算发生变化的子树及其祖先；
+    完整结果按树版本缓存。
+    """
+
+    # 虚拟根节点，用于排列森林中的多个根
+    _FOREST = None
+
+    def __init__(self, distance: float = 1.0, max_snapshots: int = 8):
+        self.distance = distance
+        self.max_snapshots = max_snapshots
+        self._subtrees = {}
+        self._snapshots = OrderedDict()
+        self.last_recomputed = 0
+
+    def layout(self, tree: Dict) -> Dict:
+        """返回 {"revision", "positions": {node_id: {"x", "depth"}}}"""
+        revision = tree_revision(tree)
+        cached = self._snapshots.get(revision)
+        if cached is not None:
+            self._snapshots.move_to_end(revision)
+            self.last_recomputed = 0
+            return cached
+
+        roots, tree_children, depths = build_spanning_forest(tree)
+        self.last_recomputed = self._update_subtrees(roots, tree_children)
+
+        result = {
+            "revision": revision,
+            "positions": self._absolute_positions(roots, tree_children, depths)
+        }
+        self._snapshots[revision] = result
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        return result
+
+    def _update_subtrees(self, roots: List[str], tree_children: Dict[str, List[str]]) -> int:
+        """后序遍历，重新计算子节点列表变化或含有变化后代的子树，返回重新计算的数量"""
+        children_of = dict(tree_children)
+        children_of[self._FOREST] = roots
+
+        dirty = set()
+        recomputed = 0
+        stack = [(self._FOREST, False)]
+        while stack:
+            node_id, expanded = stack.pop()
+            node_children = children_of[node_id]
+            if not expanded:
+                stack.append((node_id, True))
+                for child_id in node_children:
+                    stack.append((child_id, False))
+                continue
+
+            key = tuple(node_children)
+            cached = self._subtrees.get(node_id)
+            if cached is not None and cached.key == key and not any(c in dirty for c in node_children):
+                continue
+
+            self._subtrees[node_id] = self._combine(key, [self._subtrees[c] for c in node_children])
+            dirty.add(node_id)
+            recomputed += 1
+
+        # 清理已删除节点的缓存
+        for node_id in [n for n in self._subtrees if n not in children_of]:
+            del self._subtrees[node_id]
+
+        return recomputed
+
+    def _combine(self, key: Tuple, subtrees: List[_SubtreeLayout]) -> _SubtreeLayout:
+        """从左到右依次放置子树，使相邻轮廓间距不小于 distance，父节点居中
+
+        每放置一棵子树只访问重叠的层（较矮一侧的层数），较高一侧的轮廓直接共享，
+        整棵树的计算量与节点数成线性关系。
+        """
+        if not subtrees:
+            return _SubtreeLayout(key, [], (0.0, None), (0.0, None), 1)
+
+        first = subtrees[0]
+        merged_left, merged_right, height = first.left, first.right, first.height
+        positions = [0.0]
+
+        for subtree in subtrees[1:]:
+            overlap = min(height, subtree.height)
+            shift = max(r - l for r, l in zip(_contour_values(merged_right, overlap),
+                                              _contour_values(subtree.left, overlap))) + self.distance
+            positions.append(shift)
+            left = _shift_contour(subtree.left, shift)
+            right = _shift_contour(subtree.right, shift)
+            if subtree.height >= height:
+                if subtree.height > height:
+                    merged_left = _splice_contour(merged_left, height, left)
+                merged_right = right
+                height = subtree.height
+            else:
+                merged_right = _splice_contour(right, subtree.height, merged_right)
+
+        mid = (positions[0] + positions[-1]) / 2
+        return _SubtreeLayout(
+            key,
+            [p - mid for p in positions],
+            (0.0, _shift_contour(merged_left, -mid)),
+            (0.0, _shift_contour(merged_right, -mid)),
+            height + 1
+        )
+
+    def _absolute_positions(self, roots: List[str], tree_children: Dict[str, List[str]],
+                            depths: Dict[str, int]) -> Dict[str, Dict]:
+        """自顶向下累加偏移得到坐标，第一个根节点位于 x=0"""
+        if not roots:
+            return {}
+
+        forest = self._subtrees[self._FOREST]
+        origin = forest.offsets[0]
+        xs = {}
+        stack = []
+        for root_id, offset in zip(roots, forest.offsets):
+            xs[root_id] = offset - origin
+            stack.append(root_id)
+        while stack:
+            node_id = stack.pop()
+            subtree = self._subtrees[node_id]
+            for child_id, offset in zip(tree_children[node_id], subtree.offsets):
+                xs[child_id] = xs[node_id] + offset
+                stack.append(child_id)
+
+        return {
+            node_id: {"x": round(x, 4), "depth": depths[node_id]}
+            for node_id, x in xs.items()
+        }
+
+
+def layout_to_pixels(positions: Dict[str, Dict], node_spacing: float, level_height: float,
+                     origin: Tuple[float, float] = (0, 0)) -> Dict[str, Dict]:
+    """将布局单位换算为像素坐标（x 为水平位置，y 为层级方向）"""
+    origin_x, origin_y = origin
+    return {
+        node_id: {
+            "x": origin_x + pos["x"] * node_spacing,
+            "y": origin_y + pos["depth"] * level_height
+        }
+        for node_id, pos in positions.items()
+    }
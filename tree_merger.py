@@ -0,0 +1,668 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、转小写、去掉空白和标点"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    return re.sub(r'[\W_]+', '', text)
+
+
+def text_ngrams(normalized: str, n: int = 2) -> Set[str]:
+    """生成字符n-gram集合（对中文按字切分同样有效）"""
+    if not normalized:
+        return set()
+    if len(normalized) <= n:
+        return {normalized}
+    return {normalized[i:i + n] for i in range(len(normalized) - n + 1)}
+
+
+def content_node_id(prefix: str, text: str, namespace: str = None) -> str:
+    """根据节点内容生成确定性的节点ID
+
+    相同内容总是得到相同ID，不同内容几乎不会冲突，因此多个进程并行
+    转换聊天记录时不会互相覆盖节点。namespace 可用于按批次隔离ID。
+    """
+    digest = hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()[:10]
+    node_id = f"{prefix}_{digest}"
+    if namespace:
+        node_id = f"{namespace}_{node_id}"
+    return node_id
+
+
+def prefix_node_id(prefix: str, parts: Tuple[str, ...], namespace: str = None) -> str:
+    """根据从入口到该节点的 (问题, 回答, 问题, ...) 前缀生成节点ID
+
+    同一个问题出现在路径的不同位置时得到不同ID，不会被合并成一个节点而形成环。
+    """
+    # 各段加上长度前缀，避免拼接后不同前缀得到相同文本
+    return content_node_id(prefix, ''.join(f"{len(part)}{part}" for part in parts), namespace)
+
+
+def convert_path_to_nodes(path_data: Dict, namespace: str = None) -> Optional[Dict]:
+    """将AI返回的问题定位路径转换为节点结构
+
+    每个步骤对应一个决策节点（问题 + 实际回答），最后一步指向解决方案节点。
+    步骤节点ID由前缀路径的内容哈希生成（见 prefix_node_id，与 PathTrie.to_nodes 一致），
+    解决方案节点ID由解决方案文本生成。没有解决方案的路径无法终结，返回 None。
+
+    带 fast_path 字段的路径取自决策树中已有的路径（见 PathMatcher），节点都已存在，
+    不生成新节点，entry_node 为根节点之后的第一个已有节点。
+    """
+    if not path_data or 'steps' not in path_data:
+        return None
+
+    if path_data.get('fast_path'):
+        matched_nodes = path_data['fast_path']['nodes']
+        return {"entry_node": matched_nodes[1] if len(matched_nodes) > 1 else matched_nodes[0], "nodes": {}}
+
+    problem = path_data.get('problem', '问题定位')
+    steps = [step for step in path_data.get('steps', []) if isinstance(step, dict)]
+    solution = path_data.get('solution', '')
+
+    if not steps or not normalize_text(solution):
+        return None
+
+    nodes = {}
+    solution_id = content_node_id('solution', solution, namespace)
+
+    # 先生成所有步骤的ID，再串联成链
+    questions = [step.get('question', '') or (problem if i == 0 else '') for i, step in enumerate(steps)]
+    step_ids = []
+    parts: Tuple[str, ...] = ()
+    for i, step in enumerate(steps):
+        parts += (normalize_text(questions[i]),)
+        step_ids.append(prefix_node_id('issue' if i == 0 else 'step', parts, namespace))
+        parts += (normalize_text(step.get('answer', '')),)
+
+    for i, step in enumerate(steps):
+        next_node = step_ids[i + 1] if i + 1 < len(steps) else solution_id
+        nodes[step_ids[i]] = {
+            "question": questions[i],
+            "options": [{"text": step.get('answer', ''), "next_node": next_node}]
+        }
+
+    nodes[solution_id] = {
+        "solution": solution
+    }
+
+    return {
+        "entry_node": step_ids[0],
+        "nodes": nodes
+    }
+
+
+def _node_text(node_data: Dict) -> Tuple[str, str]:
+    """返回节点的类型和规范化文本"""
+    if not isinstance(node_data, dict):
+        return '', ''
+    if 'solution' in node_data:
+        return 'solution', normalize_text(node_data.get('solution', ''))
+    return 'question', normalize_text(node_data.get('question', ''))
+
+
+def remap_colliding_ids(new_nodes: Dict, existing_nodes: Dict) -> Tuple[Dict, Dict[str, str]]:
+    """批量检测并重映射与现有节点冲突的ID
+
+    ID相同但内容不同的新节点会被重命名，所有引用（包括 entry_node）一次性
+    改写。返回 (重映射后的新节点结构, 旧ID -> 新ID)。
+    """
+    new_nodes_dict = new_nodes.get('nodes', {})
+    taken = set(existing_nodes) | set(new_nodes_dict)
+    mapping: Dict[str, str] = {}
+
+    for node_id, node_data in new_nodes_dict.items():
+        if node_id not in existing_nodes:
+            continue
+        if _node_text(node_data) == _node_text(existing_nodes[node_id]):
+            continue
+        suffix = 2
+        while f"{node_id}_{suffix}" in taken:
+            suffix += 1
+        mapping[node_id] = f"{node_id}_{suffix}"
+        taken.add(mapping[node_id])
+
+    if not mapping:
+        return new_nodes, mapping
+
+    remapped = {}
+    for node_id, node_data in new_nodes_dict.items():
+        if isinstance(node_data, dict) and 'options' in node_data:
+            node_data = {
+                **node_data,
+                'options': [
+                    {**option, 'next_node': mapping.get(option.get('next_node'), option.get('next_node'))}
+                    for option in node_data['options']
+                ]
+            }
+        remapped[mapping.get(node_id, node_id)] = node_data
+
+    result = {**new_nodes, 'nodes': remapped}
+    if 'entry_node' in new_nodes:
+        result['entry_node'] = mapping.get(new_nodes['entry_node'], new_nodes['entry_node'])
+    return result, mapping
+
+
+class TreeMerger:
+    """基于文本索引的决策树合并器
+
+    为现有决策树中的问题、选项和解决方案建立索引，新路径中语义相同的
+    步骤直接挂接到已有节点上，而不是重复生成分支。
+    """
+
+    def __init__(self, tree: Dict, similarity_threshold: float = 0.85,
+                 ngram_size: int = 2, fuzzy_match: bool = True):
+        """初始化合并器
+
+        tree 会被就地修改，与原有的 merge_to_existing_tree 行为一致。
+        """
+        self.tree = tree
+        self.tree.setdefault('nodes', {})
+        self.tree.setdefault('root_node', 'start')
+        self.similarity_threshold = similarity_threshold
+        self.ngram_size = ngram_size
+        self.fuzzy_match = fuzzy_match
+
+        # 规范化文本 -> 节点ID（哈希索引）
+        self._question_index: Dict[str, str] = {}
+        self._solution_index: Dict[str, str] = {}
+        # n-gram -> 节点ID集合（倒排索引，用于相似度候选）
+        self._question_grams: Dict[str, Set[str]] = {}
+        self._solution_grams: Dict[str, Set[str]] = {}
+        self._node_grams: Dict[str, Set[str]] = {}
+
+        self._build_index()
+
+    @classmethod
+    def from_config(cls, tree: Dict, ai_config: Dict) -> 'TreeMerger':
+        """根据 ai_config.yaml 中的 tree_merge 配置创建合并器"""
+        merge_config = (ai_config or {}).get('tree_merge', {}) or {}
+        return cls(
+            tree,
+            similarity_threshold=merge_config.get('similarity_threshold', 0.85),
+            ngram_size=merge_config.get('ngram_size', 2),
+            fuzzy_match=merge_config.get('fuzzy_match', True)
+        )
+
+    @property
+    def nodes(self) -> Dict:
+        return self.tree['nodes']
+
+    @property
+    def root_node(self) -> str:
+        return self.tree['root_node']
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+
+    def _build_index(self):
+        """为现有节点建立索引"""
+        for node_id, node_data in self.nodes.items():
+            self._index_node(node_id, node_data)
+
+    def _index_node(self, node_id: str, node_data: Dict):
+        """将单个节点加入索引"""
+        if not isinstance(node_data, dict):
+            return
+
+        if 'solution' in node_data:
+            text_index, gram_index = self._solution_index, self._solution_grams
+            key = normalize_text(node_data.get('solution', ''))
+        else:
+            text_index, gram_index = self._question_index, self._question_grams
+            key = normalize_text(node_data.get('question', ''))
+
+        if not key:
+            return
+
+        # 同一文本只保留第一个节点，后续重复节点不参与匹配
+        text_index.setdefault(key, node_id)
+
+        if self.fuzzy_match:
+            grams = text_ngrams(key, self.ngram_size)
+            self._node_grams[node_id] = grams
+            for gram in grams:
+                gram_index.setdefault(gram, set()).add(node_id)
+
+    def _find_similar(self, text: str, is_solution: bool,
+                      exclude: Set[str] = None) -> Optional[str]:
+        """在索引中查找与文本匹配的节点"""
+        key = normalize_text(text)
+        if not key:
+            return None
+
+        text_index = self._solution_index if is_solution else self._question_index
+        exclude = exclude or set()
+
+        node_id = text_index.get(key)
+        if node_id and node_id not in exclude and not self._reaches(node_id, exclude):
+            return node_id
+
+        if not self.fuzzy_match:
+            return None
+
+        # 通过倒排索引统计共享n-gram数量，只对候选节点计算相似度
+        gram_index = self._solution_grams if is_solution else self._question_grams
+        grams = text_ngrams(key, self.ngram_size)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in gram_index.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        scored = []
+        for candidate, common in shared.items():
+            if candidate in exclude:
+                continue
+            candidate_grams = self._node_grams.get(candidate, set())
+            # Dice 系数
+            score = 2.0 * common / (len(grams) + len(candidate_grams))
+            if score >= self.similarity_threshold:
+                scored.append((score, candidate))
+
+        # 从高分到低分，只在确实需要时检查可达性
+        for _, candidate in sorted(scored, key=lambda item: -item[0]):
+            if not self._reaches(candidate, exclude):
+                return candidate
+        return None
+
+    def _reaches(self, node_id: str, targets: Set[str]) -> bool:
+        """从 node_id 沿选项能否到达 targets 中的节点（复用这样的节点会形成环路）"""
+        if not targets:
+            return False
+        seen = {node_id}
+        stack = [node_id]
+        while stack:
+            node_data = self.nodes.get(stack.pop())
+            if not isinstance(node_data, dict):
+                continue
+            for option in node_data.get('options', []) or []:
+                next_node = option.get('next_node')
+                if next_node in targets:
+                    return True
+                if next_node and next_node not in seen:
+                    seen.add(next_node)
+                    stack.append(next_node)
+        return False
+
+    def _match_option(self, node_id: str, text: str) -> Optional[Dict]:
+        """在节点的选项中查找文本相同或相似的选项"""
+        options = self.nodes.get(node_id, {}).get('options', [])
+        key = normalize_text(text)
+        if not key:
+            return None
+
+        for option in options:
+            if normalize_text(option.get('text', '')) == key:
+                return option
+
+        if not self.fuzzy_match:
+            return None
+
+        grams = text_ngrams(key, self.ngram_size)
+        best_option, best_score = None, 0.0
+        for option in options:
+            option_grams = text_ngrams(normalize_text(option.get('text', '')), self.ngram_size)
+            if not option_grams:
+                continue
+            score = 2.0 * len(grams & option_grams) / (len(grams) + len(option_grams))
+            if score > best_score:
+                best_option, best_score = option, score
+
+        if best_score >= self.similarity_threshold:
+            return best_option
+        return None
+
+    # ------------------------------------------------------------------
+    # 合并
+    # ------------------------------------------------------------------
+
+    def _unique_id(self, node_id: str) -> str:
+        """生成不与现有节点冲突的节点ID"""
+        if node_id not in self.nodes:
+            return node_id
+        suffix = 2
+        while f"{node_id}_{suffix}" in self.nodes:
+            suffix += 1
+        return f"{node_id}_{suffix}"
+
+    def _add_node(self, node_id: str, node_data: Dict, report: Dict) -> str:
+        """添加新节点并更新索引"""
+        new_id = self._unique_id(node_id)
+        self.nodes[new_id] = node_data
+        self._index_node(new_id, node_data)
+        report['added_nodes'].append(new_id)
+        if new_id != node_id:
+            report['renamed_nodes'][node_id] = new_id
+        return new_id
+
+    def _resolve_node(self, new_id: str, new_nodes: Dict, mapping: Dict[str, str],
+                      ancestors: Set[str], report: Dict) -> Optional[str]:
+        """将新节点解析为现有节点ID（复用）或插入后的新ID"""
+        if new_id in mapping:
+            return mapping[new_id]
+
+        node_data = new_nodes.get(new_id)
+        if not isinstance(node_data, dict):
+            # 指向新节点集合之外的节点，原样保留
+            return new_id if new_id in self.nodes else None
+
+        is_solution = 'solution' in node_data
+        text = node_data.get('solution' if is_solution else 'question', '')
+        existing_id = self._find_similar(text, is_solution, exclude=ancestors)
+
+        if existing_id:
+            mapping[new_id] = existing_id
+            report['reused_nodes'][new_id] = existing_id
+            if not is_solution:
+                self._merge_options(new_id, existing_id, new_nodes, mapping,
+                                    ancestors | {existing_id}, report)
+            return existing_id
+
+        # 没有匹配的节点：先占位再递归处理子节点，避免环路重复插入
+        inserted = {k: v for k, v in node_data.items() if k != 'options'}
+        if 'options' in node_data:
+            inserted['options'] = []
+        inserted_id = self._add_node(new_id, inserted, report)
+        mapping[new_id] = inserted_id
+
+        for option in node_data.get('options', []):
+            target = self._resolve_node(option.get('next_node', ''), new_nodes, mapping,
+                                        ancestors | {inserted_id}, report)
+            inserted['options'].append({**option, 'next_node': target or option.get('next_node', '')})
+
+        return inserted_id
+
+    def _merge_options(self, new_id: str, existing_id: str, new_nodes: Dict,
+                       mapping: Dict[str, str], ancestors: Set[str], report: Dict):
+        """把新节点的选项合并到已匹配的现有节点"""
+        existing_node = self.nodes[existing_id]
+        existing_node.setdefault('options', [])
+
+        for option in new_nodes[new_id].get('options', []):
+            child_id = option.get('next_node', '')
+            matched_option = self._match_option(existing_id, option.get('text', ''))
+
+            if matched_option:
+                # 相同的回答：沿着现有分支继续向下合并
+                existing_child = matched_option.get('next_node')
+                child_data = new_nodes.get(child_id)
+                if child_id in mapping or not isinstance(child_data, dict):
+                    continue
+                if self._same_content(child_data, self.nodes.get(existing_child)):
+                    mapping[child_id] = existing_child
+                    report['reused_nodes'][child_id] = existing_child
+                    if 'options' in child_data:
+                        self._merge_options(child_id, existing_child, new_nodes, mapping,
+                                            ancestors | {existing_child}, report)
+                else:
+                    report['conflicts'].append({
+                        'node': existing_id,
+                        'option': matched_option.get('text', ''),
+                        'existing_next_node': existing_child,
+                        'new_next_node': child_id
+                    })
+                continue
+
+            target = self._resolve_node(child_id, new_nodes, mapping, ancestors, report)
+            if not target:
+                continue
+            existing_node['options'].append({**option, 'next_node': target})
+            if existing_id not in report['updated_nodes']:
+                report['updated_nodes'].append(existing_id)
+
+    def _same_content(self, new_data: Dict, existing_data: Optional[Dict]) -> bool:
+        """判断两个节点的内容是否相同或足够相似"""
+        if not isinstance(existing_data, dict):
+            return False
+        if ('solution' in new_data) != ('solution' in existing_data):
+            return False
+        field = 'solution' if 'solution' in new_data else 'question'
+        new_key = normalize_text(new_data.get(field, ''))
+        existing_key = normalize_text(existing_data.get(field, ''))
+        if new_key == existing_key:
+            return True
+        if not self.fuzzy_match:
+            return False
+        new_grams = text_ngrams(new_key, self.ngram_size)
+        existing_grams = text_ngrams(existing_key, self.ngram_size)
+        if not new_grams or not existing_grams:
+            return False
+        score = 2.0 * len(new_grams & existing_grams) / (len(new_grams) + len(existing_grams))
+        return score >= self.similarity_threshold
+
+    def _new_report(self) -> Dict:
+        return {
+            'entry_node': None,
+            'added_nodes': [],
+            'updated_nodes': [],
+            'reused_nodes': {},
+            'renamed_nodes': {},
+            'conflicts': []
+        }
+
+    def _merge_entry(self, entry_node: str, new_nodes_dict: Dict,
+                     mapping: Dict[str, str], report: Dict) -> Optional[str]:
+        """从根节点挂接一条入口分支，返回入口节点在树中的ID"""
+        root = self.root_node
+        entry_data = new_nodes_dict[entry_node]
+        entry_question = entry_data.get('question', '新问题')
+
+        # 根节点上已有同名入口选项：沿该分支合并，而不是再挂一个新分支
+        root_option = self._match_option(root, entry_question) if root in self.nodes else None
+        if root_option:
+            existing_entry = root_option.get('next_node')
+            if not self._same_content(entry_data, self.nodes.get(existing_entry)):
+                report['conflicts'].append({
+                    'node': root,
+                    'option': root_option.get('text', ''),
+                    'existing_next_node': existing_entry,
+                    'new_next_node': entry_node
+                })
+                return None
+            mapping[entry_node] = existing_entry
+            report['reused_nodes'][entry_node] = existing_entry
+            if 'options' in entry_data:
+                self._merge_options(entry_node, existing_entry, new_nodes_dict, mapping,
+                                    {root, existing_entry}, report)
+            return existing_entry
+
+        entry_id = self._resolve_node(entry_node, new_nodes_dict, mapping, {root}, report)
+
+        # 入口节点是新插入的，需要从根节点挂接
+        if root in self.nodes and entry_id in report['added_nodes']:
+            root_data = self.nodes[root]
+            root_data.setdefault('options', [])
+            root_data['options'].append({
+                "text": entry_question,
+                "next_node": entry_id
+            })
+            if root not in report['updated_nodes']:
+                report['updated_nodes'].append(root)
+
+        return entry_id
+
+    def merge(self, new_nodes: Dict) -> Dict:
+        """将AI生成的节点合并到决策树，返回合并报告"""
+        report = self._new_report()
+
+        # 先批量重映射与现有节点冲突的ID，避免覆盖
+        new_nodes, renamed = remap_colliding_ids(new_nodes, self.nodes)
+        report['renamed_nodes'].update(renamed)
+
+        entry_node = new_nodes.get('entry_node', '')
+        new_nodes_dict = new_nodes.get('nodes', {})
+        if not entry_node or entry_node not in new_nodes_dict:
+            return report
+
+        report['entry_node'] = self._merge_entry(entry_node, new_nodes_dict, {}, report)
+        return report
+
+    def merge_paths(self, paths: List[Dict]) -> Dict:
+        """批量合并多条AI路径
+
+        先把所有路径插入按 (问题, 回答) 规范化文本索引的前缀树，共享前缀的
+        路径折叠成同一分支，再一次遍历挂接到决策树。调用方只需在最后保存一次。
+        带 fast_path 字段的路径已在决策树中，跳过。
+        """
+        trie = PathTrie()
+        for path_data in paths:
+            if not (path_data or {}).get('fast_path'):
+                trie.insert(path_data)
+
+        new_nodes = trie.to_nodes()
+        report = self._new_report()
+        report['entry_nodes'] = []
+        report['path_count'] = trie.path_count
+        report['conflicts'].extend(trie.conflicts)
+
+        new_nodes, renamed = remap_colliding_ids(new_nodes, self.nodes)
+        report['renamed_nodes'].update(renamed)
+
+        mapping: Dict[str, str] = {}
+        new_nodes_dict = new_nodes['nodes']
+        for entry_node in new_nodes['entry_nodes']:
+            entry_id = self._merge_entry(renamed.get(entry_node, entry_node),
+                                         new_nodes_dict, mapping, report)
+            if entry_id:
+                report['entry_nodes'].append(entry_id)
+
+        return report
+
+
+class PathTrie:
+    """AI路径前缀树
+
+    每一层是一个问题，边是规范化后的回答；相同 (问题, 回答) 前缀的路径
+    共享同一分支，叶子为解决方案。
+    """
+
+    def __init__(self):
+        self.roots: Dict[str, Dict] = {}
+        self.path_count = 0
+        self.conflicts: List[Dict] = []
+
+    @staticmethod
+    def _new_question(question: str) -> Dict:
+        return {'question': question, 'answers': {}}
+
+    def _find_conflict(self, questions: List[str], steps: List[Dict], solution: str) -> Optional[Dict]:
+        """沿已有分支检查路径是否冲突（不修改前缀树），返回冲突记录"""
+        level = self.roots
+        for i, step in enumerate(steps):
+            trie_node = level.get(normalize_text(questions[i]))
+            if trie_node is None:
+                if level is not self.roots and level:
+                    # 同一个回答后面接了不同的问题，保留先出现的分支
+                    return {
+                        'option': step.get('answer', ''),
+                        'existing_question': next(iter(level.values()))['question'],
+                        'new_question': questions[i]
+                    }
+                return None
+
+            answer = step.get('answer', '')
+            edge = trie_node['answers'].get(normalize_text(answer))
+            if edge is None:
+                return None
+
+            if i + 1 < len(steps):
+                if edge['solution'] is not None:
+                    return {
+                        'option': answer,
+                        'existing_solution': edge['solution'],
+                        'new_question': steps[i + 1].get('question', '')
+                    }
+                level = edge['next']
+            elif edge['next']:
+                return {
+                    'option': answer,
+                    'existing_question': next(iter(edge['next'].values()))['question'],
+                    'new_solution': solution
+                }
+        return None
+
+    def insert(self, path_data: Dict) -> bool:
+        """插入一条路径，路径无效时返回 False"""
+        if not path_data or 'steps' not in path_data:
+            return False
+
+        problem = path_data.get('problem', '问题定位')
+        steps = [step for step in path_data.get('steps', []) if isinstance(step, dict)]
+        solution = path_data.get('solution', '')
+        # 没有解决方案的路径无法终结，不插入
+        if not steps or not normalize_text(solution):
+            return False
+
+        questions = [step.get('question', '') or (problem if i == 0 else '') for i, step in enumerate(steps)]
+        conflict = self._find_conflict(questions, steps, solution)
+        if conflict:
+            self.conflicts.append(conflict)
+            return False
+
+        # 确认没有冲突后再累加计数，被拒绝的路径不影响频次
+        self.path_count += 1
+        level = self.roots
+        for i, step in enumerate(steps):
+            question_key = normalize_text(questions[i])
+            trie_node = level.get(question_key)
+            if trie_node is None:
+                trie_node = level[question_key] = self._new_question(questions[i])
+
+            answer = step.get('answer', '')
+            edge = trie_node['answers'].setdefault(normalize_text(answer), {
+                'text': answer, 'count': 0, 'next': {}, 'solution': None
+            })
+            edge['count'] += 1
+
+            if i + 1 < len(steps):
+                level = edge['next']
+            elif edge['solution'] is None:
+                edge['solution'] = solution
+
+        return True
+
+    def to_nodes(self) -> Dict:
+        """把前缀树转换为节点结构，ID由前缀路径的内容哈希生成"""
+        nodes = {}
+        entry_nodes = []
+
+        # 显式栈代替递归，避免长路径触发递归深度限制
+        stack = [(trie_node, (key,), None, None) for key, trie_node in self.roots.items()]
+        while stack:
+            trie_node, prefix, parent_id, parent_option = stack.pop()
+            node_id = prefix_node_id('issue' if len(prefix) == 1 else 'step', prefix)
+            nodes[node_id] = {'question': trie_node['question'], 'options': []}
+            if parent_id is None:
+                entry_nodes.append(node_id)
+            else:
+                parent_option['next_node'] = node_id
+
+            for answer_key, edge in trie_node['answers'].items():
+                option = {'text': edge['text'], 'next_node': ''}
+                nodes[node_id]['options'].append(option)
+                edge_prefix = prefix + (answer_key,)
+                if edge['solution'] is not None:
+                    solution_id = content_node_id('solution', edge['solution'])
+                    nodes.setdefault(solution_id, {'solution': edge['solution']})
+                    option['next_node'] = solution_id
+                for question_key, child in edge['next'].items():
+                    stack.append((child, edge_prefix + (question_key,), node_id, option))
+
+        entry_nodes.reverse()
+        return {'entry_nodes': entry_nodes, 'nodes': nodes}
+
+
+def merge_report_summary(report: Dict) -> str:
+    """生成合并报告的简短摘要"""
+    return (f"新增 {len(report.get('added_nodes', []))} 个节点, "
+            f"复用 {len(report.get('reused_nodes', {}))} 个节点, "
+            f"更新 {len(report.get('updated_nodes', []))} 个节点, "
+            f"冲突 {len(report.get('conflicts', []))} 处")
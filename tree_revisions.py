@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from tree_layout import tree_revision
+
+
+def node_digest(node_data: Dict) -> str:
+    """单个节点内容的哈希"""
+    canonical = json.dumps(node_data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class TreeRevisionLog:
+    """记录最近若干个决策树版本的节点哈希，用于计算两个版本之间的增量
+
+    只保存每个版本的 {节点ID: 内容哈希}，不保存节点内容；增量中的节点内容
+    取自当前决策树。超出 max_revisions 的旧版本被淘汰，客户端需重新完整加载。
+    """
+
+    def __init__(self, max_revisions: int = 32):
+        self.max_revisions = max_revisions
+        self._revisions = OrderedDict()
+
+    def record(self, tree: Dict) -> str:
+        """记录决策树的当前版本，返回版本号"""
+        revision = tree_revision(tree)
+        if revision in self._revisions:
+            self._revisions.move_to_end(revision)
+        else:
+            self._revisions[revision] = {
+                node_id: node_digest(node_data)
+                for node_id, node_data in tree.get('nodes', {}).items()
+            }
+            while len(self._revisions) > self.max_revisions:
+                self._revisions.popitem(last=False)
+        return revision
+
+    def delta(self, tree: Dict, since: str) -> Optional[Dict]:
+        """从 since 版本到当前决策树的增量，since 未记录时返回 None
+
+        返回 {"revision", "base_revision", "root_node", "changed": {节点ID: 节点}, "removed": [节点ID]}
+        """
+        base = self._revisions.get(since)
+        if base is None:
+            return None
+
+        revision = self.record(tree)
+        current = self._revisions[revision]
+        nodes = tree.get('nodes', {})
+        return {
+            "revision": revision,
+            "base_revision": since,
+            "root_node": tree.get('root_node'),
+            "changed": {
+                node_id: nodes[node_id]
+                for node_id, digest in current.items()
+                if base.get(node_id) != digest
+            },
+            "removed": [node_id for node_id in base if node_id not in current]
+        }
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+# 字段权重：节点ID和问题/解决方案命中比选项文本更相关
+FIELD_WEIGHTS = {
+    "id": 3.0,
+    "question": 2.0,
+    "solution": 2.0,
+    "option": 1.0,
+}
+
+_CJK_RUN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]+')
+_WORD_RUN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：英文/数字按单词，中文按相邻两字（单字片段保留单字）"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    tokens = _WORD_RUN.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _node_fields(node_id: str, node_data: Dict) -> List[Tuple[str, str]]:
+    fields = [("id", node_id)]
+    if node_data.get('question'):
+        fields.append(("question", node_data['question']))
+    if node_data.get('solution'):
+        fields.append(("solution", node_data['solution']))
+    for option in node_data.get('options', []) or []:
+        if option.get('text'):
+            fields.append(("option", option['text']))
+    return fields
+
+
+class TreeSearchIndex:
+    """决策树节点的内存倒排索引
+
+    索引节点ID、问题、选项文本和解决方案。查询词全部命中的节点才返回，
+    最后一个查询词按前缀匹配（输入过程中即可搜索），按字段权重 × IDF 排序。
+    索引按决策树版本缓存，版本变化时重建。
+    """
+
+    def __init__(self):
+        self.revision = None
+        self._postings = {}   # 词 -> {节点ID: (权重, 字段, 文本)}
+        self._terms = []      # 排序后的词表，用于前缀查找
+        self._node_count = 0
+
+    def build(self, tree: Dict, revision: str = None):
+        """为决策树建立索引；revision 与当前索引相同时跳过"""
+        if revision is not None and revision == self.revision:
+            return
+
+        postings = {}
+        nodes = tree.get('nodes', {})
+        for node_id, node_data in nodes.items():
+            for field, text in _node_fields(node_id, node_data or {}):
+                weight = FIELD_WEIGHTS[field]
+                for token in set(tokenize(text)):
+                    hits = postings.setdefault(token, {})
+                    current = hits.get(node_id)
+                    if current is None or weight > current[0]:
+                        hits[node_id] = (weight, field, text)
+
+        self._postings = postings
+        self._terms = sorted(postings)
+        self._node_count = len(nodes)
+        self.revision = revision
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\uffff')
+        return self._terms[start:end]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """返回 [{"node_id", "score", "field", "text"}]，按得分从高到低"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self._node_count:
+            return []
+
+        scores = None
+        best = {}
+        for i, token in enumerate(tokens):
+            # 最后一个词按前缀匹配，其余精确匹配
+            terms = self._expand_prefix(token) if i == len(tokens) - 1 else [token]
+            token_scores = {}
+            for term in terms:
+                hits = self._postings.get(term, {})
+                idf = math.log(1 + self._node_count / len(hits)) if hits else 0
+                for node_id, (weight, field, text) in hits.items():
+                    score = weight * idf
+                    if score > token_scores.get(node_id, 0):
+                        token_scores[node_id] = score
+                    if weight > best.get(node_id, (0,))[0]:
+                        best[node_id] = (weight, field, text)
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {node_id: scores[node_id] + s for node_id, s in token_scores.items() if node_id in scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {
+                "node_id": node_id,
+                "score": round(score, 4),
+                "field": best[node_id][1],
+                "text": best[node_id][2],
+            }
+            for node_id, score in ranked
+        ]
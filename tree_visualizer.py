@@ -7,12 +7,14 @@ import yaml
 import json
 from typing import Dict, List, Optional, Set
 from datetime import datetime
+from tree_layout import TreeLayoutService, build_spanning_forest, layout_to_pixels
 
 class TreeVisualizer:
-    def __init__(self, config_file: str = "config/ai_config.yaml"):
-        """初始化决策树可视化器"""
-        self.config = self._load_config(config_file)
+    def __init__(self, config_file: str = "config/ai_config.yaml", config: Dict = None):
+        """初始化决策树可视化器（已加载配置时可直接传入 config，避免重复读取文件）"""
+        self.config = config if config is not None else self._load_config(config_file)
         self.styles = self.config['tree_augment']
+        self.layout_service = TreeLayoutService()
         
     def _load_config(self, config_file: str) -> Dict:
         """加载配置文件"""
@@ -69,50 +71,35 @@ class TreeVisualizer:
                                   modified_nodes: Set = None) -> Dict:
         """生成可视化数据"""
         print("生成可视化数据...")
+        return self.create_model(original_tree, new_nodes, modified_nodes).data()
+    
+    def create_model(self, original_tree: Dict, new_nodes: Dict,
+                     modified_nodes: Set = None) -> 'VisualizationModel':
+        """创建可增量更新的可视化模型"""
+        return VisualizationModel(self, original_tree, new_nodes, modified_nodes)
+    
+    def generate_layout(self, tree: Dict, node_spacing: float = 40, level_height: float = 180) -> Dict:
+        """计算横向布局的像素坐标（x 为纵向位置，y 为层级方向，与 d3.tree 约定一致）
         
-        # 合并原始树和新节点
-        merged_tree = self._merge_trees(original_tree, new_nodes)
+        同时返回生成树结构（roots/children）和默认折叠层级，页面据此只创建展开部分的节点。
+        """
+        layout = self.layout_service.layout(tree)
+        positions = layout['positions']
+        min_x = min((pos['x'] for pos in positions.values()), default=0)
+        pixels = layout_to_pixels(positions, node_spacing, level_height, origin=(-min_x * node_spacing, 0))
+        for node_id, pos in positions.items():
+            pixels[node_id]['depth'] = pos['depth']
+        roots, tree_children, _ = build_spanning_forest(tree)
         
-        # 识别新增和修改的节点
-        new_node_ids = set(new_nodes.get('nodes', {}).keys())
-        modified_node_ids = modified_nodes or set()
-        
-        # 生成可视化数据
-        visualization_data = {
-            "nodes": {},
-            "relations": [],
-            "metadata": {
-                "original_node_count": len(original_tree.get('nodes', {})),
-                "new_node_count": len(new_node_ids),
-                "modified_node_count": len(modified_node_ids),
-                "total_node_count": len(merged_tree.get('nodes', {})),
-                "generated_at": datetime.now().isoformat()
-            }
+        return {
+            "revision": layout['revision'],
+            "positions": pixels,
+            "width": max((pos['y'] for pos in pixels.values()), default=0),
+            "height": max((pos['x'] for pos in pixels.values()), default=0),
+            "roots": roots,
+            "children": tree_children,
+            "collapse_depth": self.styles.get('collapse_depth', 3)
         }
-        
-        # 处理节点
-        for node_id, node_data in merged_tree.get('nodes', {}).items():
-            is_new = node_id in new_node_ids
-            is_modified = node_id in modified_node_ids
-            
-            visualization_data["nodes"][node_id] = {
-                "id": node_id,
-                "data": node_data,
-                "style": self._get_node_style(node_id, node_data.get('type', 'decision'), 
-                                            is_new, is_modified),
-                "status": self._get_node_status(is_new, is_modified)
-            }
-        
-        # 处理关系
-        relations = self._extract_relations(merged_tree)
-        for relation in relations:
-            is_new = relation['from'] in new_node_ids or relation['to'] in new_node_ids
-            visualization_data["relations"].append({
-                **relation,
-                "style": self._get_relation_style(is_new)
-            })
-        
-        return visualization_data
     
     def _merge_trees(self, original_tree: Dict, new_nodes: Dict) -> Dict:
         """合并决策树"""
@@ -135,18 +122,23 @@ class TreeVisualizer:
         nodes = tree.get('nodes', {})
         
         for node_id, node_data in nodes.items():
-            if 'options' in node_data:
-                for option in node_data['options']:
-                    if 'next_node' in option:
-                        relations.append({
-                            'from': node_id,
-                            'to': option['next_node'],
-                            'label': option.get('text', ''),
-                            'condition': option.get('condition', '')
-                        })
+            relations.extend(self._extract_node_relations(node_id, node_data))
         
         return relations
     
+    def _extract_node_relations(self, node_id: str, node_data: Dict) -> List[Dict]:
+        """提取单个节点的出边"""
+        relations = []
+        for option in node_data.get('options', []) or []:
+            if 'next_node' in option:
+                relations.append({
+                    'from': node_id,
+                    'to': option['next_node'],
+                    'label': option.get('text', ''),
+                    'condition': option.get('condition', '')
+                })
+        return relations
+    
     def _get_node_status(self, is_new: bool, is_modified: bool) -> str:
         """获取节点状态"""
         if is_new:
@@ -187,10 +179,12 @@ class TreeVisualizer:
             "timestamp": datetime.now().isoformat()
         }
     
-    def generate_html_visualization(self, visualization_data: Dict) -> str:
-        """生成HTML可视化"""
-        print("🌐 生成HTML可视化...")
+    def _render_html(self, data_scripts: str) -> str:
+        """生成可视化页面；data_scripts 为加载数据的 <script> 片段
         
+        页面不依赖外部资源（不使用CDN），可在离线环境中直接打开。数据按块加载，
+        每加载一块即更新显示；坐标由服务端布局预先计算，页面只负责创建元素。
+        """
         html_template = """
 <!DOCTYPE html>
 <html lang="zh-CN">
@@ -198,7 +192,6 @@ class TreeVisualizer:
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>决策树可视化</title>
-    <script src="https://d3js.org/d3.v7.min.js"></script>
     <style>
         .node {
             cursor: pointer;
@@ -227,6 +220,11 @@ class TreeVisualizer:
             margin-right: 5px;
             border: 1px solid #ccc;
         }
+        #loading-status {
+            font: 12px sans-serif;
+            color: #666;
+            margin: 5px 0;
+        }
     </style>
 </head>
 <body>
@@ -245,108 +243,272 @@ class TreeVisualizer:
                 修改节点
             </div>
         </div>
+        <div id="loading-status"></div>
         <div id="tree-container"></div>
     </div>
     
     <script>
-        const data = {visualization_data};
-        
-        // 设置画布
-        const width = 1200;
-        const height = 800;
-        const margin = {top: 20, right: 90, bottom: 30, left: 90};
-        
-        const svg = d3.select("#tree-container")
-            .append("svg")
-            .attr("width", width)
-            .attr("height", height);
-        
-        const g = svg.append("g")
-            .attr("transform", `translate(${margin.left},${margin.top})`);
-        
-        // 创建层次结构
-        const nodes = Object.values(data.nodes);
-        const links = data.relations;
-        
-        // 创建树形布局
-        const tree = d3.tree().size([height - margin.top - margin.bottom, width - margin.left - margin.right]);
-        
-        // 构建层次结构
-        const root = d3.stratify()
-            .id(d => d.id)
-            .parentId(d => {
-                const link = links.find(l => l.to === d.id);
-                return link ? link.from : null;
-            })(nodes);
-        
-        // 应用树形布局
-        const treeData = tree(root);
-        
-        // 绘制连接线
-        const link = g.selectAll(".link")
-            .data(treeData.links())
-            .enter().append("path")
-            .attr("class", "link")
-            .attr("d", d3.linkHorizontal()
-                .x(d => d.y)
-                .y(d => d.x));
-        
-        // 应用连接线样式
-        link.each(function(d) {
-            const linkData = links.find(l => l.from === d.source.id && l.to === d.target.id);
-            if (linkData) {
-                d3.select(this)
-                    .style("stroke", linkData.style.stroke_color)
-                    .style("stroke-width", linkData.style.stroke_width)
-                    .style("stroke-dasharray", linkData.style.stroke_dasharray);
-            }
-        });
-        
-        // 绘制节点
-        const node = g.selectAll(".node")
-            .data(treeData.descendants())
-            .enter().append("g")
-            .attr("class", "node")
-            .attr("transform", d => `translate(${d.y},${d.x})`);
-        
-        // 绘制节点圆圈
-        node.append("circle")
-            .attr("r", 10)
-            .style("fill", d => {
-                const nodeData = data.nodes[d.data.id];
-                return nodeData.style.background_color;
-            })
-            .style("stroke", d => {
-                const nodeData = data.nodes[d.data.id];
-                return nodeData.style.border_color;
-            })
-            .style("stroke-width", d => {
-                const nodeData = data.nodes[d.data.id];
-                return nodeData.style.border_width;
-            });
-        
-        // 绘制节点文本
-        node.append("text")
-            .attr("dy", ".35em")
-            .attr("x", d => d.children ? -13 : 13)
-            .style("text-anchor", d => d.children ? "end" : "start")
-            .style("fill", d => {
-                const nodeData = data.nodes[d.data.id];
-                return nodeData.style.text_color;
-            })
-            .text(d => {
-                const nodeData = data.nodes[d.data.id];
-                return nodeData.data.question || nodeData.data.solution || d.data.id;
-            });
+        // 按块接收数据并增量绘制：第一块包含布局元数据，之后每块包含一部分节点
+        const treeViewer = (() => {
+            const SVG_NS = "http://www.w3.org/2000/svg";
+            const margin = {top: 20, right: 300, bottom: 30, left: 90};
+            const data = {nodes: {}, relations: [], layout: null, metadata: {}};
+            const expanded = {};
+            const nodeElements = new Map();
+            const linkElements = new Map();
+            let svg = null;
+            let linkLayer = null;
+            let nodeLayer = null;
+            let scheduled = false;
+            
+            const create = (tag, attrs, parent) => {
+                const element = document.createElementNS(SVG_NS, tag);
+                Object.entries(attrs).forEach(([key, value]) => element.setAttribute(key, value));
+                if (parent) parent.appendChild(element);
+                return element;
+            };
+            
+            const positionOf = id => data.layout.positions[id];
+            const childrenOf = id => data.layout.children[id] || [];
+            const isExpanded = id => expanded[id] ?? positionOf(id).depth < data.layout.collapse_depth;
+            
+            // 横向布局：x 为纵向位置，y 为层级方向
+            const linkPath = (from, to) => {
+                const midY = (from.y + to.y) / 2;
+                return `M${from.y},${from.x}C${midY},${from.x} ${midY},${to.x} ${to.y},${to.x}`;
+            };
+            
+            const init = () => {
+                const width = Math.max(1200, data.layout.width + margin.left + margin.right);
+                const height = Math.max(800, data.layout.height + margin.top + margin.bottom);
+                svg = create("svg", {width, height}, document.getElementById("tree-container"));
+                const g = create("g", {transform: `translate(${margin.left},${margin.top})`}, svg);
+                linkLayer = create("g", {}, g);
+                nodeLayer = create("g", {}, g);
+            };
+            
+            // 展开部分中已加载的节点
+            const visibleNodes = () => {
+                const visible = new Set();
+                const stack = [...data.layout.roots];
+                while (stack.length > 0) {
+                    const id = stack.pop();
+                    if (!data.nodes[id]) continue;
+                    visible.add(id);
+                    if (isExpanded(id)) stack.push(...childrenOf(id));
+                }
+                return visible;
+            };
+            
+            const createNode = d => {
+                const pos = positionOf(d.id);
+                const hasChildren = childrenOf(d.id).length > 0;
+                const group = create("g", {"class": "node", transform: `translate(${pos.y},${pos.x})`}, nodeLayer);
+                
+                // 绘制节点圆圈
+                const circle = create("circle", {r: 10}, group);
+                circle.style.fill = d.style.background_color;
+                circle.style.stroke = d.style.border_color;
+                circle.style.strokeWidth = d.style.border_width;
+                
+                // 展开/折叠标记
+                const toggle = create("text", {"class": "toggle", dy: ".35em", "text-anchor": "middle"}, group);
+                
+                // 绘制节点文本
+                const label = create("text", {
+                    dy: ".35em",
+                    x: hasChildren ? -13 : 13,
+                    "text-anchor": hasChildren ? "end" : "start"
+                }, group);
+                label.style.fill = d.style.text_color;
+                label.textContent = d.data.question || d.data.solution || d.id;
+                
+                group.addEventListener("click", () => {
+                    if (!hasChildren) return;
+                    expanded[d.id] = !isExpanded(d.id);
+                    render();
+                });
+                return {group, toggle, hasChildren};
+            };
+            
+            const render = () => {
+                scheduled = false;
+                if (!data.layout) return;
+                if (!svg) init();
+                const visible = visibleNodes();
+                
+                // 绘制连接线
+                const links = new Set();
+                data.relations.forEach(l => {
+                    if (!visible.has(l.from) || !visible.has(l.to)) return;
+                    const key = `${l.from}->${l.to}`;
+                    links.add(key);
+                    if (linkElements.has(key)) return;
+                    const path = create("path", {"class": "link", d: linkPath(positionOf(l.from), positionOf(l.to))}, linkLayer);
+                    path.style.stroke = l.style.stroke_color;
+                    path.style.strokeWidth = l.style.stroke_width;
+                    path.style.strokeDasharray = l.style.stroke_dasharray;
+                    linkElements.set(key, path);
+                });
+                linkElements.forEach((path, key) => {
+                    if (!links.has(key)) {
+                        path.remove();
+                        linkElements.delete(key);
+                    }
+                });
+                
+                // 绘制节点
+                visible.forEach(id => {
+                    if (!nodeElements.has(id)) nodeElements.set(id, createNode(data.nodes[id]));
+                });
+                nodeElements.forEach((element, id) => {
+                    if (!visible.has(id)) {
+                        element.group.remove();
+                        nodeElements.delete(id);
+                        return;
+                    }
+                    element.toggle.textContent = element.hasChildren ? (isExpanded(id) ? "−" : "+") : "";
+                });
+            };
+            
+            // 同一帧内到达的多个数据块合并为一次绘制
+            const scheduleRender = () => {
+                if (scheduled) return;
+                scheduled = true;
+                requestAnimationFrame(render);
+            };
+            
+            const setStatus = text => {
+                document.getElementById("loading-status").textContent = text;
+            };
+            
+            return {
+                addChunk(chunk) {
+                    if (chunk.layout) data.layout = chunk.layout;
+                    if (chunk.metadata) data.metadata = chunk.metadata;
+                    Object.assign(data.nodes, chunk.nodes || {});
+                    data.relations.push(...(chunk.relations || []));
+                    const total = data.metadata.total_node_count;
+                    if (total) setStatus(`已加载 ${Object.keys(data.nodes).length} / ${total} 个节点`);
+                    scheduleRender();
+                },
+                finish() {
+                    setStatus("");
+                    scheduleRender();
+                },
+                fail(message) {
+                    setStatus(message);
+                }
+            };
+        })();
     </script>
+__DATA_SCRIPTS__
 </body>
 </html>
         """
         
-        return html_template.format(visualization_data=json.dumps(visualization_data, ensure_ascii=False))
+        # 使用占位符替换而不是 str.format，模板中的花括号无需转义
+        return html_template.replace("__DATA_SCRIPTS__", data_scripts)
     
-    def save_visualization(self, visualization_data: Dict, output_file: str = "tree_visualization.html"):
-        """保存可视化文件"""
+    @staticmethod
+    def _script_literal(value) -> str:
+        """序列化为可嵌入 <script> 的 JSON（避免数据中的 </script> 提前结束脚本）"""
+        return json.dumps(value, ensure_ascii=False).replace("</", "<\\/")
+    
+    def split_visualization_data(self, visualization_data: Dict, chunk_size: int = 2000) -> List[Dict]:
+        """将可视化数据按节点分块：第一块为布局和元数据，之后按广度优先顺序每块 chunk_size 个节点
+        
+        靠近根节点的部分先加载，页面可以在其余数据到达前开始显示。
+        """
+        layout = visualization_data.get('layout', {})
+        nodes = visualization_data.get('nodes', {})
+        relations_by_source = {}
+        for relation in visualization_data.get('relations', []):
+            relations_by_source.setdefault(relation['from'], []).append(relation)
+        
+        # 按生成树广度优先排序，未出现在生成树中的节点排在最后
+        order = []
+        seen = set()
+        queue = list(layout.get('roots', []))
+        head = 0
+        while head < len(queue):
+            node_id = queue[head]
+            head += 1
+            if node_id in seen or node_id not in nodes:
+                continue
+            seen.add(node_id)
+            order.append(node_id)
+            queue.extend(layout.get('children', {}).get(node_id, []))
+        order.extend(node_id for node_id in nodes if node_id not in seen)
+        
+        chunks = [{"layout": layout, "metadata": visualization_data.get('metadata', {})}]
+        for start in range(0, len(order), chunk_size):
+            chunk_ids = order[start:start + chunk_size]
+            chunks.append({
+                "nodes": {node_id: nodes[node_id] for node_id in chunk_ids},
+                "relations": [r for node_id in chunk_ids for r in relations_by_source.get(node_id, [])]
+            })
+        return chunks
+    
+    def generate_html_visualization(self, visualization_data: Dict) -> str:
+        """生成单文件HTML可视化（数据内嵌在页面中）"""
+        print("🌐 生成HTML可视化...")
+        
+        data_scripts = "\n".join(
+            f"    <script>treeViewer.addChunk({self._script_literal(chunk)});</script>"
+            for chunk in self.split_visualization_data(visualization_data)
+        )
+        data_scripts += "\n    <script>treeViewer.finish();</script>"
+        return self._render_html(data_scripts)
+    
+    def export_bundle(self, visualization_data: Dict, output_dir: str = "tree_visualization",
+                      chunk_size: int = 2000) -> str:
+        """导出离线可视化目录：index.html + data/chunk-*.js
+        
+        数据块通过依次插入 <script> 加载（file:// 下同样可用，无需本地服务器），
+        每块加载后立即绘制，大型决策树打开时不必等待全部数据解析完成。
+        """
+        print(f"🌐 导出离线可视化: {output_dir}")
+        
+        chunks = self.split_visualization_data(visualization_data, chunk_size)
+        data_dir = os.path.join(output_dir, "data")
+        os.makedirs(data_dir, exist_ok=True)
+        
+        chunk_files = []
+        for i, chunk in enumerate(chunks):
+            chunk_file = f"data/chunk-{i:04d}.js"
+            with open(os.path.join(output_dir, chunk_file), 'w', encoding='utf-8') as f:
+                f.write(f"treeViewer.addChunk({self._script_literal(chunk)});\n")
+            chunk_files.append(chunk_file)
+        
+        loader = """    <script>
+        // 依次加载数据块，上一块执行完后再加载下一块，浏览器可在两块之间绘制
+        (function loadChunks(files, index) {
+            if (index >= files.length) {
+                treeViewer.finish();
+                return;
+            }
+            const script = document.createElement("script");
+            script.src = files[index];
+            script.onload = () => setTimeout(() => loadChunks(files, index + 1), 0);
+            script.onerror = () => treeViewer.fail(`数据文件加载失败: ${files[index]}`);
+            document.body.appendChild(script);
+        })(__CHUNK_FILES__, 0);
+    </script>""".replace("__CHUNK_FILES__", json.dumps(chunk_files))
+        
+        index_file = os.path.join(output_dir, "index.html")
+        with open(index_file, 'w', encoding='utf-8') as f:
+            f.write(self._render_html(loader))
+        
+        print(f"[OK] 离线可视化已导出: {index_file} ({len(chunks) - 1} 个数据块)")
+        return index_file
+    
+    def save_visualization(self, visualization_data: Dict, output_file: str = "tree_visualization.html",
+                           bundle: bool = False):
+        """保存可视化文件；bundle=True 时导出为离线目录（output_file 为目录名）"""
+        if bundle:
+            return self.export_bundle(visualization_data, output_file)
+        
         html_content = self.generate_html_visualization(visualization_data)
         
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -355,6 +517,127 @@ class TreeVisualizer:
         print(f"[OK] 可视化文件已保存: {output_file}")
         return output_file
 
+class VisualizationModel:
+    """缓存的可视化模型
+    
+    节点样式、关系和布局在创建时计算一次；修改节点时只更新该节点的样式和
+    出边，节点的子节点变化时才重新计算布局。用于确认界面中审阅者反复编辑节点。
+    """
+    
+    def __init__(self, visualizer: 'TreeVisualizer', original_tree: Dict, new_nodes: Dict,
+                 modified_nodes: Set = None):
+        self.visualizer = visualizer
+        self.tree = visualizer._merge_trees(original_tree, new_nodes)
+        self.tree['nodes'] = dict(self.tree.get('nodes', {}))  # 修改节点时不影响调用方的决策树
+        self.new_node_ids = set(new_nodes.get('nodes', {}).keys())
+        self.modified_node_ids = set(modified_nodes or ())
+        self.original_node_count = len(original_tree.get('nodes', {}))
+        self.generated_at = datetime.now().isoformat()
+        
+        nodes = self.tree.get('nodes', {})
+        self._nodes = {node_id: self._node_entry(node_id) for node_id in nodes}
+        self._relations = {node_id: self._node_relations(node_id) for node_id in nodes}
+        self._layout = None
+        self._data = None
+    
+    def _node_entry(self, node_id: str) -> Dict:
+        node_data = self.tree['nodes'][node_id]
+        is_new = node_id in self.new_node_ids
+        is_modified = node_id in self.modified_node_ids
+        return {
+            "id": node_id,
+            "data": node_data,
+            "style": self.visualizer._get_node_style(node_id, node_data.get('type', 'decision'),
+                                                     is_new, is_modified),
+            "status": self.visualizer._get_node_status(is_new, is_modified)
+        }
+    
+    def _node_relations(self, node_id: str) -> List[Dict]:
+        relations = []
+        for relation in self.visualizer._extract_node_relations(node_id, self.tree['nodes'][node_id]):
+            is_new = relation['from'] in self.new_node_ids or relation['to'] in self.new_node_ids
+            relations.append({**relation, "style": self.visualizer._get_relation_style(is_new)})
+        return relations
+    
+    def _metadata(self, **extra) -> Dict:
+        return {
+            "original_node_count": self.original_node_count,
+            "new_node_count": len(self.new_node_ids),
+            "modified_node_count": len(self.modified_node_ids),
+            "total_node_count": len(self._nodes),
+            "generated_at": self.generated_at,
+            **extra
+        }
+    
+    def layout(self) -> Dict:
+        if self._layout is None:
+            self._layout = self.visualizer.generate_layout(self.tree)
+        return self._layout
+    
+    def data(self) -> Dict:
+        """完整的可视化数据（与 generate_visualization_data 的结构相同）"""
+        if self._data is None:
+            self._data = {
+                "nodes": dict(self._nodes),
+                "relations": [r for relations in self._relations.values() for r in relations],
+                "metadata": self._metadata(),
+                "layout": self.layout()
+            }
+        return self._data
+    
+    def update_node(self, node_id: str, node_data: Dict) -> Dict:
+        """修改节点并返回增量 {"node", "relations", "layout"}
+        
+        relations 为该节点的全部出边（替换原有出边）；layout 仅在节点的子节点
+        变化时返回，否则为 None，客户端沿用原有坐标。
+        """
+        nodes = self.tree['nodes']
+        old_targets = [r['to'] for r in self._relations.get(node_id, [])]
+        
+        nodes[node_id] = node_data
+        self.modified_node_ids.add(node_id)
+        self._nodes[node_id] = self._node_entry(node_id)
+        self._relations[node_id] = self._node_relations(node_id)
+        self._data = None
+        
+        layout = None
+        if [r['to'] for r in self._relations[node_id]] != old_targets:
+            self._layout = None
+            layout = self.layout()
+        
+        return {
+            "node": self._nodes[node_id],
+            "relations": self._relations[node_id],
+            "layout": layout,
+            "metadata": self._metadata()
+        }
+    
+    def diff_view(self) -> Dict:
+        """只包含新增/修改节点及其直接父节点（作为上下文）的可视化数据"""
+        changed = self.new_node_ids | self.modified_node_ids
+        context = {
+            relation['from']
+            for relations in self._relations.values() for relation in relations
+            if relation['to'] in changed and relation['from'] not in changed
+        }
+        included = [node_id for node_id in self._nodes if node_id in changed or node_id in context]
+        included_set = set(included)
+        
+        relations = [
+            relation for node_id in included for relation in self._relations[node_id]
+            if relation['to'] in included_set
+        ]
+        sub_tree = {
+            "root_node": self.tree.get('root_node'),
+            "nodes": {node_id: self.tree['nodes'][node_id] for node_id in included}
+        }
+        return {
+            "nodes": {node_id: self._nodes[node_id] for node_id in included},
+            "relations": relations,
+            "metadata": self._metadata(view="diff", context_node_count=len(context)),
+            "layout": self.visualizer.generate_layout(sub_tree)
+        }
+
 def main():
     """测试函数"""
     # 示例数据
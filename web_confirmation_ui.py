@@ -11,6 +11,7 @@ from datetime import datetime
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import threading
 import time
+from tree_visualizer import TreeVisualizer
 
 class WebConfirmationUI:
     def __init__(self, config_file: str = "config/ai_config.yaml"):
@@ -22,6 +23,11 @@ class WebConfirmationUI:
         self.modified_tree = None
         self.result = None
         
+        # 可视化器只创建一次；可视化模型按当前决策树缓存，节点修改时增量更新
+        self.visualizer = TreeVisualizer(config=self.config)
+        self._model = None
+        self._model_source = None
+        
         # 设置模板和静态文件目录
         self.templates_dir = "templates"
         self.static_dir = "static"
@@ -99,6 +105,9 @@ class WebConfirmationUI:
                         <button @click="previewVisualization" class="btn btn-primary">
                             预览可视化
                         </button>
+                        <button @click="toggleDiffOnly" class="btn btn-secondary">
+                            {{ showDiffOnly ? '显示完整决策树' : '仅显示变更' }}
+                        </button>
                         <button @click="saveBackup" class="btn btn-secondary">
                             [SAVE] 保存备份
                         </button>
@@ -455,7 +464,8 @@ createApp({
             changes: [],
             originalNodeCount: 0,
             newNodeCount: 0,
-            modifiedNodeCount: 0
+            modifiedNodeCount: 0,
+            showDiffOnly: false
         }
     },
     
@@ -468,7 +478,7 @@ createApp({
     methods: {
         async loadData() {
             try {
-                const response = await fetch('/api/data');
+                const response = await fetch(this.showDiffOnly ? '/api/data?view=diff' : '/api/data');
                 const data = await response.json();
                 this.originalTree = data.originalTree;
                 this.newNodes = data.newNodes;
@@ -517,94 +527,130 @@ createApp({
         initializeVisualization() {
             if (!this.visualizationData) return;
             
-            const width = document.getElementById('tree-visualization').offsetWidth;
-            const height = document.getElementById('tree-visualization').offsetHeight;
             const margin = {top: 20, right: 90, bottom: 30, left: 90};
+            const container = document.getElementById('tree-visualization');
+            d3.select(container).selectAll("svg").remove();
             
-            const svg = d3.select("#tree-visualization")
-                .append("svg")
-                .attr("width", width)
-                .attr("height", height);
-            
+            const svg = d3.select(container).append("svg");
             const g = svg.append("g")
                 .attr("transform", `translate(${margin.left},${margin.top})`);
             
-            // 创建层次结构
-            const nodes = Object.values(this.visualizationData.nodes);
-            const links = this.visualizationData.relations;
-            
-            // 创建树形布局
-            const tree = d3.tree().size([height - margin.top - margin.bottom, width - margin.left - margin.right]);
+            // 节点坐标由服务端布局预先计算；节点修改后数据和布局被增量替换，重绘时总是读取最新值
+            // 按生成树展开：只为展开部分的节点创建元素，坐标固定不随折叠变化
+            const expanded = {};
+            const layout = () => this.visualizationData.layout;
+            const position = id => layout().positions[id];
+            const isExpanded = id => expanded[id] ?? position(id).depth < layout().collapse_depth;
+            const hasChildren = id => (layout().children[id] || []).length > 0;
             
-            // 构建层次结构
-            const root = d3.stratify()
-                .id(d => d.id)
-                .parentId(d => {
-                    const link = links.find(l => l.to === d.id);
-                    return link ? link.from : null;
-                })(nodes);
-            
-            // 应用树形布局
-            const treeData = tree(root);
+            const visibleNodes = () => {
+                const visible = new Set();
+                const stack = [...layout().roots];
+                while (stack.length > 0) {
+                    const id = stack.pop();
+                    visible.add(id);
+                    if (isExpanded(id)) stack.push(...(layout().children[id] || []));
+                }
+                return visible;
+            };
             
-            // 绘制连接线
-            const link = g.selectAll(".link")
-                .data(treeData.links())
-                .enter().append("path")
-                .attr("class", "link")
-                .attr("d", d3.linkHorizontal()
-                    .x(d => d.y)
-                    .y(d => d.x))
-                .style("stroke", d => {
-                    const linkData = links.find(l => l.from === d.source.id && l.to === d.target.id);
-                    return linkData ? linkData.style.stroke_color : "#666666";
-                })
-                .style("stroke-width", d => {
-                    const linkData = links.find(l => l.from === d.source.id && l.to === d.target.id);
-                    return linkData ? linkData.style.stroke_width : 1;
-                })
-                .style("stroke-dasharray", d => {
-                    const linkData = links.find(l => l.from === d.source.id && l.to === d.target.id);
-                    return linkData ? linkData.style.stroke_dasharray : "none";
-                });
+            const linkPath = d3.linkHorizontal()
+                .source(d => position(d.from))
+                .target(d => position(d.to))
+                .x(d => d.y)
+                .y(d => d.x);
             
-            // 绘制节点
-            const node = g.selectAll(".node")
-                .data(treeData.descendants())
-                .enter().append("g")
-                .attr("class", "node")
-                .attr("transform", d => `translate(${d.y},${d.x})`)
-                .on("click", (event, d) => this.selectNode(d.data.id));
+            const linkLayer = g.append("g");
+            const nodeLayer = g.append("g");
             
-            // 绘制节点圆圈
-            node.append("circle")
-                .attr("r", 10)
-                .style("fill", d => {
-                    const nodeData = this.visualizationData.nodes[d.data.id];
-                    return nodeData.style.background_color;
-                })
-                .style("stroke", d => {
-                    const nodeData = this.visualizationData.nodes[d.data.id];
-                    return nodeData.style.border_color;
-                })
-                .style("stroke-width", d => {
-                    const nodeData = this.visualizationData.nodes[d.data.id];
-                    return nodeData.style.border_width;
-                });
+            const render = () => {
+                const data = this.visualizationData;
+                svg.attr("width", Math.max(container.offsetWidth, data.layout.width + margin.left + margin.right))
+                    .attr("height", Math.max(container.offsetHeight, data.layout.height + margin.top + margin.bottom));
+                
+                const visible = visibleNodes();
+                const nodes = Object.values(data.nodes).filter(d => visible.has(d.id));
+                const links = data.relations.filter(l => visible.has(l.from) && visible.has(l.to));
+                
+                // 绘制连接线
+                linkLayer.selectAll(".link")
+                    .data(links, d => `${d.from}->${d.to}`)
+                    .join("path")
+                    .attr("class", "link")
+                    .attr("d", linkPath)
+                    .style("stroke", d => d.style.stroke_color)
+                    .style("stroke-width", d => d.style.stroke_width)
+                    .style("stroke-dasharray", d => d.style.stroke_dasharray);
+                
+                // 绘制节点：元素只在进入时创建，位置、样式和文本每次按最新数据更新
+                const node = nodeLayer.selectAll(".node")
+                    .data(nodes, d => d.id)
+                    .join(enter => {
+                        const group = enter.append("g")
+                            .attr("class", "node")
+                            .on("click", (event, d) => this.selectNode(d.id));
+                        
+                        // 节点圆圈，点击展开/折叠子树
+                        group.append("circle")
+                            .attr("r", 10)
+                            .on("click", (event, d) => {
+                                if (!hasChildren(d.id)) return;
+                                event.stopPropagation();
+                                expanded[d.id] = !isExpanded(d.id);
+                                render();
+                            });
+                        
+                        // 展开/折叠标记
+                        group.append("text")
+                            .attr("class", "toggle")
+                            .attr("dy", ".35em")
+                            .style("text-anchor", "middle")
+                            .style("pointer-events", "none");
+                        
+                        // 节点文本
+                        group.append("text")
+                            .attr("class", "label")
+                            .attr("dy", ".35em");
+                        return group;
+                    })
+                    .attr("transform", d => `translate(${position(d.id).y},${position(d.id).x})`);
+                
+                node.select("circle")
+                    .style("fill", d => d.style.background_color)
+                    .style("stroke", d => d.style.border_color)
+                    .style("stroke-width", d => d.style.border_width);
+                
+                node.select(".toggle")
+                    .text(d => hasChildren(d.id) ? (isExpanded(d.id) ? "−" : "+") : "");
+                
+                node.select(".label")
+                    .attr("x", d => hasChildren(d.id) ? -13 : 13)
+                    .style("text-anchor", d => hasChildren(d.id) ? "end" : "start")
+                    .style("fill", d => d.style.text_color)
+                    .text(d => d.data.question || d.data.solution || d.id);
+            };
             
-            // 绘制节点文本
-            node.append("text")
-                .attr("dy", ".35em")
-                .attr("x", d => d.children ? -13 : 13)
-                .style("text-anchor", d => d.children ? "end" : "start")
-                .style("fill", d => {
-                    const nodeData = this.visualizationData.nodes[d.data.id];
-                    return nodeData.style.text_color;
-                })
-                .text(d => {
-                    const nodeData = this.visualizationData.nodes[d.data.id];
-                    return nodeData.data.question || nodeData.data.solution || d.data.id;
-                });
+            this.renderTree = render;
+            render();
+        },
+        
+        applyNodeDelta(delta) {
+            // 只替换被修改的节点及其出边；布局仅在子节点变化时由服务端返回
+            const data = this.visualizationData;
+            const nodeId = delta.node.id;
+            data.nodes[nodeId] = delta.node;
+            data.relations = data.relations.filter(r => r.from !== nodeId).concat(delta.relations);
+            if (delta.layout) {
+                data.layout = delta.layout;
+            }
+            data.metadata = delta.metadata;
+            this.renderTree();
+        },
+        
+        async toggleDiffOnly() {
+            this.showDiffOnly = !this.showDiffOnly;
+            await this.loadData();
+            this.initializeVisualization();
         },
         
         selectNode(nodeId) {
@@ -612,7 +658,7 @@ createApp({
             d3.selectAll(".node").classed("selected", false);
             
             // 选择当前节点
-            d3.selectAll(".node").filter(d => d.data.id === nodeId).classed("selected", true);
+            d3.selectAll(".node").filter(d => d.id === nodeId).classed("selected", true);
             
             // 加载节点数据到编辑器
             const nodeData = this.newNodes.nodes[nodeId];
@@ -621,7 +667,10 @@ createApp({
                     id: nodeId,
                     type: nodeData.question ? 'decision' : 'solution',
                     content: nodeData.question || nodeData.solution || '',
-                    options: nodeData.options || []
+                    options: (nodeData.options || []).map(option => ({
+                        text: option.text || '',
+                        nextNode: option.next_node || ''
+                    }))
                 };
             }
         },
@@ -665,8 +714,15 @@ createApp({
                 });
                 
                 if (response.ok) {
-                    // 更新本地数据
-                    this.newNodes.nodes[this.selectedNode.id] = nodeData;
+                    // 更新本地数据，按服务端返回的增量重绘
+                    const result = await response.json();
+                    this.newNodes.nodes[this.selectedNode.id] = result.node;
+                    if (this.showDiffOnly) {
+                        await this.loadData();
+                        this.initializeVisualization();
+                    } else if (result.delta) {
+                        this.applyNodeDelta(result.delta);
+                    }
                     this.generateChanges();
                     alert('节点修改已保存');
                 }
@@ -740,10 +796,11 @@ createApp({
         
         @self.app.route('/api/data')
         def get_data():
+            # view=diff 时只返回新增/修改节点及其父节点
             return jsonify({
                 'originalTree': self.original_tree,
                 'newNodes': self.new_nodes,
-                'visualizationData': self._generate_visualization_data()
+                'visualizationData': self._generate_visualization_data(request.args.get('view'))
             })
         
         @self.app.route('/api/update-node', methods=['POST'])
@@ -751,26 +808,29 @@ createApp({
             data = request.json
             node_id = data['id']
             
-            if node_id in self.new_nodes.get('nodes', {}):
-                if data.get('question'):
-                    self.new_nodes['nodes'][node_id] = {
-                        'question': data['question'],
-                        'options': data.get('options', [])
-                    }
-                else:
-                    self.new_nodes['nodes'][node_id] = {
-                        'solution': data['content']
-                    }
+            if node_id not in self.new_nodes.get('nodes', {}):
+                return jsonify({'success': True, 'node': None, 'delta': None})
             
-            return jsonify({'success': True})
+            if data.get('question'):
+                node_data = {
+                    'question': data['question'],
+                    'options': self._normalize_options(data.get('options', []))
+                }
+            else:
+                node_data = {
+                    'solution': data['content']
+                }
+            self.new_nodes['nodes'][node_id] = node_data
+            
+            # 只更新该节点的可视化数据，返回增量供前端局部重绘
+            delta = self._visualization_model().update_node(node_id, node_data)
+            return jsonify({'success': True, 'node': node_data, 'delta': delta})
         
         @self.app.route('/api/preview')
         def preview():
             # 生成可视化文件
-            from tree_visualizer import TreeVisualizer
-            visualizer = TreeVisualizer()
-            viz_data = visualizer.generate_visualization_data(self.original_tree, self.new_nodes)
-            filename = visualizer.save_visualization(viz_data)
+            viz_data = self._generate_visualization_data()
+            filename = self.visualizer.save_visualization(viz_data)
             
             return jsonify({'url': f'file://{os.path.abspath(filename)}'})
         
@@ -811,11 +871,30 @@ createApp({
             except Exception as e:
                 return jsonify({'success': False, 'error': str(e)})
     
-    def _generate_visualization_data(self):
+    def _visualization_model(self):
+        """当前决策树的可视化模型，决策树被替换时重新创建"""
+        source = (id(self.original_tree), id(self.new_nodes))
+        if self._model is None or self._model_source != source:
+            self._model = self.visualizer.create_model(self.original_tree, self.new_nodes)
+            self._model_source = source
+        return self._model
+    
+    def _generate_visualization_data(self, view: str = None):
         """生成可视化数据"""
-        from tree_visualizer import TreeVisualizer
-        visualizer = TreeVisualizer()
-        return visualizer.generate_visualization_data(self.original_tree, self.new_nodes)
+        model = self._visualization_model()
+        return model.diff_view() if view == 'diff' else model.data()
+    
+    def _normalize_options(self, options: List[Dict]) -> List[Dict]:
+        """前端编辑器使用 nextNode，决策树中保存为 next_node"""
+        normalized = []
+        for option in options or []:
+            next_node = option.get('next_node', option.get('nextNode'))
+            item = {key: value for key, value in option.items() if key not in ('nextNode', 'next_node')}
+            item.setdefault('text', '')
+            if next_node:
+                item['next_node'] = next_node
+            normalized.append(item)
+        return normalized
     
     def _merge_trees(self):
         """合并决策树"""
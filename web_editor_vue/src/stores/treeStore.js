@@ -1,5 +1,8 @@
-import { reactive, ref } from 'vue'
+import { ref, shallowRef } from 'vue'
 import axios from 'axios'
+import { buildLayoutGraph } from '../utils/treeLayout'
+import { createReferenceIndex } from '../utils/referenceIndex'
+import { loadCachedTree, saveCachedTree } from '../utils/treeCache'
 
 // 创建API服务
 const api = axios.create({
@@ -7,33 +10,334 @@ const api = axios.create({
   timeout: 10000
 })
 
+// 保留的编辑历史条数
+const MAX_HISTORY = 200
+// 下载完整决策树的超时时间（大树超过默认的10秒）
+const FULL_TREE_TIMEOUT = 60000
+
 export function useTreeStore() {
   // 状态
-  const treeData = ref({
+  // 节点数据不做深层响应式：节点记录视为不可变，修改时整体替换，
+  // 每批修改结束后替换外层对象触发一次更新
+  const treeData = shallowRef({
     root_node: '',
     nodes: {}
   })
+  // 服务端预计算的布局；graphKey 记录对应的树结构，结构变化后前端自行计算
+  const serverLayout = ref(null)
+  // 按层级加载时子节点尚未加载的节点
+  const truncatedNodes = ref([])
+  // 服务器上完整决策树的版本号，增量保存时用于检测冲突
+  const revision = ref(null)
+  // 本地重命名的节点，合并后端的节点时用于改写引用
+  const renamedNodes = new Map()    // 原始ID -> 当前ID
+  const renamedOrigins = new Map()  // 当前ID -> 原始ID
+  // 节点 -> 引用它的父节点
+  const references = createReferenceIndex()
+  
+  // 编辑历史：每批修改为一条记录，记录每个节点修改前后的节点记录。
+  // 节点记录不可变，只保存引用，每步占用的内存与修改量成正比
+  const history = []
+  let cursor = 0
+  let currentOps = null
+  const canUndo = ref(false)
+  const canRedo = ref(false)
+  // 上次保存后修改过的节点（含撤销/重做），保存时作为增量发送
+  const unsavedIds = new Set()
+  let rootChanged = false
+  
+  // 批量修改：嵌套调用只在最外层结束时触发一次更新，并记为一条历史
+  let batchDepth = 0
+  let dirty = false
+  
+  const notify = () => {
+    if (batchDepth > 0) {
+      dirty = true
+      return
+    }
+    dirty = false
+    treeData.value = { ...treeData.value }
+  }
+  
+  const updateHistoryState = () => {
+    canUndo.value = cursor > 0
+    canRedo.value = cursor < history.length
+  }
+  
+  const batch = (fn) => {
+    if (batchDepth === 0) currentOps = []
+    batchDepth++
+    try {
+      return fn()
+    } finally {
+      batchDepth--
+      if (batchDepth === 0) {
+        if (currentOps.length > 0) {
+          history.length = cursor
+          history.push(currentOps)
+          if (history.length > MAX_HISTORY) history.shift()
+          cursor = history.length
+          updateHistoryState()
+        }
+        currentOps = null
+        if (dirty) notify()
+      }
+    }
+  }
+  
+  // 写入（nodeData 为 undefined 时删除）节点记录并同步反向引用索引
+  const writeNode = (nodeId, nodeData) => {
+    if (nodeData === undefined) {
+      delete treeData.value.nodes[nodeId]
+      references.remove(nodeId)
+    } else {
+      treeData.value.nodes[nodeId] = nodeData
+      references.set(nodeId, nodeData)
+    }
+    unsavedIds.add(nodeId)
+  }
+  
+  const writeRoot = (rootNode) => {
+    treeData.value.root_node = rootNode
+    rootChanged = true
+  }
+  
+  // 用户修改：写入并记录到当前批次
+  const setNode = (nodeId, nodeData) => {
+    currentOps.push({ nodeId, before: treeData.value.nodes[nodeId], after: nodeData })
+    writeNode(nodeId, nodeData)
+  }
+  
+  const removeNode = (nodeId) => setNode(nodeId, undefined)
+  
+  const setRoot = (rootNode) => {
+    currentOps.push({ root: true, before: treeData.value.root_node, after: rootNode })
+    writeRoot(rootNode)
+  }
+  
+  const applyOp = (op, value) => {
+    if (op.root) {
+      writeRoot(value)
+    } else {
+      writeNode(op.nodeId, value)
+    }
+  }
+  
+  // 撤销：逆序写回修改前的记录
+  const undo = () => {
+    if (cursor === 0) return false
+    const ops = history[--cursor]
+    for (let i = ops.length - 1; i >= 0; i--) {
+      applyOp(ops[i], ops[i].before)
+    }
+    updateHistoryState()
+    notify()
+    return true
+  }
+  
+  const redo = () => {
+    if (cursor === history.length) return false
+    history[cursor++].forEach(op => applyOp(op, op.after))
+    updateHistoryState()
+    notify()
+    return true
+  }
+  
+  // 快照即历史位置（O(1)），restore 通过撤销/重做回到该位置
+  const snapshot = () => cursor
+  
+  const restore = (position) => {
+    while (cursor > position && undo()) {}
+    while (cursor < position && redo()) {}
+  }
+  
+  const resetHistory = () => {
+    history.length = 0
+    cursor = 0
+    updateHistoryState()
+  }
+  
+  // 上次保存后的修改，作为增量发送到服务器
+  const buildPatch = () => {
+    const ops = []
+    unsavedIds.forEach(nodeId => {
+      const nodeData = treeData.value.nodes[nodeId]
+      ops.push(nodeData === undefined
+        ? { op: 'delete', node_id: nodeId }
+        : { op: 'set', node_id: nodeId, value: nodeData })
+    })
+    if (rootChanged) {
+      ops.push({ op: 'root', value: treeData.value.root_node })
+    }
+    return ops
+  }
+  
+  const markSaved = (newRevision) => {
+    revision.value = newRevision ?? null
+    unsavedIds.clear()
+    rootChanged = false
+    renamedNodes.clear()
+    renamedOrigins.clear()
+  }
+  
+  // 重命名过的节点在后端的原始ID
+  const renamedOrigin = (nodeId) => renamedOrigins.get(nodeId) || nodeId
+  
+  // 替换整棵决策树（加载/同步），清空编辑历史
+  const setTree = (tree, truncated, treeRevision) => {
+    tree.nodes = tree.nodes || {}
+    references.rebuild(tree.nodes)
+    treeData.value = tree
+    truncatedNodes.value = truncated
+    markSaved(treeRevision)
+    resetHistory()
+  }
+  
+  // 去掉响应中由服务端生成的附加字段
+  const treeFromResponse = (data) => {
+    const { positions, truncated, revision: treeRevision, ...tree } = data
+    return tree
+  }
   
   // 方法
-  const loadTree = async () => {
+  // 有本地缓存时先显示缓存，再只拉取自缓存版本以来的增量；
+  // 否则从网络加载，depth 为空时加载完整决策树，否则只加载前 depth 层
+  const loadTree = async (depth = null) => {
+    const cached = await loadCachedTree()
+    if (cached) {
+      console.log('使用本地缓存的决策树:', cached.revision)
+      serverLayout.value = null
+      setTree(cached.tree, [], cached.revision)
+      try {
+        await syncTree()
+        return
+      } catch (error) {
+        // 缓存版本在服务器上已不可用时重新完整加载，其他错误保留缓存内容
+        if (error.response?.status !== 410) {
+          throw new Error(error.response?.data?.error || error.message)
+        }
+        console.log('缓存版本已过期，重新加载')
+      }
+    }
+    await fetchTree(depth)
+  }
+  
+  // 拉取自当前版本以来的增量并更新本地缓存
+  const syncTree = async () => {
+    const response = await api.get('/tree/delta', { params: { since: revision.value } })
+    const { changed, removed, root_node: rootNode } = response.data
+    const nodes = { ...treeData.value.nodes, ...changed }
+    removed.forEach(nodeId => delete nodes[nodeId])
+    const tree = { ...treeData.value, root_node: rootNode, nodes }
+    setTree(tree, [], response.data.revision)
+    console.log(`增量同步完成: ${Object.keys(changed).length} 个节点变化, ${removed.length} 个节点删除`)
+    saveCachedTree(response.data.revision, tree)
+  }
+  
+  const fetchTree = async (depth) => {
     try {
       console.log('开始加载决策树数据...')
-      const response = await api.get('/tree')
+      const params = depth === null ? {} : { depth }
+      const response = await api.get('/tree', { params })
       console.log('API响应:', response.data)
-      treeData.value = response.data
+      const { positions, truncated } = response.data
+      const tree = treeFromResponse(response.data)
+      serverLayout.value = positions ? {
+        positions,
+        depth: depth ?? Infinity,
+        graphKey: JSON.stringify(buildLayoutGraph(tree))
+      } : null
+      setTree(tree, truncated || [], response.data.revision)
       console.log('树数据已更新:', treeData.value)
+      
+      if (truncatedNodes.value.length === 0) {
+        saveCachedTree(response.data.revision, tree)
+      } else {
+        cacheFullTree()
+      }
     } catch (error) {
       console.error('加载失败:', error)
       throw new Error(error.response?.data?.error || error.message)
     }
   }
   
+  // 后台下载完整决策树写入缓存（不影响当前显示），下次打开时直接使用
+  const cacheFullTree = async () => {
+    try {
+      const response = await api.get('/tree', { timeout: FULL_TREE_TIMEOUT })
+      saveCachedTree(response.data.revision, treeFromResponse(response.data))
+    } catch (error) {
+      console.warn('缓存完整决策树失败:', error)
+    }
+  }
+  
+  // 本地已删除或重命名（有未保存修改且当前不存在）的节点
+  const removedLocally = (nodeId) => unsavedIds.has(nodeId) && !treeData.value.nodes[nodeId]
+  
+  // 将后端返回的节点合并到本地：跳过本地已存在或已删除/重命名的节点，
+  // 改写指向它们的引用。合并不记入编辑历史，改写过引用的节点在保存时发送
+  const mergeNodes = (nodes) => {
+    Object.keys(nodes).forEach(nodeId => {
+      if (treeData.value.nodes[nodeId] || removedLocally(nodeId)) return
+      const nodeData = nodes[nodeId]
+      const options = (nodeData.options || [])
+        .map(option => {
+          const renamed = renamedNodes.get(option.next_node)
+          return renamed && treeData.value.nodes[renamed] ? { ...option, next_node: renamed } : option
+        })
+        .filter(option => !removedLocally(option.next_node))
+      const rewritten = options.some((option, i) => option !== nodeData.options[i]) ||
+        options.length !== (nodeData.options || []).length
+      
+      treeData.value.nodes[nodeId] = rewritten ? { ...nodeData, options } : nodeData
+      references.set(nodeId, treeData.value.nodes[nodeId])
+      if (rewritten) unsavedIds.add(nodeId)
+    })
+    notify()
+  }
+  
+  // 加载节点之下 depth 层的子节点
+  const loadChildren = async (nodeId, depth = 1) => {
+    if (!truncatedNodes.value.includes(nodeId)) return
+    const requestId = renamedOrigin(nodeId)
+    try {
+      const response = await api.get(`/tree/children/${encodeURIComponent(requestId)}`, { params: { depth } })
+      mergeNodes(response.data.nodes)
+      truncatedNodes.value = [
+        ...truncatedNodes.value.filter(id => id !== nodeId),
+        ...response.data.truncated.filter(id => treeData.value.nodes[id])
+      ]
+    } catch (error) {
+      throw new Error(error.response?.data?.error || error.message)
+    }
+  }
+  
+  // 保存、验证、测试前补全尚未加载的子树
+  const ensureFullTree = async () => {
+    if (truncatedNodes.value.length === 0) return
+    try {
+      const response = await api.get('/tree', { timeout: FULL_TREE_TIMEOUT })
+      mergeNodes(response.data.nodes)
+      truncatedNodes.value = []
+    } catch (error) {
+      throw new Error(error.response?.data?.error || error.message)
+    }
+  }
+  
+  // 保存：只发送上次保存后修改过的节点；没有服务器版本号时保存完整决策树
   const saveTree = async () => {
     try {
-      const response = await api.post('/tree', treeData.value)
+      await ensureFullTree()
+      const response = revision.value
+        ? await api.post('/tree/patch', { base_revision: revision.value, ops: buildPatch() })
+        : await api.post('/tree', treeData.value)
       if (response.data.error) {
         throw new Error(response.data.error)
       }
+      markSaved(response.data.revision)
+      if (revision.value) {
+        saveCachedTree(revision.value, treeData.value)
+      }
     } catch (error) {
       throw new Error(error.response?.data?.error || error.message)
     }
@@ -41,6 +345,7 @@ export function useTreeStore() {
   
   const validateTree = async () => {
     try {
+      await ensureFullTree()
       const response = await api.post('/validate', treeData.value)
       return response.data
     } catch (error) {
@@ -50,6 +355,7 @@ export function useTreeStore() {
   
   const testTree = async (testPath = [1, 1, 1]) => {
     try {
+      await ensureFullTree()
       const response = await api.post('/test', {
         ...treeData.value,
         test_path: testPath
@@ -60,34 +366,60 @@ export function useTreeStore() {
     }
   }
   
-  const updateNode = (nodeId, nodeData) => {
-    if (!treeData.value.nodes) {
-      treeData.value.nodes = {}
+  // 搜索节点（服务端倒排索引），返回 [{ node_id, score, field, text, type }]
+  const searchNodes = async (query, limit = 20) => {
+    if (!query.trim()) return []
+    try {
+      const response = await api.get('/search', { params: { q: query, limit } })
+      return response.data.results
+    } catch (error) {
+      throw new Error(error.response?.data?.error || error.message)
     }
-    treeData.value.nodes[nodeId] = nodeData
+  }
+  
+  // 确保节点已加载到本地（按需加载时搜索结果可能位于未展开的子树中）
+  const revealNode = async (nodeId) => {
+    if (!treeData.value.nodes[nodeId]) {
+      await ensureFullTree()
+    }
+    return Boolean(treeData.value.nodes[nodeId])
+  }
+  
+  const updateNode = (nodeId, nodeData) => {
+    batch(() => {
+      setNode(nodeId, nodeData)
+      notify()
+    })
   }
   
   const deleteNode = (nodeId) => {
-    if (treeData.value.nodes && treeData.value.nodes[nodeId]) {
-      delete treeData.value.nodes[nodeId]
-      
-      // 更新所有引用该节点的选项
-      Object.keys(treeData.value.nodes).forEach(id => {
-        const node = treeData.value.nodes[id]
-        if (node.options) {
-          node.options = node.options.filter(option => 
-            option.next_node !== nodeId
-          )
-        }
+    if (!treeData.value.nodes[nodeId]) return
+    
+    batch(() => {
+      // 更新引用该节点的选项（只处理反向索引中的父节点）
+      references.referrers(nodeId).forEach(parentId => {
+        if (parentId === nodeId) return
+        const parent = treeData.value.nodes[parentId]
+        setNode(parentId, {
+          ...parent,
+          options: parent.options.filter(option => option.next_node !== nodeId)
+        })
       })
-    }
+      
+      removeNode(nodeId)
+      if (truncatedNodes.value.includes(nodeId)) {
+        truncatedNodes.value = truncatedNodes.value.filter(id => id !== nodeId)
+      }
+      notify()
+    })
+  }
+  
+  // 批量删除节点，只触发一次更新
+  const deleteNodes = (nodeIds) => {
+    batch(() => nodeIds.forEach(deleteNode))
   }
   
   const addNode = (parentNodeId) => {
-    if (!treeData.value.nodes) {
-      treeData.value.nodes = {}
-    }
-    
     // 生成新的节点ID
     const timestamp = Date.now()
     const newNodeId = `new_node_${timestamp}`
@@ -101,23 +433,26 @@ export function useTreeStore() {
       ]
     }
     
-    // 添加新节点
-    treeData.value.nodes[newNodeId] = newNodeData
-    
-    // 为父节点添加指向新节点的选项
-    const parentNode = treeData.value.nodes[parentNodeId]
-    if (parentNode && parentNode.options) {
-      parentNode.options.push({
-        text: '新选项',
-        next_node: newNodeId
-      })
-    }
+    batch(() => {
+      // 添加新节点
+      setNode(newNodeId, newNodeData)
+      
+      // 为父节点添加指向新节点的选项
+      const parentNode = treeData.value.nodes[parentNodeId]
+      if (parentNode && parentNode.options) {
+        setNode(parentNodeId, {
+          ...parentNode,
+          options: [...parentNode.options, { text: '新选项', next_node: newNodeId }]
+        })
+      }
+      notify()
+    })
     
     return newNodeId
   }
   
   const changeNodeId = (oldId, newId) => {
-    if (!treeData.value.nodes || !treeData.value.nodes[oldId]) {
+    if (!treeData.value.nodes[oldId]) {
       return false
     }
     
@@ -126,30 +461,39 @@ export function useTreeStore() {
       throw new Error('节点ID已存在')
     }
     
-    // 保存节点数据
-    const nodeData = treeData.value.nodes[oldId]
-    
-    // 删除旧节点
-    delete treeData.value.nodes[oldId]
-    
-    // 添加新节点
-    treeData.value.nodes[newId] = nodeData
-    
-    // 更新根节点引用
-    if (treeData.value.root_node === oldId) {
-      treeData.value.root_node = newId
-    }
-    
-    // 更新所有引用该节点的选项
-    Object.keys(treeData.value.nodes).forEach(id => {
-      const node = treeData.value.nodes[id]
-      if (node.options) {
-        node.options.forEach(option => {
-          if (option.next_node === oldId) {
-            option.next_node = newId
-          }
-        })
+    batch(() => {
+      const parents = references.referrers(oldId)
+      
+      // 移动节点数据
+      const nodeData = treeData.value.nodes[oldId]
+      removeNode(oldId)
+      setNode(newId, nodeData)
+      
+      // 记录重命名，按需加载的节点合并时改写引用
+      const originId = renamedOrigin(oldId)
+      renamedOrigins.delete(oldId)
+      renamedNodes.set(originId, newId)
+      renamedOrigins.set(newId, originId)
+      if (truncatedNodes.value.includes(oldId)) {
+        truncatedNodes.value = truncatedNodes.value.map(id => id === oldId ? newId : id)
+      }
+      
+      // 更新根节点引用
+      if (treeData.value.root_node === oldId) {
+        setRoot(newId)
       }
+      
+      // 更新引用该节点的选项（只处理反向索引中的父节点）
+      parents.forEach(parentId => {
+        const currentId = parentId === oldId ? newId : parentId
+        const parent = treeData.value.nodes[currentId]
+        setNode(currentId, {
+          ...parent,
+          options: parent.options.map(option =>
+            option.next_node === oldId ? { ...option, next_node: newId } : option)
+        })
+      })
+      notify()
     })
     
     return true
@@ -157,13 +501,26 @@ export function useTreeStore() {
   
   return {
     treeData,
+    serverLayout,
+    truncatedNodes,
     loadTree,
+    loadChildren,
+    searchNodes,
+    revealNode,
     saveTree,
     validateTree,
     testTree,
     updateNode,
     deleteNode,
+    deleteNodes,
     addNode,
-    changeNodeId
+    changeNodeId,
+    batch,
+    canUndo,
+    canRedo,
+    undo,
+    redo,
+    snapshot,
+    restore
   }
-} 
\ No newline at end of file
+}
@@ -0,0 +1,58 @@
+// 决策树反向引用索引：节点 -> 引用它的父节点，随节点修改增量维护
+// 每个父节点记录写入时的子节点快照，删除引用时不依赖节点数据是否被原地修改过
+
+const optionTargets = (nodeData) => {
+  return ((nodeData && nodeData.options) || [])
+    .map(option => option.next_node)
+    .filter(Boolean)
+}
+
+export const createReferenceIndex = () => {
+  const targetsOf = new Map()    // 父节点 -> 子节点快照
+  const referrersOf = new Map()  // 子节点 -> Map(父节点 -> 引用次数)
+
+  const unlink = (parentId) => {
+    const targets = targetsOf.get(parentId)
+    if (!targets) return
+    targets.forEach(targetId => {
+      const referrers = referrersOf.get(targetId)
+      const count = referrers.get(parentId) - 1
+      if (count > 0) {
+        referrers.set(parentId, count)
+      } else {
+        referrers.delete(parentId)
+        if (referrers.size === 0) referrersOf.delete(targetId)
+      }
+    })
+    targetsOf.delete(parentId)
+  }
+
+  // 写入（或覆盖）节点的引用
+  const set = (nodeId, nodeData) => {
+    unlink(nodeId)
+    const targets = optionTargets(nodeData)
+    targetsOf.set(nodeId, targets)
+    targets.forEach(targetId => {
+      if (!referrersOf.has(targetId)) referrersOf.set(targetId, new Map())
+      const referrers = referrersOf.get(targetId)
+      referrers.set(nodeId, (referrers.get(nodeId) || 0) + 1)
+    })
+  }
+
+  // 删除节点自身的引用（其他节点对它的引用由调用方处理）
+  const remove = (nodeId) => unlink(nodeId)
+
+  // 引用该节点的父节点列表
+  const referrers = (nodeId) => {
+    const map = referrersOf.get(nodeId)
+    return map ? [...map.keys()] : []
+  }
+
+  const rebuild = (nodes) => {
+    targetsOf.clear()
+    referrersOf.clear()
+    Object.keys(nodes).forEach(nodeId => set(nodeId, nodes[nodeId]))
+  }
+
+  return { set, remove, referrers, rebuild }
+}
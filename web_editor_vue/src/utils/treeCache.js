@@ -0,0 +1,68 @@
+// 决策树本地缓存：在 IndexedDB 中保存最近一次同步的完整决策树及其版本号
+// 浏览器不支持或被禁用 IndexedDB 时所有操作静默失败，编辑器退回网络加载
+
+const DB_NAME = 'decision-tree-editor'
+const DB_VERSION = 1
+const STORE_NAME = 'trees'
+const CACHE_KEY = 'current'
+
+let dbPromise = null
+
+const openDatabase = () => {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      if (typeof indexedDB === 'undefined') {
+        reject(new Error('IndexedDB 不可用'))
+        return
+      }
+      const request = indexedDB.open(DB_NAME, DB_VERSION)
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore(STORE_NAME)
+      }
+      request.onsuccess = () => resolve(request.result)
+      request.onerror = () => reject(request.error)
+    }).catch(error => {
+      dbPromise = null
+      throw error
+    })
+  }
+  return dbPromise
+}
+
+const runRequest = async (mode, operation) => {
+  const db = await openDatabase()
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction(STORE_NAME, mode)
+    const request = operation(transaction.objectStore(STORE_NAME))
+    transaction.oncomplete = () => resolve(request.result)
+    transaction.onerror = () => reject(transaction.error)
+    transaction.onabort = () => reject(transaction.error)
+  })
+}
+
+// 读取缓存：返回 { revision, tree } 或 null
+export const loadCachedTree = async () => {
+  try {
+    const cached = await runRequest('readonly', store => store.get(CACHE_KEY))
+    return cached && cached.revision && cached.tree ? cached : null
+  } catch (error) {
+    console.warn('读取本地缓存失败:', error)
+    return null
+  }
+}
+
+export const saveCachedTree = async (revision, tree) => {
+  try {
+    await runRequest('readwrite', store => store.put({ revision, tree, savedAt: Date.now() }, CACHE_KEY))
+  } catch (error) {
+    console.warn('写入本地缓存失败:', error)
+  }
+}
+
+export const clearCachedTree = async () => {
+  try {
+    await runRequest('readwrite', store => store.delete(CACHE_KEY))
+  } catch (error) {
+    console.warn('清除本地缓存失败:', error)
+  }
+}
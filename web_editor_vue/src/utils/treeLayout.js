@@ -0,0 +1,342 @@
+// 决策树布局：邻接表 + Buchheim 整洁树布局（线性时间）
+// 不依赖 DOM，可在主线程或 Web Worker 中运行
+
+export const LAYOUT_DEFAULTS = {
+  centerX: 600,       // 根节点X坐标
+  topY: 100,          // 第一层Y坐标
+  levelHeight: 150,   // 层间距
+  nodeSpacing: 180    // 相邻节点最小间距
+}
+
+// 从树数据构建布局所需的邻接表（只保留指向存在节点的选项）
+export const buildLayoutGraph = (data) => {
+  const children = {}
+  Object.keys(data.nodes).forEach(nodeId => {
+    const nodeData = data.nodes[nodeId]
+    const nodeChildren = []
+    if (nodeData && nodeData.options) {
+      nodeData.options.forEach(option => {
+        if (option.next_node && data.nodes[option.next_node]) {
+          nodeChildren.push(option.next_node)
+        }
+      })
+    }
+    children[nodeId] = nodeChildren
+  })
+  return { root: data.root_node, children }
+}
+
+// 反向索引：节点 -> 父节点列表
+export const buildParentIndex = (children) => {
+  const parents = {}
+  Object.keys(children).forEach(nodeId => {
+    if (!parents[nodeId]) parents[nodeId] = []
+    children[nodeId].forEach(childId => {
+      if (!parents[childId]) parents[childId] = []
+      parents[childId].push(nodeId)
+    })
+  })
+  return parents
+}
+
+// 所有祖先节点（沿反向索引向上遍历）
+export const collectAncestors = (parents, nodeId) => {
+  const ancestors = new Set()
+  const stack = [nodeId]
+  while (stack.length > 0) {
+    const current = stack.pop()
+    ;(parents[current] || []).forEach(parentId => {
+      if (!ancestors.has(parentId)) {
+        ancestors.add(parentId)
+        stack.push(parentId)
+      }
+    })
+  }
+  return ancestors
+}
+
+// 聚焦模式下可见的节点：所有祖先、同级节点、自身及所有后代
+export const collectFocusNodes = (children, parents, focusNodeId) => {
+  const visible = new Set([focusNodeId, ...collectAncestors(parents, focusNodeId)])
+
+  ;(parents[focusNodeId] || []).forEach(parentId => {
+    children[parentId].forEach(siblingId => visible.add(siblingId))
+  })
+
+  const descendants = new Set([focusNodeId])
+  const stack = [focusNodeId]
+  while (stack.length > 0) {
+    const nodeId = stack.pop()
+    ;(children[nodeId] || []).forEach(childId => {
+      if (!descendants.has(childId)) {
+        descendants.add(childId)
+        visible.add(childId)
+        stack.push(childId)
+      }
+    })
+  }
+
+  return visible
+}
+
+const createLayoutNode = (id, parent, depth, number) => {
+  const node = {
+    id,
+    parent,
+    depth,
+    number,       // 在兄弟节点中的序号（从1开始）
+    children: [],
+    x: 0,
+    mod: 0,
+    change: 0,
+    shift: 0,
+    thread: null,
+    ancestor: null
+  }
+  node.ancestor = node
+  return node
+}
+
+// 广度优先构建生成树：多父节点的节点归属第一个（层级最浅的）父节点，
+// 折叠节点的子节点不进入生成树
+const buildSpanningForest = (graph, isVisible, isExpanded) => {
+  const { children } = graph
+  const ids = Object.keys(children)
+  const hasParent = new Set()
+  ids.forEach(nodeId => {
+    if (!isVisible(nodeId)) return
+    children[nodeId].forEach(childId => {
+      if (isVisible(childId)) hasParent.add(childId)
+    })
+  })
+
+  const rootIds = ids.filter(nodeId => isVisible(nodeId) && !hasParent.has(nodeId))
+  const rootIndex = rootIds.indexOf(graph.root)
+  if (rootIndex > 0) {
+    rootIds.splice(rootIndex, 1)
+    rootIds.unshift(graph.root)
+  }
+
+  const virtualRoot = createLayoutNode(null, null, -1, 1)
+  const placed = new Map()
+  // 不考虑折叠时可到达的节点，用于区分“被折叠隐藏”和“只能从环中到达”
+  const reached = new Set()
+
+  const markReachable = (rootId) => {
+    const stack = [rootId]
+    reached.add(rootId)
+    while (stack.length > 0) {
+      children[stack.pop()].forEach(childId => {
+        if (!reached.has(childId) && isVisible(childId)) {
+          reached.add(childId)
+          stack.push(childId)
+        }
+      })
+    }
+  }
+
+  const growFrom = (rootId) => {
+    const root = createLayoutNode(rootId, virtualRoot, 0, virtualRoot.children.length + 1)
+    virtualRoot.children.push(root)
+    placed.set(rootId, root)
+
+    const queue = [root]
+    for (let head = 0; head < queue.length; head++) {
+      const node = queue[head]
+      if (!isExpanded(node.id, node.depth)) continue
+      children[node.id].forEach(childId => {
+        if (placed.has(childId) || !isVisible(childId)) return
+        const child = createLayoutNode(childId, node, node.depth + 1, node.children.length + 1)
+        node.children.push(child)
+        placed.set(childId, child)
+        queue.push(child)
+      })
+    }
+    markReachable(rootId)
+  }
+
+  rootIds.forEach(growFrom)
+  // 只能从环中到达的节点没有入度为0的祖先，单独作为根
+  ids.forEach(nodeId => {
+    if (isVisible(nodeId) && !reached.has(nodeId)) growFrom(nodeId)
+  })
+
+  return { virtualRoot, placed }
+}
+
+// ---- Buchheim, Jünger & Leipert: Improving Walker's Algorithm to Run in Linear Time ----
+
+const leftSibling = (node) => {
+  return node.number > 1 ? node.parent.children[node.number - 2] : null
+}
+
+const leftmostSibling = (node) => {
+  return node.number > 1 ? node.parent.children[0] : null
+}
+
+const nextLeft = (node) => node.thread || node.children[0] || null
+
+const nextRight = (node) => node.thread || node.children[node.children.length - 1] || null
+
+const moveSubtree = (left, right, shift) => {
+  const subtrees = right.number - left.number
+  right.change -= shift / subtrees
+  right.shift += shift
+  left.change += shift / subtrees
+  right.x += shift
+  right.mod += shift
+}
+
+const executeShifts = (node) => {
+  let shift = 0
+  let change = 0
+  for (let i = node.children.length - 1; i >= 0; i--) {
+    const child = node.children[i]
+    child.x += shift
+    child.mod += shift
+    change += child.change
+    shift += child.shift + change
+  }
+}
+
+const greatestUncommonAncestor = (insideLeft, node, defaultAncestor) => {
+  return insideLeft.ancestor.parent === node.parent ? insideLeft.ancestor : defaultAncestor
+}
+
+const apportion = (node, defaultAncestor, distance) => {
+  const sibling = leftSibling(node)
+  if (!sibling) return defaultAncestor
+
+  let insideRight = node
+  let outsideRight = node
+  let insideLeft = sibling
+  let outsideLeft = leftmostSibling(node)
+  let shiftInsideRight = node.mod
+  let shiftOutsideRight = node.mod
+  let shiftInsideLeft = insideLeft.mod
+  let shiftOutsideLeft = outsideLeft.mod
+
+  while (nextRight(insideLeft) && nextLeft(insideRight)) {
+    insideLeft = nextRight(insideLeft)
+    insideRight = nextLeft(insideRight)
+    outsideLeft = nextLeft(outsideLeft)
+    outsideRight = nextRight(outsideRight)
+    outsideRight.ancestor = node
+
+    const shift = (insideLeft.x + shiftInsideLeft) - (insideRight.x + shiftInsideRight) + distance
+    if (shift > 0) {
+      moveSubtree(greatestUncommonAncestor(insideLeft, node, defaultAncestor), node, shift)
+      shiftInsideRight += shift
+      shiftOutsideRight += shift
+    }
+
+    shiftInsideLeft += insideLeft.mod
+    shiftInsideRight += insideRight.mod
+    shiftOutsideLeft += outsideLeft.mod
+    shiftOutsideRight += outsideRight.mod
+  }
+
+  if (nextRight(insideLeft) && !nextRight(outsideRight)) {
+    outsideRight.thread = nextRight(insideLeft)
+    outsideRight.mod += shiftInsideLeft - shiftOutsideRight
+    return defaultAncestor
+  }
+
+  if (nextLeft(insideRight) && !nextLeft(outsideLeft)) {
+    outsideLeft.thread = nextLeft(insideRight)
+    outsideLeft.mod += shiftInsideRight - shiftOutsideLeft
+  }
+  return node
+}
+
+const firstWalk = (node, distance) => {
+  if (node.children.length === 0) {
+    const sibling = leftSibling(node)
+    node.x = sibling ? sibling.x + distance : 0
+    return
+  }
+
+  let defaultAncestor = node.children[0]
+  node.children.forEach(child => {
+    firstWalk(child, distance)
+    defaultAncestor = apportion(child, defaultAncestor, distance)
+  })
+  executeShifts(node)
+
+  const first = node.children[0]
+  const last = node.children[node.children.length - 1]
+  const midpoint = (first.x + last.x) / 2
+  const sibling = leftSibling(node)
+  if (sibling) {
+    node.x = sibling.x + distance
+    node.mod = node.x - midpoint
+  } else {
+    node.x = midpoint
+  }
+}
+
+// 累加祖先的 mod 得到最终X坐标（迭代实现，避免深树递归）
+const secondWalk = (virtualRoot) => {
+  const stack = [[virtualRoot, 0]]
+  while (stack.length > 0) {
+    const [node, modSum] = stack.pop()
+    node.x += modSum
+    node.children.forEach(child => stack.push([child, modSum + node.mod]))
+  }
+}
+
+// 计算节点位置：返回 { nodeId: { x, y, depth } }，只包含可见节点
+// options.collapseDepth: 该层级及以下的节点默认折叠；options.expanded: 节点展开状态 { nodeId: boolean }
+export const computeLayout = (graph, focusNodeId = null, options = {}) => {
+  const { centerX, topY, levelHeight, nodeSpacing } = { ...LAYOUT_DEFAULTS, ...options }
+  const collapseDepth = options.collapseDepth ?? Infinity
+  const expanded = options.expanded || {}
+
+  let visible = null
+  let focusAncestors = new Set()
+  if (focusNodeId && graph.children[focusNodeId]) {
+    const parents = buildParentIndex(graph.children)
+    visible = collectFocusNodes(graph.children, parents, focusNodeId)
+    focusAncestors = collectAncestors(parents, focusNodeId)
+    focusAncestors.add(focusNodeId)
+  }
+  const isVisible = (nodeId) => !visible || visible.has(nodeId)
+  // 聚焦节点及其祖先始终展开，保证聚焦节点可达
+  const isExpanded = (nodeId, depth) => {
+    if (focusAncestors.has(nodeId)) return true
+    return expanded[nodeId] ?? depth < collapseDepth
+  }
+
+  const { virtualRoot, placed } = buildSpanningForest(graph, isVisible, isExpanded)
+  if (virtualRoot.children.length === 0) return {}
+
+  firstWalk(virtualRoot, 1)
+  secondWalk(virtualRoot)
+
+  // 第一个根节点居中
+  const originX = virtualRoot.children[0].x
+  const positions = {}
+  placed.forEach((node, nodeId) => {
+    positions[nodeId] = {
+      x: centerX + (node.x - originX) * nodeSpacing,
+      y: topY + node.depth * levelHeight,
+      depth: node.depth
+    }
+  })
+  return positions
+}
+
+// 将服务端布局（x 为节点间距单位，depth 为层级）换算为像素坐标
+export const positionsFromLayout = (layoutPositions, options = {}) => {
+  const { centerX, topY, levelHeight, nodeSpacing } = { ...LAYOUT_DEFAULTS, ...options }
+  const positions = {}
+  Object.keys(layoutPositions).forEach(nodeId => {
+    const { x, depth } = layoutPositions[nodeId]
+    positions[nodeId] = {
+      x: centerX + x * nodeSpacing,
+      y: topY + depth * levelHeight,
+      depth
+    }
+  })
+  return positions
+}
@@ -0,0 +1,226 @@
+// 决策树绘制场景：节点/连线的几何信息、视口裁剪和 Canvas 绘制
+// SVG 和 Canvas 两种渲染方式共用同一份场景数据
+
+export const NODE_WIDTH = 120
+export const LOD_SCALE = 0.45   // 缩放比例低于该值时不绘制文字
+export const TOGGLE_RADIUS = 8  // 展开/折叠按钮半径
+
+const COLORS = {
+  line: '#6c757d',
+  border: '#dee2e6',
+  selected: '#28a745',
+  solution: '#fff3cd',
+  decision: '#ffffff',
+  title: '#495057',
+  text: '#6c757d',
+  options: '#28a745',
+  labelBorder: '#e4e7ed'
+}
+
+export const nodeHeight = (nodeData) => nodeData.solution ? 80 : 100
+
+// 展开/折叠按钮位于节点底部中心
+export const toggleCenter = (node) => ({
+  x: node.x + NODE_WIDTH / 2,
+  y: node.y + nodeHeight(node.data)
+})
+
+const truncate = (text) => (text || '').substring(0, 20) + '...'
+
+// 节点显示内容的摘要，内容不变时复用已绘制的元素
+export const nodeSignature = (node) => {
+  const { data } = node
+  return data.solution !== undefined
+    ? `s|${data.solution}`
+    : `q|${data.question}|${(data.options || []).length}`
+}
+
+const edgeGeometry = (from, to, fromData) => {
+  // 计算连接线的起点和终点（节点底部中心 -> 节点顶部中心）
+  const fromX = from.x + NODE_WIDTH / 2
+  const fromY = from.y + (fromData.solution ? 40 : 50)
+  const toX = to.x + NODE_WIDTH / 2
+  const toY = to.y + 20
+
+  // 计算控制点，创建更平滑的曲线
+  const c1Y = fromY + (toY - fromY) * 0.3
+  const c2Y = toY - (toY - fromY) * 0.3
+
+  return {
+    fromX, fromY, toX, toY, c1Y, c2Y,
+    path: `M ${fromX} ${fromY} C ${fromX} ${c1Y} ${toX} ${c2Y} ${toX} ${toY}`,
+    labelX: (fromX + toX) / 2,
+    labelY: (fromY + toY) / 2 + 15,
+    bounds: {
+      x0: Math.min(fromX, toX) - 30,
+      y0: Math.min(fromY, toY),
+      x1: Math.max(fromX, toX) + 30,
+      y1: Math.max(fromY, toY) + 15
+    }
+  }
+}
+
+// 由布局坐标构建场景：只包含有位置的（可见）节点和两端都可见的连线
+export const buildScene = (positions, data) => {
+  const nodes = []
+  const edges = []
+
+  Object.keys(positions).forEach(nodeId => {
+    const nodeData = data.nodes[nodeId]
+    if (!nodeData) return
+    const position = positions[nodeId]
+    nodes.push({
+      id: nodeId,
+      data: nodeData,
+      x: position.x,
+      y: position.y,
+      depth: position.depth,
+      hasChildren: (nodeData.options || []).some(option => option.next_node)
+    })
+
+    ;(nodeData.options || []).forEach((option, index) => {
+      const target = option.next_node && positions[option.next_node]
+      if (!target || !data.nodes[option.next_node]) return
+      edges.push({
+        key: `${nodeId}:${index}:${option.next_node}`,
+        from: nodeId,
+        to: option.next_node,
+        label: option.text,
+        ...edgeGeometry(position, target, nodeData)
+      })
+    })
+  })
+
+  return { nodes, edges }
+}
+
+// 视口（树坐标系）内的节点和连线
+export const nodeInView = (node, view) => {
+  return node.x + NODE_WIDTH >= view.x0 && node.x <= view.x1 &&
+    node.y + nodeHeight(node.data) >= view.y0 && node.y <= view.y1
+}
+
+export const edgeInView = (edge, view) => {
+  const { bounds } = edge
+  return bounds.x1 >= view.x0 && bounds.x0 <= view.x1 &&
+    bounds.y1 >= view.y0 && bounds.y0 <= view.y1
+}
+
+// 屏幕坐标点对应的节点（Canvas 点击命中测试）
+export const findNodeAt = (scene, x, y) => {
+  for (let i = scene.nodes.length - 1; i >= 0; i--) {
+    const node = scene.nodes[i]
+    if (x >= node.x && x <= node.x + NODE_WIDTH && y >= node.y && y <= node.y + nodeHeight(node.data)) {
+      return node
+    }
+  }
+  return null
+}
+
+// 屏幕坐标点对应的展开/折叠按钮
+export const findToggleAt = (scene, x, y) => {
+  return scene.nodes.find(node => {
+    if (!node.hasChildren) return false
+    const center = toggleCenter(node)
+    return (x - center.x) ** 2 + (y - center.y) ** 2 <= TOGGLE_RADIUS ** 2
+  }) || null
+}
+
+// Canvas 绘制：所有连线合并为一条路径，文字只在放大时绘制
+export const drawSceneToCanvas = (ctx, scene, { transform, view, selectedNode, isExpanded }) => {
+  const detailed = transform.k >= LOD_SCALE
+  const edges = scene.edges.filter(edge => edgeInView(edge, view))
+  const nodes = scene.nodes.filter(node => nodeInView(node, view))
+
+  ctx.save()
+  ctx.translate(transform.x, transform.y)
+  ctx.scale(transform.k, transform.k)
+
+  ctx.beginPath()
+  edges.forEach(edge => {
+    ctx.moveTo(edge.fromX, edge.fromY)
+    ctx.bezierCurveTo(edge.fromX, edge.c1Y, edge.toX, edge.c2Y, edge.toX, edge.toY)
+  })
+  ctx.strokeStyle = COLORS.line
+  ctx.lineWidth = 2
+  ctx.stroke()
+
+  if (detailed) {
+    // 箭头和选项标签
+    ctx.fillStyle = COLORS.line
+    ctx.beginPath()
+    edges.forEach(edge => {
+      ctx.moveTo(edge.toX - 4, edge.toY - 8)
+      ctx.lineTo(edge.toX, edge.toY)
+      ctx.lineTo(edge.toX + 4, edge.toY - 8)
+    })
+    ctx.fill()
+
+    ctx.font = '10px sans-serif'
+    ctx.textAlign = 'center'
+    ctx.textBaseline = 'middle'
+    edges.forEach(edge => {
+      ctx.fillStyle = '#ffffff'
+      ctx.strokeStyle = COLORS.labelBorder
+      ctx.lineWidth = 1
+      ctx.fillRect(edge.labelX - 30, edge.labelY - 8, 60, 16)
+      ctx.strokeRect(edge.labelX - 30, edge.labelY - 8, 60, 16)
+      ctx.fillStyle = COLORS.text
+      ctx.fillText(edge.label || '', edge.labelX, edge.labelY, 58)
+    })
+  }
+
+  nodes.forEach(node => {
+    const isSelected = node.id === selectedNode
+    ctx.fillStyle = node.data.solution ? COLORS.solution : COLORS.decision
+    ctx.strokeStyle = isSelected ? COLORS.selected : COLORS.border
+    ctx.lineWidth = isSelected ? 3 : 2
+    ctx.beginPath()
+    ctx.rect(node.x, node.y, NODE_WIDTH, nodeHeight(node.data))
+    ctx.fill()
+    ctx.stroke()
+  })
+
+  if (detailed) {
+    ctx.textAlign = 'center'
+    ctx.textBaseline = 'alphabetic'
+    const centerOffset = NODE_WIDTH / 2
+    nodes.forEach(node => {
+      const cx = node.x + centerOffset
+      ctx.font = 'bold 10px sans-serif'
+      ctx.fillStyle = COLORS.title
+      ctx.fillText(node.id, cx, node.y + 15, NODE_WIDTH - 4)
+
+      ctx.font = '9px sans-serif'
+      ctx.fillStyle = node.data.solution ? COLORS.text : COLORS.title
+      ctx.fillText(node.data.solution ? '解决方案' : '决策节点', cx, node.y + 35)
+
+      ctx.font = '8px sans-serif'
+      ctx.fillStyle = COLORS.text
+      ctx.fillText(truncate(node.data.solution || node.data.question), cx, node.y + 55, NODE_WIDTH - 4)
+
+      if (!node.data.solution) {
+        ctx.fillStyle = COLORS.options
+        ctx.fillText(`${(node.data.options || []).length} 个选项`, cx, node.y + 75)
+      }
+    })
+
+    // 展开/折叠按钮
+    ctx.font = 'bold 12px sans-serif'
+    ctx.textBaseline = 'middle'
+    nodes.filter(node => node.hasChildren).forEach(node => {
+      const center = toggleCenter(node)
+      ctx.fillStyle = '#ffffff'
+      ctx.strokeStyle = COLORS.line
+      ctx.lineWidth = 1.5
+      ctx.beginPath()
+      ctx.arc(center.x, center.y, TOGGLE_RADIUS, 0, Math.PI * 2)
+      ctx.fill()
+      ctx.stroke()
+      ctx.fillStyle = COLORS.line
+      ctx.fillText(isExpanded(node) ? '−' : '+', center.x, center.y)
+    })
+  }
+
+  ctx.restore()
+}
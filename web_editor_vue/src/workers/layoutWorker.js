@@ -0,0 +1,10 @@
+// 决策树布局计算 Worker：避免大树布局阻塞主线程
+import { computeLayout } from '../utils/treeLayout'
+
+self.onmessage = (event) => {
+  const { requestId, graph, focusNodeId, options } = event.data
+  self.postMessage({
+    requestId,
+    positions: computeLayout(graph, focusNodeId, options)
+  })
+}